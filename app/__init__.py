@@ -6,14 +6,23 @@ from .extensions import db
 from .models import *  # подтягивает все модели
 from .routes import main_blueprint
 from .routes.uploader import uploader
+from .routes.importer import importer
+from .routes.metrics import metrics_blueprint
+from .utils.rollups import ensure_rollups
+from .utils.db_profile import engine_options, install_engine_events
+from .models.print_event import use_partitioned_layout
+from .utils.partitions import ensure_partitions, partitioning_requested
+from .utils import metrics
+from .utils.schema import ensure_columns, ensure_indexes, ensure_unique_job_ids
 
-def create_app():
+def create_app(config=Config):
     app = Flask(__name__)
     # 🧬 Безопасный ключ для сессии и flash-сообщений
     app.config["SECRET_KEY"] = secrets.token_hex(32)
 
     # Загружаем конфиг
-    app.config.from_object(Config)
+    app.config.from_object(config)
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(app.config))
 
     # Инициализация экстеншенов
     db.init_app(app)
@@ -21,10 +30,21 @@ def create_app():
     # Регистрация маршрутов
     app.register_blueprint(main_blueprint)
     app.register_blueprint(uploader)
+    app.register_blueprint(importer)
+    app.register_blueprint(metrics_blueprint)
+    metrics.init_app(app)
 
     # Создание БД
     with app.app_context():
+        install_engine_events(db.engine, app.config)
+        # схема print_events — по конфигу этого приложения, а не по окружению при импорте моделей
+        use_partitioned_layout(partitioning_requested(app.config))
         db.create_all()
+        ensure_columns()
+        ensure_unique_job_ids()
+        ensure_indexes()
+        ensure_partitions()
+        ensure_rollups()
 
     # Swagger UI
     Swagger(app)
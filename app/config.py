@@ -6,3 +6,72 @@ load_dotenv()  # 🧠 загружает переменные из .env
 class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URI", "sqlite:///advisor.db")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # 🗄️ Профиль движка БД (см. app/utils/db_profile.py): веб — много коротких читающих запросов
+    DB_PROFILE = "web"
+    DB_APPLICATION_NAME = "advisor-web"
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # секунд ожидания свободного соединения
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # секунд жизни соединения
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))  # PostgreSQL, 0 — без предела
+    DB_INSERT_PAGE_SIZE = int(os.getenv("DB_INSERT_PAGE_SIZE", "1000"))  # строк в одном многострочном INSERT
+    SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "20000"))
+    SQLITE_BEGIN = os.getenv("SQLITE_BEGIN", "DEFERRED")  # веб в основном читает; импорт — IMMEDIATE
+
+    # 📇 Кэш справочников для импортёров
+    DIMENSION_CACHE_SIZE = int(os.getenv("DIMENSION_CACHE_SIZE", "100000"))  # записей на справочник
+    DIMENSION_CACHE_TTL = int(os.getenv("DIMENSION_CACHE_TTL", "3600"))  # секунд
+
+    # 📦 Размер пакета при потоковом импорте событий
+    IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "5000"))
+    # 💾 Промежуточный commit каждые N событий (0 — один commit на файл)
+    IMPORT_COMMIT_EVERY = int(os.getenv("IMPORT_COMMIT_EVERY", "50000"))
+    # 📥 Фоновый импорт загрузок: каталог спула и число потоков-исполнителей
+    IMPORT_SPOOL_DIR = os.getenv("IMPORT_SPOOL_DIR", "./import_spool")
+    IMPORT_JOB_WORKERS = int(os.getenv("IMPORT_JOB_WORKERS", "1"))
+    # ✍️ Одновременных писателей в БД на процесс: задачи веб-импорта и потоки демона (для SQLite — 1)
+    IMPORT_WRITERS = int(os.getenv("IMPORT_WRITERS", "1"))
+    # 🗄️ Архив закрытых месяцев print_events: каталог и сколько полных месяцев держать в таблице
+    ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archive")
+    ARCHIVE_KEEP_MONTHS = int(os.getenv("ARCHIVE_KEEP_MONTHS", "3"))
+    # демон архивирует раз в ARCHIVE_INTERVAL секунд, только если архивация явно включена:
+    # выгруженные месяцы удаляются из горячей таблицы
+    ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "0").lower() in ("1", "true", "yes")
+    ARCHIVE_INTERVAL = int(os.getenv("ARCHIVE_INTERVAL", "86400"))
+
+    # 🗂️ Помесячные секции print_events (только PostgreSQL; на SQLite — обычная таблица)
+    PG_PARTITION_EVENTS = os.getenv("PG_PARTITION_EVENTS", "0").lower() in ("1", "true", "yes")
+    PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "2"))  # секции создаются заранее
+
+    # 🗃️ Кэш отчётов: записей в памяти, каталог журнала сбросов, хранить ли значения на диске
+    REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", "256"))
+    REPORT_CACHE_DIR = os.getenv("REPORT_CACHE_DIR", "./report_cache")
+    REPORT_CACHE_DISK = os.getenv("REPORT_CACHE_DISK", "0").lower() in ("1", "true", "yes")
+    REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))  # выгрузки крупнее не кэшируются
+
+    # 📈 Метрики и профилирование: каталог снимков демона, их срок годности, cProfile с запуска и доля выборки
+    METRICS_DIR = os.getenv("METRICS_DIR", "./metrics")
+    METRICS_SNAPSHOT_MAX_AGE = int(os.getenv("METRICS_SNAPSHOT_MAX_AGE", "600"))  # seconds
+    PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "0").lower() in ("1", "true", "yes")
+    PROFILE_SAMPLE = float(os.getenv("PROFILE_SAMPLE", "0.1"))
+
+    # 🌸 Фильтр Блума по job_id: ожидаемое число событий и доля ложных срабатываний
+    JOB_FILTER_CAPACITY = int(os.getenv("JOB_FILTER_CAPACITY", "10000000"))
+    JOB_FILTER_ERROR_RATE = float(os.getenv("JOB_FILTER_ERROR_RATE", "0.01"))
+
+
+class DaemonConfig(Config):
+    """Профиль демона импорта: несколько потоков-импортёров, длинные пакетные записи"""
+    DB_PROFILE = "bulk"
+    DB_APPLICATION_NAME = "advisor-importer"
+    DB_POOL_SIZE = int(os.getenv("DAEMON_DB_POOL_SIZE", "4"))
+    DB_MAX_OVERFLOW = int(os.getenv("DAEMON_DB_MAX_OVERFLOW", "4"))
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DAEMON_DB_STATEMENT_TIMEOUT_MS", "0"))
+    DB_INSERT_PAGE_SIZE = int(os.getenv("DAEMON_DB_INSERT_PAGE_SIZE", "5000"))
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("DAEMON_SQLITE_BUSY_TIMEOUT_MS", "60000"))  # ждём, пока веб дочитает
+    SQLITE_CACHE_SIZE_KB = int(os.getenv("DAEMON_SQLITE_CACHE_SIZE_KB", "200000"))
+    SQLITE_BEGIN = os.getenv("DAEMON_SQLITE_BEGIN", "IMMEDIATE")  # демон пишет: блокировка записи сразу
@@ -6,4 +6,5 @@ from .printer import Printer
 from .user import User
 from .print_event import PrintEvent
 from .computer import Computer
-from .port import Port
\ No newline at end of file
+from .port import Port
+from .print_daily_rollup import PrintDailyRollup
\ No newline at end of file
@@ -10,4 +10,9 @@ class Building(db.Model):
     name = db.Column(db.String(255), nullable=False)
     created_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        # регистронезависимый поиск импортёров: func.lower(code) == value
+        db.Index("ix_buildings_code_lower", func.lower(code)),
+    )
+
     printers = relationship("Printer", back_populates="building")
@@ -16,6 +16,11 @@ class Computer(db.Model):
     
     created_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        # регистронезависимый поиск импортёров: func.lower(hostname) == value
+        db.Index("ix_computers_hostname_lower", func.lower(hostname)),
+    )
+
     building = relationship("Building")
     department = relationship("Department")
     print_events = relationship("PrintEvent", back_populates="computer")
@@ -11,5 +11,10 @@ class Department(db.Model):
     name = db.Column(db.String(255), nullable=False)
     created_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        # регистронезависимый поиск импортёров: func.lower(code) == value
+        db.Index("ix_departments_code_lower", func.lower(code)),
+    )
+
     users = relationship("User", back_populates="department")
     printers = relationship("Printer", back_populates="department")
@@ -15,6 +15,11 @@ class Port(db.Model):
 
     created_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        # регистронезависимый поиск импортёров: func.lower(name) == value
+        db.Index("ix_ports_name_lower", func.lower(name)),
+    )
+
     building = relationship("Building")
     department = relationship("Department")
     print_events = relationship("PrintEvent", back_populates="port")
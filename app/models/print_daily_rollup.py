@@ -0,0 +1,26 @@
+from app.extensions import db
+from sqlalchemy.orm import relationship
+
+
+class PrintDailyRollup(db.Model):
+    """Дневные агрегаты печати — источник для /print-tree и выгрузки в Excel"""
+    __tablename__ = "print_daily_rollups"
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False, index=True)
+    department_id = db.Column(db.Integer, db.ForeignKey("departments.id"), nullable=False, index=True)
+    printer_id = db.Column(db.Integer, db.ForeignKey("printers.id"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    document_name = db.Column(db.String(512), nullable=False)
+    pages = db.Column(db.Integer, nullable=False, default=0)
+    events = db.Column(db.Integer, nullable=False, default=0)
+    last_time = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('day', 'department_id', 'printer_id', 'user_id', 'document_name',
+                            name='uix_rollup_day_dept_printer_user_doc'),
+    )
+
+    department = relationship("Department")
+    printer = relationship("Printer")
+    user = relationship("User")
@@ -1,26 +1,56 @@
 from app.extensions import db
-from sqlalchemy import func
+from sqlalchemy import PrimaryKeyConstraint, func
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
+JOB_ID_INDEX = "uix_print_events_job_id"
+
 
 class PrintEvent(db.Model):
     __tablename__ = "print_events"
 
-    id = db.Column(db.Integer, primary_key=True, index=True)
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True, index=True)
     document_id = db.Column(db.Integer, nullable=False, index=True)
     document_name = db.Column(db.String(512), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
     printer_id = db.Column(db.Integer, db.ForeignKey("printers.id"), nullable=False, index=True)
-    job_id = db.Column(db.String(64), nullable=False, index=True)
+    job_id = db.Column(db.String(64), nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
     byte_size = db.Column(db.Integer, nullable=False)
     pages = db.Column(db.Integer, nullable=False)
     created_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
     computer_id = db.Column(db.Integer, db.ForeignKey("computers.id"), nullable=True)
     port_id = db.Column(db.Integer, db.ForeignKey("ports.id"), nullable=True)
+
+    __table_args__ = (
+        # дедупликация импорта: INSERT ... ON CONFLICT (job_id) DO NOTHING;
+        # в секционированной таблице — (job_id, timestamp), см. use_partitioned_layout
+        db.Index(JOB_ID_INDEX, "job_id", unique=True),
+        # keyset-пагинация /print-events: ORDER BY timestamp DESC, id DESC
+        db.Index("ix_print_events_timestamp_id", "timestamp", "id"),
+    )
+    # для ORM событие по-прежнему определяется одним id
+    __mapper_args__ = {"primary_key": [id]}
+
     computer = relationship("Computer", back_populates="print_events")
     port = relationship("Port", back_populates="print_events")
 
     user = relationship("User", back_populates="print_events")
     printer = relationship("Printer", back_populates="print_events")
+
+
+def use_partitioned_layout(partitioned):
+    """
+    🗂️ Схема print_events для DDL (create_all, миграция): помесячное секционирование
+    по timestamp (app/utils/partitions.py) или обычная таблица. Ключ секционирования
+    обязан входить в первичный ключ и уникальные индексы. Вызывается из create_app
+    по конфигу приложения; ORM это не затрагивает — событие определяется одним id.
+    """
+    table = PrintEvent.__table__
+    table.dialect_options["postgresql"]["partition_by"] = "RANGE (timestamp)" if partitioned else None
+    table.c.timestamp.primary_key = partitioned
+    key = [table.c.id, table.c.timestamp] if partitioned else [table.c.id]
+    table.append_constraint(PrimaryKeyConstraint(*key, name=table.primary_key.name))
+    table.indexes.discard(next(i for i in table.indexes if i.name == JOB_ID_INDEX))
+    # JobID уже включает время события, так что (job_id, timestamp) уникален так же, как job_id
+    db.Index(JOB_ID_INDEX, table.c.job_id, *([table.c.timestamp] if partitioned else []), unique=True)
@@ -14,4 +14,9 @@ class PrinterModel(db.Model):
     is_duplex = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        # регистронезависимый поиск импортёров: func.lower(code) == value
+        db.Index("ix_models_code_lower", func.lower(code)),
+    )
+
     printers = relationship("Printer", back_populates="model")
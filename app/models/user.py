@@ -10,7 +10,14 @@ class User(db.Model):
     fio = db.Column(db.String(255), nullable=False)
     department_id = db.Column(db.Integer, db.ForeignKey("departments.id"), nullable=False, index=True)
     is_active = db.Column(db.Boolean, default=True)
+    # хэш последней строки ad_users.csv — синхронизация трогает только изменившихся
+    ad_fingerprint = db.Column(db.String(40), nullable=True)
     created_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        # регистронезависимый поиск импортёров: func.lower(username) == value
+        db.Index("ix_users_username_lower", func.lower(username)),
+    )
+
     department = relationship("Department", back_populates="users")
     print_events = relationship("PrintEvent", back_populates="user")
\ No newline at end of file
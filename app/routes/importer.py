@@ -1,33 +1,65 @@
-from flask import Blueprint, request, jsonify
-from app.utils.import_users import import_users_from_csv
-from app.utils.import_print_events import import_print_events_from_json
+from flask import Blueprint, request, jsonify, url_for, current_app
+from werkzeug.datastructures import FileStorage
+from app.utils.event_stream import strip_compression_suffix
+from app.utils.import_jobs import import_jobs
 
 importer = Blueprint("importer", __name__)
 
+
+def _uploaded_file(default_name):
+    """
+    Файл из поля file формы или тело запроса целиком (curl --data-binary @x.json.gz,
+    имя — ?filename=). Сжатые gzip/zstd файлы сохраняются в спул как есть и
+    распаковываются при импорте, поэтому заголовок Content-Encoding не нужен
+    """
+    if "file" in request.files:
+        return request.files["file"]
+    if request.content_length and request.mimetype not in ("multipart/form-data", "application/x-www-form-urlencoded"):
+        return FileStorage(stream=request.stream, filename=request.args.get("filename", default_name))
+    return None
+
+
+def _enqueue(kind, file, **options):
+    job = import_jobs.submit(current_app._get_current_object(), kind, file.stream, file.filename, **options)
+    response = job.to_dict()
+    response["status_url"] = url_for("importer.import_job_status", job_id=job.id)
+    return jsonify(response), 202
+
+
 @importer.route("/import/users", methods=["POST"])
 def import_users():
-    if "file" not in request.files:
+    file = _uploaded_file("ad_users.csv")
+    if file is None:
         return jsonify({"error": "Файл не передан"}), 400
 
-    file = request.files["file"]
-    if not file.filename.endswith(".csv"):
-        return jsonify({"error": "Ожидается CSV-файл"}), 400
+    if not strip_compression_suffix(file.filename).endswith(".csv"):
+        return jsonify({"error": "Ожидается CSV-файл (можно .csv.gz, .csv.zst)"}), 400
 
-    result = import_users_from_csv(file)
-    return jsonify(result)
+    update_existing = request.values.get("update_existing", "").lower() in ("1", "true", "yes")
+    return _enqueue("users", file, update_existing=update_existing)
 
 
 @importer.route("/import/print-events", methods=["POST"])
 def import_print_events():
-    if "file" not in request.files:
+    file = _uploaded_file("prn-event.json")
+    if file is None:
         return jsonify({"error": "Файл не передан"}), 400
 
-    file = request.files["file"]
-    if not file.filename.endswith(".json"):
-        return jsonify({"error": "Ожидается JSON-файл"}), 400
+    if not strip_compression_suffix(file.filename).endswith((".json", ".ndjson", ".xml")):
+        return jsonify({"error": "Ожидается JSON/NDJSON/XML-файл (можно сжатый .gz, .zst)"}), 400
+
+    return _enqueue("events", file)
+
+
+@importer.route("/import/jobs/<job_id>")
+def import_job_status(job_id):
+    """Статус и прогресс задачи: processed, created, errors, rate (строк/с), итог"""
+    job = import_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Задача не найдена"}), 404
+    return jsonify(job)
+
 
-    data = file.read().decode("utf-8")
-    import json
-    events = json.loads(data)
-    result = import_print_events_from_json(events)
-    return jsonify(result)
+@importer.route("/import/jobs")
+def import_jobs_list():
+    return jsonify(import_jobs.recent())
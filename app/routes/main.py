@@ -1,10 +1,20 @@
 from collections import OrderedDict
-from flask import Blueprint, render_template, request, send_file
+from flask import Blueprint, render_template, request, jsonify, Response, stream_with_context
+import csv
 import io
+import os
+import tempfile
 import xlsxwriter
 from app.extensions import db
-from app.models import PrintEvent, User, Printer, Department, PrinterModel
+from app.models import PrintEvent, User, Printer, Department, PrinterModel, Building, PrintDailyRollup
 from datetime import datetime
+from typing import NamedTuple
+from app.utils.analytics import PrintFrame, build_print_tree, iter_tree_rows
+from app.utils.archive import event_archive
+from app.utils.bloom import job_filter
+from app.utils.dimension_cache import dimension_cache
+from app.utils.report_cache import ReportCache, report_cache
+from app.config import Config
 
 main_blueprint = Blueprint("main", __name__)
 
@@ -14,8 +24,10 @@ def index():
 
 @main_blueprint.route("/users")
 def users():
+    from sqlalchemy.orm import joinedload, raiseload
     q = request.args.get("q", "").strip()
-    query = User.query
+    # отдел подтягивается тем же запросом; любая другая ленивая загрузка в шаблоне — ошибка, а не N+1
+    query = User.query.options(joinedload(User.department), raiseload("*"))
     if q:
         query = query.filter(
             (User.username.ilike(f"%{q}%")) |
@@ -24,204 +36,345 @@ def users():
     all_users = query.order_by(User.username.asc()).all()
     return render_template("users.html", users=all_users)
 
-@main_blueprint.route("/print-events")
-def print_events():
-    from sqlalchemy import func
-    dept_code = request.args.get("dept", "").strip().lower()
-    start_date_str = request.args.get("start_date", "").strip()
-    end_date_str = request.args.get("end_date", "").strip()
+EVENTS_PAGE_SIZE = 500
+
+
+def _encode_cursor(row):
+    return f"{row.timestamp.isoformat()}_{row.id}"
+
+
+def _decode_cursor(cursor):
+    try:
+        ts, event_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(ts), int(event_id)
+    except ValueError:
+        return None
+
 
-    base_query = PrintEvent.query.join(User).join(Printer).join(Department)
+def _department_ids(dept_code):
+    """
+    id отделов для фильтра: точное совпадение кода (по индексу lower(code)) —
+    как приходит из выпадающего списка; иначе поиск подстрокой по справочнику отделов
+    """
+    from sqlalchemy import func
+    exact = db.session.scalars(
+        db.select(Department.id).where(func.lower(Department.code) == dept_code)
+    ).all()
+    if exact:
+        return exact
+    return db.session.scalars(
+        db.select(Department.id).where(Department.code.ilike(f"%{dept_code}%"))
+    ).all()
+
+
+class ArchivedEventRow(NamedTuple):
+    """Строка архива в том же виде, что и строка запроса по горячей таблице"""
+    id: int
+    timestamp: datetime
+    user_fio: str
+    model_code: str
+    building_code: str
+    dept_code: str
+    room_number: str
+    printer_index: int
+    document_name: str
+    pages: int
+
+
+def _archive_event_rows(rows):
+    """Подписи для строк архива: пользователи и принтеры страницы — двумя запросами"""
+    if not rows:
+        return []
+    users = dict(db.session.execute(
+        db.select(User.id, User.fio).where(User.id.in_({r["user_id"] for r in rows}))
+    ).all())
+    printers = {
+        row.id: row for row in db.session.execute(
+            db.select(Printer.id, PrinterModel.code.label("model_code"), Building.code.label("building_code"),
+                      Department.code.label("dept_code"), Printer.room_number, Printer.printer_index)
+            .join(PrinterModel, PrinterModel.id == Printer.model_id)
+            .join(Building, Building.id == Printer.building_id)
+            .join(Department, Department.id == Printer.department_id)
+            .where(Printer.id.in_({r["printer_id"] for r in rows}))
+        )
+    }
+    result = []
+    for r in rows:
+        printer = printers.get(r["printer_id"])
+        if printer is None:
+            continue
+        result.append(ArchivedEventRow(
+            r["id"], r["timestamp"], users.get(r["user_id"], ""), printer.model_code, printer.building_code,
+            printer.dept_code, printer.room_number, printer.printer_index, r["document_name"], r["pages"],
+        ))
+    return result
+
+
+def _print_events_page(args):
+    """Страница событий через кэш отчётов: ключ — фильтры и курсор, период — фильтр дат"""
+    start_date, end_date = _tree_period(args)[2:]
+    key = ReportCache.make_key(
+        "events",
+        dept=args.get("dept", "").strip().lower(),
+        start=start_date,
+        end=end_date,
+        cursor=args.get("cursor", "").strip(),
+    )
+    return report_cache.get_or_compute(key, lambda: _query_events_page(args), start_date, end_date)
+
+
+def _query_events_page(args):
+    """
+    Страница событий с keyset-пагинацией по (timestamp, id) — стоимость не зависит
+    от глубины листания. Сумма страниц берётся из дневных агрегатов, а не сканом событий.
+    Когда горячая таблица исчерпана, страница добирается из архива закрытых месяцев.
+    """
+    from sqlalchemy import func, tuple_
+    dept_code = args.get("dept", "").strip().lower()
+    start_date_str = args.get("start_date", "").strip()
+    end_date_str = args.get("end_date", "").strip()
+    cursor = _decode_cursor(args.get("cursor", "").strip())
+
+    base_query = db.session.query(
+        PrintEvent.id,
+        PrintEvent.timestamp,
+        User.fio.label("user_fio"),
+        PrinterModel.code.label("model_code"),
+        Building.code.label("building_code"),
+        Department.code.label("dept_code"),
+        Printer.room_number,
+        Printer.printer_index,
+        PrintEvent.document_name,
+        PrintEvent.pages
+    ).join(User, User.id == PrintEvent.user_id) \
+        .join(Printer, Printer.id == PrintEvent.printer_id) \
+        .join(PrinterModel, PrinterModel.id == Printer.model_id) \
+        .join(Building, Building.id == Printer.building_id) \
+        .join(Department, Department.id == Printer.department_id)
+    totals_query = db.session.query(func.sum(PrintDailyRollup.pages)) \
+        .join(Department, Department.id == PrintDailyRollup.department_id)
 
+    dept_ids = start_dt = end_dt = None
     if dept_code:
-        base_query = base_query.filter(Printer.department.has(Department.code.ilike(f"%{dept_code}%")))
+        dept_ids = _department_ids(dept_code)
+        base_query = base_query.filter(Printer.department_id.in_(dept_ids))
+        totals_query = totals_query.filter(PrintDailyRollup.department_id.in_(dept_ids))
 
     if start_date_str:
         try:
             start_dt = datetime.strptime(start_date_str, "%Y-%m-%d")
             base_query = base_query.filter(PrintEvent.timestamp >= start_dt)
+            totals_query = totals_query.filter(PrintDailyRollup.day >= start_dt.date())
         except ValueError:
-            pass
+            start_dt = None
 
     if end_date_str:
         try:
             end_dt = datetime.strptime(end_date_str, "%Y-%m-%d")
             end_dt = end_dt.replace(hour=23, minute=59, second=59)
             base_query = base_query.filter(PrintEvent.timestamp <= end_dt)
+            totals_query = totals_query.filter(PrintDailyRollup.day <= end_dt.date())
         except ValueError:
-            pass
-
-    # 🔁 Сначала считаем общее число страниц без LIMIT
-    total_pages = base_query.with_entities(func.sum(PrintEvent.pages)).scalar() or 0
+            end_dt = None
+
+    # 🔁 Общее число страниц — из агрегатов
+    total_pages = totals_query.scalar() or 0
+
+    # 🧾 Страница событий: строго после курсора, на одну строку больше — признак следующей страницы
+    if cursor:
+        base_query = base_query.filter(tuple_(PrintEvent.timestamp, PrintEvent.id) < tuple_(*cursor))
+    events = base_query.order_by(PrintEvent.timestamp.desc(), PrintEvent.id.desc()) \
+        .limit(EVENTS_PAGE_SIZE + 1).all()
+
+    # 🗄️ Горячая таблица кончилась — продолжаем в архиве закрытых месяцев (они все старше)
+    if len(events) <= EVENTS_PAGE_SIZE and event_archive.months():
+        archive_cursor = (events[-1].timestamp, events[-1].id) if events else cursor
+        printer_ids = None
+        if dept_ids is not None:
+            printer_ids = set(db.session.scalars(
+                db.select(Printer.id).where(Printer.department_id.in_(dept_ids))
+            ))
+        events += _archive_event_rows(event_archive.page(
+            EVENTS_PAGE_SIZE + 1 - len(events), start_dt, end_dt, archive_cursor, printer_ids
+        ))
+    next_cursor = _encode_cursor(events[EVENTS_PAGE_SIZE - 1]) if len(events) > EVENTS_PAGE_SIZE else None
+
+    return {
+        "events": events[:EVENTS_PAGE_SIZE],
+        "total_pages": total_pages,
+        "next_cursor": next_cursor,
+        "dept": dept_code,
+        "start_date": start_date_str,
+        "end_date": end_date_str,
+    }
 
-    # 🧾 Только потом получаем события (ограниченные)
-    events = base_query.order_by(PrintEvent.timestamp.desc()).limit(500).all()
 
+@main_blueprint.route("/print-events")
+def print_events():
+    page = _print_events_page(request.args)
     all_departments = Department.query.order_by(Department.code).all()
 
     return render_template("print_events.html",
-                           events=events,
-                           total_pages=total_pages,
+                           events=page["events"],
+                           total_pages=page["total_pages"],
+                           next_cursor=page["next_cursor"],
                            departments=all_departments,
-                           selected_dept=dept_code,
-                           start_date=start_date_str,
-                           end_date=end_date_str)
-
-
-@main_blueprint.route("/print-tree")
-def print_tree():
-    from sqlalchemy import func
-    from app.models import PrintEvent, Department, Printer, PrinterModel, User
-    from datetime import datetime
-
-    start_date_str = request.args.get("start_date", "").strip()
-    end_date_str = request.args.get("end_date", "").strip()
+                           selected_dept=page["dept"],
+                           start_date=page["start_date"],
+                           end_date=page["end_date"])
+
+
+@main_blueprint.route("/api/print-events")
+def print_events_api():
+    page = _print_events_page(request.args)
+    return jsonify({
+        "events": [
+            {
+                "id": e.id,
+                "timestamp": e.timestamp.isoformat(),
+                "user_fio": e.user_fio,
+                "printer": f"{e.model_code}-{e.building_code}-{e.dept_code}-{e.room_number}-{e.printer_index}",
+                "document_name": e.document_name,
+                "pages": e.pages,
+            }
+            for e in page["events"]
+        ],
+        "total_pages": page["total_pages"],
+        "next_cursor": page["next_cursor"],
+    })
 
-    query = db.session.query(
-        Department.code.label("dept_code"),
-        Department.name.label("dept_name"),
-        Printer.id.label("printer_id"),
-        Printer.room_number,
-        Printer.printer_index,
-        PrinterModel.code.label("model_code"),
-        User.fio.label("user_fio"),
-        PrintEvent.document_name,
-        func.sum(PrintEvent.pages).label("page_sum"),
-        func.max(PrintEvent.timestamp).label("last_time")
-    ).join(Printer, Printer.id == PrintEvent.printer_id) \
-        .join(PrinterModel, PrinterModel.id == Printer.model_id) \
-        .join(Department, Department.id == Printer.department_id) \
-        .join(User, User.id == PrintEvent.user_id)
 
-    if start_date_str:
+def _tree_period(args):
+    """Период отчёта из start_date / end_date (YYYY-MM-DD); неверная дата игнорируется"""
+    def parse(value):
         try:
-            start_dt = datetime.strptime(start_date_str, "%Y-%m-%d")
-            query = query.filter(PrintEvent.timestamp >= start_dt)
+            return datetime.strptime(value, "%Y-%m-%d").date()
         except ValueError:
-            pass
-    if end_date_str:
-        try:
-            end_dt = datetime.strptime(end_date_str, "%Y-%m-%d")
-            end_dt = end_dt.replace(hour=23, minute=59, second=59)
-            query = query.filter(PrintEvent.timestamp <= end_dt)
-        except ValueError:
-            pass
+            return None
 
-    query = query.group_by(
-        Department.id, Printer.id, User.id,
-        PrintEvent.document_name, PrinterModel.code
-    )
+    start_date_str = args.get("start_date", "").strip()
+    end_date_str = args.get("end_date", "").strip()
+    return start_date_str, end_date_str, parse(start_date_str), parse(end_date_str)
 
-    rows = query.all()
 
-    total_pages = 0
-    max_lengths = {
-        "dept": 0,
-        "printer": 0,
-        "user": 0,
-        "doc": 0
-    }
+def _load_tree(args):
+    """Дерево за период — из кэша отчётов; результат общий, изменять его нельзя"""
+    start_date_str, end_date_str, start_date, end_date = _tree_period(args)
+    tree = report_cache.get_or_compute(
+        ReportCache.make_key("tree", start=start_date, end=end_date),
+        lambda: build_print_tree(PrintFrame.load(start_date, end_date)),
+        start_date, end_date,
+    )
+    return tree, start_date_str, end_date_str
+
+
+MAX_DOC_WIDTH = 80
+
+
+def _padded_tree(tree):
+    """Дерево для шаблона: имена выровнены по самому длинному на уровне (моноширинный вывод)"""
+    departments = tree["departments"]
+    widths = {"dept": 0, "printer": 0, "user": 0}
+    for d in departments:
+        widths["dept"] = max(widths["dept"], len(d["name"]))
+        for p in d["printers"]:
+            widths["printer"] = max(widths["printer"], len(p["name"]))
+            for u in p["users"]:
+                widths["user"] = max(widths["user"], len(u["name"]))
+
+    def pad_doc(doc):
+        if len(doc) > MAX_DOC_WIDTH:
+            return doc[:MAX_DOC_WIDTH - 1] + "…"  # без .ljust!
+        return doc.ljust(MAX_DOC_WIDTH)
+
+    result = OrderedDict()
+    for d in departments:
+        printers = OrderedDict()
+        for p in d["printers"]:
+            users = OrderedDict()
+            for u in p["users"]:
+                docs = OrderedDict()
+                for name, pages, last_time in u["docs"]:
+                    docs.setdefault(pad_doc(name), []).append({"pages": pages, "timestamp": last_time})
+                users[u["name"].ljust(widths["user"])] = {"total": u["total"], "docs": docs}
+            printers[p["name"].ljust(widths["printer"])] = {"total": p["total"], "users": users}
+        result[d["name"].ljust(widths["dept"])] = {"total": d["total"], "printers": printers}
+    return result
 
-    # ➕ Первый проход: собрать данные + длины
-    temp_tree = {}
-
-    for row in rows:
-        dept_name = f"{row.dept_code} — {row.dept_name}"
-        printer_name = f"{row.model_code}-{row.room_number}-{row.printer_index}"
-        user_name = row.user_fio
-        doc_name = row.document_name
-
-        # обновить длины
-        max_lengths["dept"] = max(max_lengths["dept"], len(dept_name))
-        max_lengths["printer"] = max(max_lengths["printer"], len(printer_name))
-        max_lengths["user"] = max(max_lengths["user"], len(user_name))
-        max_lengths["doc"] = max(max_lengths["doc"], len(doc_name))
-
-        total_pages += row.page_sum
-
-        temp_tree.setdefault(dept_name, {"total": 0, "printers": {}})
-        dept = temp_tree[dept_name]
-        dept["total"] += row.page_sum
-
-        dept["printers"].setdefault(printer_name, {"total": 0, "users": {}})
-        printer = dept["printers"][printer_name]
-        printer["total"] += row.page_sum
-
-        printer["users"].setdefault(user_name, {"total": 0, "docs": {}})
-        user = printer["users"][user_name]
-        user["total"] += row.page_sum
-
-        user["docs"].setdefault(doc_name, []).append({
-            "pages": row.page_sum,
-            "timestamp": row.last_time
-        })
-
-    def pad(s, key):
-        return s.ljust(max_lengths[key])
-
-    for dept in temp_tree.values():
-        for printer in dept["printers"].values():
-            for user in printer["users"].values():
-                # считаем total страниц на каждый документ
-                doc_totals = {
-                    doc: sum(entry["pages"] for entry in entries)
-                    for doc, entries in user["docs"].items()
-                }
-
-                # сортируем документы по total pages (убывание)
-                sorted_docs = OrderedDict(
-                    sorted(user["docs"].items(), key=lambda x: doc_totals[x[0]], reverse=True)
-                )
-
-                # выравниваем названия документов
-                padded_docs = OrderedDict()
-                for doc, entries in sorted_docs.items():
-                    MAX_DOC_WIDTH = 80
-                    if len(doc) > MAX_DOC_WIDTH:
-                        padded_name = doc[:MAX_DOC_WIDTH - 1] + "…"  # без .ljust!
-                    else:
-                        padded_name = doc.ljust(MAX_DOC_WIDTH)
-                    padded_docs[padded_name] = entries
-
-                user["docs"] = padded_docs
-    # 🔁 Второй проход: выравнивание + сортировка
-    tree = {
-        pad(dept, "dept"): {
-            "total": d["total"],
-            "printers": {
-                pad(printer, "printer"): {
-                    "total": p["total"],
-                    "users": {
-                        pad(user, "user"): u
-                        for user, u in sorted(p["users"].items(), key=lambda x: x[1]["total"], reverse=True)
-                    }
-                }
-                for printer, p in sorted(d["printers"].items(), key=lambda x: x[1]["total"], reverse=True)
-            }
-        }
-        for dept, d in sorted(temp_tree.items(), key=lambda x: x[1]["total"], reverse=True)
-    }
 
+@main_blueprint.route("/print-tree")
+def print_tree():
+    # 🧮 Дерево строится колоночной аналитикой по дневным агрегатам
+    tree, start_date_str, end_date_str = _load_tree(request.args)
     return render_template("print_tree.html",
-                           tree=tree,
-                           total_pages=total_pages,
+                           tree=_padded_tree(tree),
+                           total_pages=tree["total_pages"],
                            start_date=start_date_str,
                            end_date=end_date_str)
 
 
+@main_blueprint.route("/api/print-tree")
+def print_tree_api():
+    tree, start_date_str, end_date_str = _load_tree(request.args)
+    # новая структура поверх закэшированного дерева — сам кэш не трогаем
+    departments = [
+        {**dept, "printers": [
+            {**printer, "users": [
+                {**user, "docs": [
+                    {"name": name, "pages": pages, "last_time": last_time.isoformat()}
+                    for name, pages, last_time in user["docs"]
+                ]}
+                for user in printer["users"]
+            ]}
+            for printer in dept["printers"]
+        ]}
+        for dept in tree["departments"]
+    ]
+    return jsonify({
+        "start_date": start_date_str,
+        "end_date": end_date_str,
+        "total_pages": tree["total_pages"],
+        "departments": departments,
+    })
+
+
+@main_blueprint.route("/api/cache-stats")
+def cache_stats_api():
+    return jsonify({
+        "report_cache": report_cache.stats(),
+        "dimension_cache": dimension_cache.stats(),
+        "job_filter": job_filter.stats(),
+    })
+
+
 @main_blueprint.route("/print-tree/export")
 def export_tree_excel():
     # 🔁 Повтори ту же выборку данных, что и в print_tree()
     # Для простоты, здесь можно использовать текущий `print_tree()` как отдельную функцию,
     # или собрать аналогичный список событий
 
-    from app.models import PrintEvent, Department, Printer, PrinterModel, User
     from datetime import datetime
-    from sqlalchemy import func
 
     start_date_str = request.args.get("start_date", "").strip()
     end_date_str = request.args.get("end_date", "").strip()
 
+    # 🗃️ Готовый файл за тот же период, формат и раскладку — из кэша отчётов
+    export_format = request.args.get("format", "xlsx").lower()
+    if export_format not in ("csv", "tsv"):
+        export_format = "xlsx"
+    layout = request.args.get("layout", "")
+    period_start, period_end = _tree_period(request.args)[2:]
+    cache_key = ReportCache.make_key("export", format=export_format, layout=layout,
+                                     start=period_start, end=period_end)
+    found, content = report_cache.get(cache_key)
+    if found:
+        return _export_response(content, export_format)
+    since = report_cache.generation()
+
+    def remember(content):
+        report_cache.put(cache_key, content, period_start, period_end, since=since)
+
+    # 🧮 Строка выгрузки — документ пользователя на принтере за день (из агрегатов)
     query = db.session.query(
         Department.code.label("dept_code"),
         Department.name.label("dept_name"),
@@ -229,54 +382,175 @@ def export_tree_excel():
         Printer.room_number,
         Printer.printer_index,
         User.fio.label("user_fio"),
-        PrintEvent.document_name,
-        PrintEvent.pages,
-        PrintEvent.timestamp
-    ).join(Printer, Printer.id == PrintEvent.printer_id) \
+        PrintDailyRollup.document_name,
+        PrintDailyRollup.pages,
+        PrintDailyRollup.last_time.label("timestamp")
+    ).join(Printer, Printer.id == PrintDailyRollup.printer_id) \
      .join(PrinterModel, PrinterModel.id == Printer.model_id) \
-     .join(Department, Department.id == Printer.department_id) \
-     .join(User, User.id == PrintEvent.user_id)
+     .join(Department, Department.id == PrintDailyRollup.department_id) \
+     .join(User, User.id == PrintDailyRollup.user_id)
 
     # Фильтр по дате
     if start_date_str:
         try:
             start_dt = datetime.strptime(start_date_str, "%Y-%m-%d")
-            query = query.filter(PrintEvent.timestamp >= start_dt)
+            query = query.filter(PrintDailyRollup.day >= start_dt.date())
         except:
             pass
     if end_date_str:
         try:
             end_dt = datetime.strptime(end_date_str, "%Y-%m-%d")
-            end_dt = end_dt.replace(hour=23, minute=59, second=59)
-            query = query.filter(PrintEvent.timestamp <= end_dt)
+            query = query.filter(PrintDailyRollup.day <= end_dt.date())
         except:
             pass
 
-    rows = query.order_by(Department.name, Printer.room_number, User.fio, PrintEvent.timestamp).all()
-
-    output = io.BytesIO()
-    workbook = xlsxwriter.Workbook(output, {'in_memory': True})
-    ws = workbook.add_worksheet("Print Events")
-
-    # Заголовки
-    headers = ["Отдел", "Принтер", "ФИО", "Документ", "Страниц", "Дата"]
-    for col, h in enumerate(headers):
-        ws.write(0, col, h)
-
-    # Заполнение
-    for i, row in enumerate(rows, start=1):
-        printer_name = f"{row.model_code}-{row.room_number}-{row.printer_index}"
-        ws.write(i, 0, f"{row.dept_code} — {row.dept_name}")
-        ws.write(i, 1, printer_name)
-        ws.write(i, 2, row.user_fio)
-        ws.write(i, 3, row.document_name)
-        ws.write(i, 4, row.pages)
-        ws.write(i, 5, row.timestamp.strftime('%d.%m.%Y %H:%M'))
-
-    workbook.close()
-    output.seek(0)
-
-    return send_file(output,
-                     download_name="print_events_tree.xlsx",
-                     as_attachment=True,
-                     mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    rows = query.order_by(Department.name, Printer.room_number, User.fio, PrintDailyRollup.last_time) \
+        .yield_per(EXPORT_BATCH_SIZE)  # построчно с серверного курсора, без .all()
+
+    if layout == "tree":
+        # строки в порядке дерева печати: документ пользователя на принтере за весь период
+        tree, _, _ = _load_tree(request.args)
+        rows = (
+            TreeExportRow(dept["name"], printer["name"], user["name"], *doc)
+            for dept, printer, user, doc in iter_tree_rows(tree)
+        )
+
+    if export_format in ("csv", "tsv"):
+        return _stream_delimited(rows, export_format, on_complete=remember)
+    return _stream_xlsx(rows, on_complete=remember)
+
+
+EXPORT_BATCH_SIZE = 2000
+EXPORT_HEADERS = ["Отдел", "Принтер", "ФИО", "Документ", "Страниц", "Дата"]
+XLSX_MAX_ROWS = 1_048_576  # предел строк на лист Excel
+
+
+class TreeExportRow(NamedTuple):
+    dept: str
+    printer: str
+    user_fio: str
+    document_name: str
+    pages: int
+    timestamp: datetime
+
+
+def _export_values(row):
+    if isinstance(row, TreeExportRow):
+        return [row.dept, row.printer, row.user_fio, row.document_name, row.pages,
+                row.timestamp.strftime('%d.%m.%Y %H:%M')]
+    return [
+        f"{row.dept_code} — {row.dept_name}",
+        f"{row.model_code}-{row.room_number}-{row.printer_index}",
+        row.user_fio,
+        row.document_name,
+        row.pages,
+        row.timestamp.strftime('%d.%m.%Y %H:%M'),
+    ]
+
+
+def _stream_file(path, chunk_size=64 * 1024):
+    """Отдаёт файл кусками и удаляет его после отправки"""
+    try:
+        with open(path, "rb") as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+    finally:
+        os.remove(path)
+
+
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def _delimited_mimetype(export_format):
+    mimetype = "text/tab-separated-values" if export_format == "tsv" else "text/csv"
+    return f"{mimetype}; charset=utf-8"
+
+
+def _export_response(content, export_format):
+    """Выгрузка из кэша отчётов — готовые байты файла"""
+    mimetype = XLSX_MIMETYPE if export_format == "xlsx" else _delimited_mimetype(export_format)
+    return Response(content, mimetype=mimetype, headers={
+        "Content-Disposition": f"attachment; filename=print_events_tree.{export_format}",
+    })
+
+
+def _stream_xlsx(rows, on_complete=None):
+    """
+    Книга пишется в режиме constant_memory во временный файл: в памяти только
+    текущая строка. Превышение предела строк Excel переносится на новый лист.
+    Готовый файл не больше REPORT_CACHE_MAX_BYTES передаётся в on_complete (кэш отчётов).
+    """
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'tmpdir': tempfile.gettempdir()})
+        ws, sheet_no, i = None, 0, XLSX_MAX_ROWS
+
+        for row in rows:
+            if i >= XLSX_MAX_ROWS:
+                sheet_no += 1
+                ws = workbook.add_worksheet("Print Events" if sheet_no == 1 else f"Print Events {sheet_no}")
+                ws.write_row(0, 0, EXPORT_HEADERS)
+                i = 1
+            ws.write_row(i, 0, _export_values(row))
+            i += 1
+
+        if ws is None:
+            workbook.add_worksheet("Print Events").write_row(0, 0, EXPORT_HEADERS)
+        workbook.close()
+    except Exception:
+        os.remove(path)
+        raise
+
+    if on_complete and os.path.getsize(path) <= Config.REPORT_CACHE_MAX_BYTES:
+        with open(path, "rb") as f:
+            on_complete(f.read())
+
+    return Response(
+        _stream_file(path),
+        mimetype=XLSX_MIMETYPE,
+        headers={
+            "Content-Disposition": "attachment; filename=print_events_tree.xlsx",
+            "Content-Length": str(os.path.getsize(path)),
+        },
+    )
+
+
+def _stream_delimited(rows, export_format, flush_every=500, on_complete=None):
+    """
+    CSV/TSV уходит клиенту сразу, по мере чтения строк из БД. Копия отданного
+    копится, пока не больше REPORT_CACHE_MAX_BYTES, и целиком уходит в on_complete.
+    """
+    delimiter = "\t" if export_format == "tsv" else ","
+
+    def generate():
+        kept, size = [], 0
+        for chunk in encode():
+            if on_complete and kept is not None:
+                size += len(chunk)
+                if size <= Config.REPORT_CACHE_MAX_BYTES:
+                    kept.append(chunk)
+                else:
+                    kept = None
+            yield chunk
+        if on_complete and kept is not None:
+            on_complete(b"".join(kept))
+
+    def encode():
+        buf = io.StringIO()
+        writer = csv.writer(buf, delimiter=delimiter)
+        buf.write("\ufeff")  # BOM — чтобы Excel открыл UTF-8 без вопросов
+        writer.writerow(EXPORT_HEADERS)
+        for n, row in enumerate(rows, start=1):
+            writer.writerow(_export_values(row))
+            if n % flush_every == 0:
+                yield buf.getvalue().encode("utf-8")
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue().encode("utf-8")
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=_delimited_mimetype(export_format),
+        headers={"Content-Disposition": f"attachment; filename=print_events_tree.{export_format}"},
+    )
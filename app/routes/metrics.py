@@ -0,0 +1,37 @@
+from flask import Blueprint, request, jsonify, Response
+from app.utils.metrics import metrics, profiler, read_snapshots
+
+metrics_blueprint = Blueprint("metrics", __name__)
+
+
+@metrics_blueprint.route("/metrics")
+def prometheus_metrics():
+    """Метрики веб-процесса и последние снимки демона импорта (Prometheus text format)"""
+    return Response(metrics.render(read_snapshots()), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+
+@metrics_blueprint.route("/metrics/profile", methods=["GET"])
+def profile_report():
+    """Накопленный профиль cProfile: ?limit=40&sort=cumulative|tottime"""
+    limit = request.args.get("limit", 40, type=int)
+    sort = request.args.get("sort", "cumulative")
+    if sort not in ("cumulative", "tottime", "calls", "ncalls"):
+        return jsonify({"error": "sort: cumulative, tottime, calls"}), 400
+    return Response(profiler.report(limit, sort), mimetype="text/plain; charset=utf-8")
+
+
+@metrics_blueprint.route("/metrics/profile", methods=["POST"])
+def profile_configure():
+    """Включение профилирования на ходу: enabled=1|0, sample=0.1, reset=1 (форма или JSON)"""
+    data = request.get_json(silent=True) or request.form or request.args
+
+    def flag(name):
+        value = data.get(name)
+        return None if value is None else str(value).lower() in ("1", "true", "yes", "on")
+
+    try:
+        sample = float(data["sample"]) if data.get("sample") is not None else None
+    except ValueError:
+        return jsonify({"error": "sample — число от 0 до 1"}), 400
+    profiler.configure(enabled=flag("enabled"), sample=sample, reset=bool(flag("reset")))
+    return jsonify(profiler.state())
@@ -1,7 +1,6 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
-from app.utils.import_users import import_users_from_csv
-from app.utils.import_print_events import import_print_events_from_json
-import json
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
+from app.utils.event_stream import strip_compression_suffix
+from app.utils.import_jobs import import_jobs
 
 uploader = Blueprint("uploader", __name__)
 
@@ -15,32 +14,24 @@ def upload():
             flash("❌ Файл не выбран", "danger")
             return redirect(request.url)
 
-        try:
-            if ftype == "users" and file.filename.endswith(".csv"):
-                result = import_users_from_csv(file)
-
-            elif ftype == "events" and file.filename.endswith(".json"):
-                data = file.read().decode("utf-8-sig")
-                events = json.loads(data)
-                result = import_print_events_from_json(events)
-
-            else:
-                flash("❌ Неверный формат файла", "danger")
-                return redirect(request.url)
-
-            # Вывод результата
-            flash(f"✅ Импортировано: {result['created']}", "success")
-
-            if result["errors"]:
-                flash(f"⚠️ Ошибки: {len(result['errors'])}", "warning")
-
-                # Показываем только первые 5 ошибок
-                for err in result["errors"][:5]:
-                    flash(f"❌ {err}", "danger")
+        filename = strip_compression_suffix(file.filename)  # .gz/.zst распаковываются при импорте
+        if ftype == "users" and filename.endswith(".csv"):
+            kind = "users"
+        elif ftype == "events" and filename.endswith((".json", ".ndjson", ".xml")):
+            kind = "events"
+        else:
+            flash("❌ Неверный формат файла", "danger")
+            return redirect(request.url)
 
+        try:
+            # импорт идёт в фоне — запрос только сохраняет файл и ставит задачу
+            job = import_jobs.submit(current_app._get_current_object(), kind, file.stream, file.filename)
+            flash(f"📥 Файл {file.filename} принят, задача {job.id} поставлена в очередь", "success")
         except Exception as ex:
             flash(f"💥 Неожиданная ошибка: {str(ex)}", "danger")
 
-        return redirect(request.url)
+        return redirect(url_for("uploader.upload"))
 
-    return render_template("upload.html")
+    jobs = import_jobs.recent()
+    active = any(job["status"] in ("queued", "running") for job in jobs)
+    return render_template("upload.html", jobs=jobs, active=active)
@@ -0,0 +1,194 @@
+"""
+Колоночная аналитика печати для отчётов (дерево печати, выгрузка, JSON API).
+
+Отфильтрованные дневные агрегаты загружаются один раз в параллельные массивы
+целочисленных кодов (отдел, принтер, пользователь, документ) — без ORM-объектов
+и строк в каждой записи. Группировки по уровням иерархии и сортировка считаются
+на этих кодах через map / zip / sorted (циклы на стороне C), а подписи
+подставляются только в конце, по одному разу на узел.
+"""
+from array import array
+from operator import add, itemgetter, mul, ne, sub
+from itertools import compress, repeat
+from sqlalchemy import func, select
+from app.extensions import db
+from app.models import PrintDailyRollup, Department, Printer, PrinterModel, User
+
+
+class PrintFrame:
+    """Агрегаты печати за период: (отдел, принтер, пользователь, документ) -> страницы, последняя печать"""
+
+    __slots__ = ("dept", "printer", "user", "doc", "pages", "last_time", "doc_names")
+
+    def __init__(self, dept, printer, user, doc, pages, last_time, doc_names):
+        self.dept = dept
+        self.printer = printer
+        self.user = user
+        self.doc = doc
+        self.pages = pages
+        self.last_time = last_time
+        self.doc_names = doc_names
+
+    def __len__(self):
+        return len(self.pages)
+
+    @classmethod
+    def load(cls, start_date=None, end_date=None, department_ids=None):
+        """Сумма по дням считается в БД, в Python приходят только id и числа"""
+        query = select(
+            PrintDailyRollup.department_id,
+            PrintDailyRollup.printer_id,
+            PrintDailyRollup.user_id,
+            PrintDailyRollup.document_name,
+            func.sum(PrintDailyRollup.pages),
+            func.max(PrintDailyRollup.last_time),
+        ).group_by(
+            PrintDailyRollup.department_id,
+            PrintDailyRollup.printer_id,
+            PrintDailyRollup.user_id,
+            PrintDailyRollup.document_name,
+        )
+        if start_date:
+            query = query.where(PrintDailyRollup.day >= start_date)
+        if end_date:
+            query = query.where(PrintDailyRollup.day <= end_date)
+        if department_ids is not None:
+            query = query.where(PrintDailyRollup.department_id.in_(department_ids))
+
+        rows = db.session.execute(query).all()
+        if not rows:
+            return cls(array("q"), array("q"), array("q"), array("q"), array("q"), [], [])
+
+        dept, printer, user, docs, pages, last_time = zip(*rows)
+        codes = {}
+        doc = array("q", map(codes.setdefault, docs, map(len, repeat(codes, len(docs)))))
+        return cls(
+            array("q", dept),
+            array("q", printer),
+            array("q", user),
+            doc,
+            array("q", map(int, pages)),
+            list(last_time),
+            list(codes),
+        )
+
+
+def _sum_by(keys, values):
+    totals = {}
+    get = totals.get
+    for key, value in zip(keys, values):
+        totals[key] = get(key, 0) + value
+    return totals
+
+
+def _labels(frame):
+    """Подписи узлов одним запросом на справочник — только для встретившихся id"""
+    def fetch(query, ids):
+        result = {}
+        ids = list(ids)
+        for i in range(0, len(ids), 500):
+            result.update((row[0], row[1:]) for row in db.session.execute(query(ids[i:i + 500])))
+        return result
+
+    departments = fetch(lambda ids: select(Department.id, Department.code, Department.name)
+                        .where(Department.id.in_(ids)), set(frame.dept))
+    printers = fetch(lambda ids: select(Printer.id, PrinterModel.code, Printer.room_number, Printer.printer_index)
+                     .join(PrinterModel, PrinterModel.id == Printer.model_id)
+                     .where(Printer.id.in_(ids)), set(frame.printer))
+    users = fetch(lambda ids: select(User.id, User.fio).where(User.id.in_(ids)), set(frame.user))
+    return (
+        {k: f"{code} — {name}" for k, (code, name) in departments.items()},
+        {k: f"{model}-{room}-{index}" for k, (model, room, index) in printers.items()},
+        {k: fio for k, (fio,) in users.items()},
+    )
+
+
+def _take(column, order):
+    """column[order] — выборка по индексам целиком в C (itemgetter)"""
+    if len(order) == 1:
+        return (column[order[0]],)
+    return itemgetter(*order)(column)
+
+
+def _group_starts(sorted_keys):
+    """Начала групп в отсортированной колонке: индексы, где ключ меняется"""
+    n = len(sorted_keys)
+    changes = compress(range(1, n), map(ne, sorted_keys[:-1], sorted_keys[1:]))
+    return [0, *changes, n]
+
+
+def build_print_tree(frame):
+    """
+    Иерархия отдел → принтер → пользователь → документ, на каждом уровне по
+    убыванию страниц. Возвращает {"total_pages", "departments": [узлы]};
+    узел — {"id", "name", "total", <дети>}, лист — (документ, страниц, последняя печать).
+
+    Работа на Python идёт по узлам, а не по строкам: строки сортируются одним
+    sorted по int-ключу, колонки переставляются itemgetter, границы групп ищутся
+    через map/compress, а по итогам сортируются уже только группы.
+    """
+    n = len(frame)
+    if not n:
+        return {"total_pages": 0, "departments": []}
+
+    # составные коды уровней: (отдел, принтер) и (отдел, принтер, пользователь)
+    printer_span = max(frame.printer) + 1
+    user_span = max(frame.user) + 1
+    printer_key = array("q", map(add, map(mul, frame.dept, repeat(printer_span, n)), frame.printer))
+    user_key = list(map(add, map(mul, printer_key, repeat(user_span, n)), frame.user))
+
+    dept_total = _sum_by(frame.dept, frame.pages)
+    printer_total = _sum_by(printer_key, frame.pages)
+    user_total = _sum_by(user_key, frame.pages)
+
+    # строки сортируются по одному целочисленному ключу (пользователь в принтере, −страницы) —
+    # сравнение int, а не кортежей; порядок самих групп потом задаётся по итогам
+    max_pages = max(frame.pages)
+    row_key = list(map(add, map(mul, user_key, repeat(max_pages + 1, n)), map(sub, repeat(max_pages, n), frame.pages)))
+    order = sorted(range(n), key=row_key.__getitem__)
+    del row_key
+
+    s_user_key = _take(user_key, order)
+    s_doc = _take(frame.doc, order)
+    s_pages = _take(frame.pages, order)
+    s_time = _take(frame.last_time, order)
+
+    starts = _group_starts(s_user_key)
+    groups = []
+    for start, end in zip(starts, starts[1:]):
+        i = order[start]
+        d, pk, uk = frame.dept[i], printer_key[i], user_key[i]
+        groups.append((-dept_total[d], d, -printer_total[pk], pk, -user_total[uk], uk, frame.printer[i],
+                       frame.user[i], start, end))
+    groups.sort()
+
+    dept_names, printer_names, user_names = _labels(frame)
+    doc_name = frame.doc_names.__getitem__
+    departments = []
+    dept_node = printer_node = None
+    current_printer_key = None
+    for _, d, _, pk, _, uk, p, u, start, end in groups:
+        if dept_node is None or dept_node["id"] != d:
+            dept_node = {"id": d, "name": dept_names.get(d, str(d)), "total": dept_total[d], "printers": []}
+            departments.append(dept_node)
+        if current_printer_key != pk:
+            printer_node = {"id": p, "name": printer_names.get(p, str(p)), "total": printer_total[pk], "users": []}
+            dept_node["printers"].append(printer_node)
+            current_printer_key = pk
+        printer_node["users"].append({
+            "id": u,
+            "name": user_names.get(u, str(u)),
+            "total": user_total[uk],
+            "docs": list(zip(map(doc_name, s_doc[start:end]), s_pages[start:end], s_time[start:end])),
+        })
+
+    return {"total_pages": sum(dept_total.values()), "departments": departments}
+
+
+def iter_tree_rows(tree):
+    """Листья дерева в порядке отчёта: (отдел, принтер, пользователь, документ)"""
+    for dept in tree["departments"]:
+        for printer in dept["printers"]:
+            for user in printer["users"]:
+                for doc in user["docs"]:
+                    yield dept, printer, user, doc
@@ -0,0 +1,373 @@
+"""
+Архив событий печати: закрытые месяцы выгружаются из print_events в колоночные
+файлы (каталог на месяц) и удаляются из горячей таблицы.
+
+Формат месяца <ARCHIVE_DIR>/YYYY-MM/:
+    meta.json             — число строк, порядок байт, версия формата
+    <колонка>.i64         — числовые колонки, сырые int64 (mmap без копирования);
+                            timestamp — микросекунды от 1970-01-01, строки
+                            отсортированы по (timestamp, id), NULL хранится как -1
+    <колонка>.blk / .idx  — строковые колонки: блоки по BLOCK_ROWS значений,
+                            каждый сжат zlib; .idx — int64 смещения блоков
+
+Дневные агрегаты (print_daily_rollups) за архивные месяцы не удаляются,
+поэтому дерево печати и выгрузки видят архив без изменений в запросах.
+
+    python -m app.utils.archive --keep-months 3
+"""
+import json
+import logging
+import mmap
+import os
+import shutil
+import sys
+import threading
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, func
+from app.config import Config
+from app.extensions import db
+from app.models import PrintEvent
+
+logger = logging.getLogger("archive")
+
+FORMAT_VERSION = 1
+BLOCK_ROWS = 4096
+EXPORT_BATCH_SIZE = 50_000
+EPOCH = datetime(1970, 1, 1)
+INT_COLUMNS = ("id", "timestamp", "user_id", "printer_id", "document_id", "byte_size", "pages",
+               "computer_id", "port_id")
+STRING_COLUMNS = ("document_name", "job_id")
+_SEPARATOR = "\x00"  # в именах документов Windows NUL не встречается
+
+
+def to_micros(dt):
+    return (dt - EPOCH) // timedelta(microseconds=1)
+
+
+def from_micros(value):
+    return EPOCH + timedelta(microseconds=value)
+
+
+def month_key(dt):
+    return f"{dt.year:04d}-{dt.month:02d}"
+
+
+def month_range(key):
+    """'YYYY-MM' -> [начало месяца, начало следующего)"""
+    start = datetime.strptime(key, "%Y-%m")
+    end = datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start, end
+
+
+class MonthArchive:
+    """Чтение одного архивного месяца: числовые колонки через mmap, строки — по блокам"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.rows = self.meta["rows"]
+        self._columns = {}
+        self._maps = []
+
+    def column(self, name):
+        """Числовая колонка как последовательность int (memoryview поверх mmap)"""
+        col = self._columns.get(name)
+        if col is None:
+            with open(os.path.join(self.path, f"{name}.i64"), "rb") as f:
+                if self.meta["byteorder"] == sys.byteorder:
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    self._maps.append(mm)
+                    col = memoryview(mm).cast("q")
+                else:
+                    col = array("q")
+                    col.frombytes(f.read())
+                    col.byteswap()
+            self._columns[name] = col
+        return col
+
+    def strings(self, name, indices):
+        """Значения строковой колонки для набора строк: распаковываются только нужные блоки"""
+        offsets = self._block_index(name)
+        result, blocks = {}, {}
+        with open(os.path.join(self.path, f"{name}.blk"), "rb") as f:
+            for i in indices:
+                block_no = i // BLOCK_ROWS
+                values = blocks.get(block_no)
+                if values is None:
+                    f.seek(offsets[block_no])
+                    raw = f.read(offsets[block_no + 1] - offsets[block_no])
+                    values = blocks[block_no] = zlib.decompress(raw).decode("utf-8").split(_SEPARATOR)
+                result[i] = values[i % BLOCK_ROWS]
+        return result
+
+    def _block_index(self, name):
+        key = f"{name}.idx"
+        idx = self._columns.get(key)
+        if idx is None:
+            idx = array("q")
+            with open(os.path.join(self.path, key), "rb") as f:
+                idx.frombytes(f.read())
+            if self.meta["byteorder"] != sys.byteorder:
+                idx.byteswap()
+            self._columns[key] = idx
+        return idx
+
+    def close(self):
+        for col in self._columns.values():
+            if isinstance(col, memoryview):
+                col.release()
+        self._columns.clear()
+        for mm in self._maps:
+            mm.close()
+        self._maps.clear()
+
+
+class EventArchive:
+    """Набор архивных месяцев с обрезкой по диапазону дат"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._months = {}
+        self._listing = (None, [])
+
+    def months(self):
+        """Ключи архивных месяцев по возрастанию (список кэшируется по mtime каталога)"""
+        try:
+            mtime = os.stat(self.directory).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        with self._lock:
+            if self._listing[0] != mtime:
+                keys = sorted(
+                    name for name in os.listdir(self.directory)
+                    if len(name) == 7 and os.path.exists(os.path.join(self.directory, name, "meta.json"))
+                )
+                self._listing = (mtime, keys)
+            return self._listing[1]
+
+    def is_archived(self, dt):
+        return month_key(dt) in self.months()
+
+    def horizon(self):
+        """Начало первого неархивного месяца после самого нового архивного (или None)"""
+        months = self.months()
+        return month_range(months[-1])[1] if months else None
+
+    def month(self, key):
+        with self._lock:
+            archive = self._months.get(key)
+            if archive is None:
+                archive = self._months[key] = MonthArchive(os.path.join(self.directory, key))
+            return archive
+
+    def page(self, limit, start=None, end=None, cursor=None, printer_ids=None):
+        """
+        События из архива по убыванию (timestamp, id): не больше limit строк,
+        в диапазоне [start, end], строго после cursor=(timestamp, id).
+        Месяцы вне диапазона не открываются; внутри месяца границы ищутся бинарным поиском.
+        Возвращает список словарей с полями PrintEvent.
+        """
+        start_us = to_micros(start) if start else None
+        end_us = to_micros(end) if end else None
+        cursor_us, cursor_id = (to_micros(cursor[0]), cursor[1]) if cursor else (None, None)
+        uppers = [v for v in (end_us, cursor_us) if v is not None]
+        upper = min(uppers) if uppers else None
+
+        result = []
+        for key in reversed(self.months()):
+            month_start, month_end = month_range(key)
+            if start and month_end <= start:
+                break
+            if upper is not None and to_micros(month_start) > upper:
+                continue
+
+            m = self.month(key)
+            ts, ids, printers = m.column("timestamp"), m.column("id"), m.column("printer_id")
+            lo = bisect_left(ts, start_us) if start_us is not None else 0
+            hi = bisect_right(ts, upper) if upper is not None else m.rows
+
+            picked = []
+            i = hi - 1
+            while i >= lo and len(result) + len(picked) < limit:
+                if cursor_us is not None and ts[i] == cursor_us and ids[i] >= cursor_id:
+                    i -= 1
+                    continue
+                if printer_ids is None or printers[i] in printer_ids:
+                    picked.append(i)
+                i -= 1
+
+            if picked:
+                names = m.strings("document_name", picked)
+                columns = {name: m.column(name) for name in INT_COLUMNS}
+                for i in picked:
+                    row = {name: columns[name][i] for name in INT_COLUMNS}
+                    row["timestamp"] = from_micros(row["timestamp"])
+                    row["document_name"] = names[i]
+                    for name in ("computer_id", "port_id"):
+                        if row[name] < 0:
+                            row[name] = None
+                    result.append(row)
+            if len(result) >= limit:
+                break
+        return result
+
+    def close(self):
+        with self._lock:
+            for archive in self._months.values():
+                archive.close()
+            self._months.clear()
+
+
+class _StringColumnWriter:
+    def __init__(self, path):
+        self._blk = open(path + ".blk", "wb")
+        self._idx_path = path + ".idx"
+        self._offsets = array("q", [0])
+        self._buffer = []
+
+    def append(self, value):
+        self._buffer.append(value.replace(_SEPARATOR, " "))
+        if len(self._buffer) >= BLOCK_ROWS:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            self._blk.write(zlib.compress(_SEPARATOR.join(self._buffer).encode("utf-8"), 6))
+            self._offsets.append(self._blk.tell())
+            self._buffer = []
+
+    def close(self):
+        self._flush()
+        self._blk.close()
+        with open(self._idx_path, "wb") as f:
+            self._offsets.tofile(f)
+
+
+def archive_month(key, directory=None):
+    """
+    Выгружает месяц из print_events в <directory>/<key> и удаляет его строки из таблицы.
+    Файлы пишутся во временный каталог и публикуются rename после проверки числа строк.
+    """
+    directory = directory or Config.ARCHIVE_DIR
+    month_start, month_end = month_range(key)
+    target = os.path.join(directory, key)
+    if os.path.exists(target):
+        raise FileExistsError(f"Месяц {key} уже в архиве: {target}")
+
+    tmp = os.path.join(directory, f".{key}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    ints = {name: open(os.path.join(tmp, f"{name}.i64"), "wb") for name in INT_COLUMNS}
+    strings = {name: _StringColumnWriter(os.path.join(tmp, name)) for name in STRING_COLUMNS}
+    rows = 0
+    try:
+        query = (
+            select(*(getattr(PrintEvent, name) for name in INT_COLUMNS + STRING_COLUMNS))
+            .where(PrintEvent.timestamp >= month_start, PrintEvent.timestamp < month_end)
+            .order_by(PrintEvent.timestamp, PrintEvent.id)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        for batch in db.session.execute(query).partitions():
+            columns = list(zip(*batch))
+            for n, name in enumerate(INT_COLUMNS):
+                values = columns[n]
+                if name == "timestamp":
+                    values = map(to_micros, values)
+                elif name in ("computer_id", "port_id"):
+                    values = (-1 if v is None else v for v in values)
+                array("q", values).tofile(ints[name])
+            for n, name in enumerate(STRING_COLUMNS, start=len(INT_COLUMNS)):
+                for value in columns[n]:
+                    strings[name].append(value or "")
+            rows += len(batch)
+    finally:
+        for f in ints.values():
+            f.close()
+        for writer in strings.values():
+            writer.close()
+
+    if not rows:
+        shutil.rmtree(tmp)
+        return 0
+
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "version": FORMAT_VERSION,
+            "month": key,
+            "rows": rows,
+            "byteorder": sys.byteorder,
+            "block_rows": BLOCK_ROWS,
+            "int_columns": INT_COLUMNS,
+            "string_columns": STRING_COLUMNS,
+            "archived_at": datetime.now().isoformat(timespec="seconds"),
+        }, f, ensure_ascii=False)
+
+    # проверка перед удалением из горячей таблицы: архив читается и содержит все строки
+    check = MonthArchive(tmp)
+    archived = len(check.column("timestamp"))
+    check.close()
+    if archived != rows:
+        shutil.rmtree(tmp)
+        raise RuntimeError(f"Архив {key}: записано {archived} строк из {rows}")
+
+    os.rename(tmp, target)
+    # на секционированной таблице месяц уходит целиком DROP секции; остаток (секция default) — DELETE
+    from app.utils.partitions import drop_month_partition
+    deleted = drop_month_partition(key)
+    deleted += db.session.execute(
+        delete(PrintEvent).where(PrintEvent.timestamp >= month_start, PrintEvent.timestamp < month_end)
+    ).rowcount
+    db.session.commit()
+    logger.info(f"🗄️ Месяц {key} в архиве: {rows} событий, из горячей таблицы удалено {deleted}")
+    return rows
+
+
+def archive_closed_months(keep_months=None, directory=None, now=None):
+    """
+    Архивирует все месяцы старше keep_months полных месяцев от текущего.
+    Текущий месяц не архивируется никогда. Возвращает {месяц: строк}.
+    """
+    keep_months = Config.ARCHIVE_KEEP_MONTHS if keep_months is None else keep_months
+    directory = directory or Config.ARCHIVE_DIR
+    now = now or datetime.now()
+    index = now.year * 12 + now.month - 1 - max(keep_months, 0)
+    cutoff = datetime(index // 12, index % 12 + 1, 1)
+
+    oldest = db.session.scalar(select(func.min(PrintEvent.timestamp)))
+    if not oldest or oldest >= cutoff:
+        return {}
+
+    os.makedirs(directory, exist_ok=True)
+    done = {}
+    month = datetime(oldest.year, oldest.month, 1)
+    while month < cutoff:
+        key = month_key(month)
+        if not os.path.exists(os.path.join(directory, key)):
+            done[key] = archive_month(key, directory)
+        month = month_range(key)[1]
+    return done
+
+
+event_archive = EventArchive(Config.ARCHIVE_DIR)
+
+
+if __name__ == "__main__":
+    import argparse
+    from app import create_app
+    from app.config import DaemonConfig
+
+    parser = argparse.ArgumentParser(description="Архивация закрытых месяцев print_events")
+    parser.add_argument("--keep-months", type=int, default=Config.ARCHIVE_KEEP_MONTHS,
+                        help="сколько последних полных месяцев оставить в горячей таблице")
+    args = parser.parse_args()
+
+    app = create_app(DaemonConfig)  # пакетная работа — профиль демона
+    with app.app_context():
+        print("🗄️ Архивируем закрытые месяцы...")
+        print("✅ Готово:", archive_closed_months(args.keep_months))
@@ -0,0 +1,102 @@
+import hashlib
+import logging
+import math
+import threading
+from sqlalchemy import select
+from app.config import Config
+from app.extensions import db
+
+logger = logging.getLogger("import_events")
+
+
+class BloomFilter:
+    """
+    Фильтр Блума: «точно нет» или «возможно есть».
+    Размер битового массива и число хэшей считаются по ожидаемому числу
+    элементов и допустимой доле ложных срабатываний.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        # двойное хэширование: h1 + i * h2 по одному дайджесту blake2b
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def update(self, keys):
+        for key in keys:
+            self.add(key)
+
+    def __contains__(self, key):
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class JobIdFilter:
+    """
+    Фильтр уже загруженных job_id для импортёра событий.
+
+    Отрицательный ответ точен — такое событие новое, SELECT не нужен.
+    Положительный (уже виденные и редкие ложные срабатывания) проверяется
+    запросом. Заполняется из БД один раз, дальше пополняется вставленными job_id;
+    события, загруженные другим процессом, отсекает уникальный индекс.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self._filter = None
+
+    def warm(self):
+        """Загрузка всех job_id из БД (нужен app context)"""
+        from app.models import PrintEvent
+
+        bloom = BloomFilter(self.capacity, self.error_rate)
+        rows = db.session.scalars(select(PrintEvent.job_id).execution_options(yield_per=50_000))
+        bloom.update(rows)
+        with self._lock:
+            self._filter = bloom
+        if bloom.count > self.capacity:
+            logger.warning(f"⚠️ job_id в БД ({bloom.count}) больше JOB_FILTER_CAPACITY — растут ложные срабатывания")
+
+    def ensure_warm(self):
+        if self._filter is None:
+            self.warm()
+
+    def might_contain(self, job_id):
+        return self._filter is None or job_id in self._filter
+
+    def add_many(self, job_ids):
+        if self._filter is None:
+            return
+        with self._lock:
+            self._filter.update(job_ids)
+
+    def invalidate(self):
+        with self._lock:
+            self._filter = None
+
+    def stats(self):
+        bloom = self._filter
+        if bloom is None:
+            return {"warm": False}
+        return {"warm": True, "count": bloom.count, "bits": bloom.size, "hashes": bloom.hashes}
+
+
+job_filter = JobIdFilter(
+    capacity=Config.JOB_FILTER_CAPACITY,
+    error_rate=Config.JOB_FILTER_ERROR_RATE,
+)
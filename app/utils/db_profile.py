@@ -0,0 +1,101 @@
+"""
+Профиль движка БД: пул соединений, таймауты и прагмы по типу СУБД.
+
+Веб-приложение работает с профилем Config (много коротких читающих запросов,
+таймаут на запрос), демон импорта — с DaemonConfig (мало соединений, длинные
+пакетные записи без таймаута, крупные страницы INSERT).
+
+SQLite: WAL (читатели не ждут писателя), synchronous=NORMAL, busy_timeout и
+управление транзакциями самим SQLAlchemy — иначе драйвер pysqlite откладывает
+BEGIN до первой записи и ломает SAVEPOINT (begin_nested в импорте событий).
+Пишущие транзакции начинаются с BEGIN IMMEDIATE (SQLITE_BEGIN профиля демона,
+импорт в веб-приложении — через write_transactions): отложенная транзакция,
+которая сначала читает, при переходе к записи получает SQLITE_BUSY сразу,
+без ожидания busy_timeout, если блокировку держит другой писатель.
+PostgreSQL: pre_ping, recycle, statement_timeout и application_name в
+pg_stat_activity. Курсоры на стороне сервера включаются там, где выборка идёт
+через yield_per (выгрузки, прогрев фильтра job_id, архив).
+"""
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+logger = logging.getLogger("db_profile")
+
+# транзакции SQLite в текущем контексте (потоке) будут пишущими — BEGIN IMMEDIATE
+sqlite_write_transactions = ContextVar("sqlite_write_transactions", default=False)
+
+
+@contextmanager
+def write_transactions():
+    """with write_transactions(): ... — транзакции SQLite внутри блока берут блокировку записи сразу"""
+    token = sqlite_write_transactions.set(True)
+    try:
+        yield
+    finally:
+        sqlite_write_transactions.reset(token)
+
+
+def _is_memory_sqlite(url):
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS для Flask-SQLAlchemy из настроек DB_* профиля"""
+    url = make_url(config["SQLALCHEMY_DATABASE_URI"])
+    options = {"insertmanyvalues_page_size": config["DB_INSERT_PAGE_SIZE"]}
+    if _is_memory_sqlite(url):
+        return options  # одно общее соединение (StaticPool) — настраивать нечего
+
+    options.update(
+        pool_size=config["DB_POOL_SIZE"],
+        max_overflow=config["DB_MAX_OVERFLOW"],
+        pool_timeout=config["DB_POOL_TIMEOUT"],
+    )
+    backend = url.get_backend_name()
+    if backend == "sqlite":
+        # ждём блокировку писателя сами, а не падаем с "database is locked"
+        options["connect_args"] = {"timeout": config["SQLITE_BUSY_TIMEOUT_MS"] / 1000}
+    else:
+        options.update(pool_pre_ping=True, pool_recycle=config["DB_POOL_RECYCLE"])
+    if backend == "postgresql":
+        settings = [f"-c application_name={config['DB_APPLICATION_NAME']}"]
+        if config["DB_STATEMENT_TIMEOUT_MS"]:
+            settings.append(f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}")
+        options["connect_args"] = {"options": " ".join(settings)}
+    return options
+
+
+def install_engine_events(engine, config):
+    """Прагмы SQLite на каждое новое соединение и явный BEGIN от SQLAlchemy (SQLITE_BEGIN профиля)"""
+    if engine.dialect.name != "sqlite":
+        return
+    pragmas = [
+        f"PRAGMA busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        f"PRAGMA synchronous = {config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA cache_size = -{int(config['SQLITE_CACHE_SIZE_KB'])}",
+        "PRAGMA temp_store = MEMORY",
+    ]
+    if not _is_memory_sqlite(engine.url):
+        pragmas.insert(0, f"PRAGMA journal_mode = {config['SQLITE_JOURNAL_MODE']}")
+
+    @event.listens_for(engine, "connect")
+    def _sqlite_on_connect(dbapi_connection, connection_record):
+        # транзакциями управляет SQLAlchemy (см. _sqlite_on_begin), а не pysqlite
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    default_begin = f"BEGIN {config['SQLITE_BEGIN']}"
+
+    @event.listens_for(engine, "begin")
+    def _sqlite_on_begin(connection):
+        connection.exec_driver_sql("BEGIN IMMEDIATE" if sqlite_write_transactions.get() else default_begin)
+
+    logger.info(f"🗄️ Профиль SQLite {config['DB_PROFILE']}: {default_begin}; " + "; ".join(pragmas))
@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import func, select
+from app.config import Config
+from app.extensions import db
+from app.models import Building, Department, PrinterModel, Printer, User, Computer, Port
+
+
+# вид справочника -> (модель, колонка с нормализуемым ключом)
+DIMENSIONS = {
+    "building": (Building, Building.code),
+    "department": (Department, Department.code),
+    "model": (PrinterModel, PrinterModel.code),
+    "user": (User, User.username),
+    "computer": (Computer, Computer.hostname),
+    "port": (Port, Port.name),
+}
+
+
+class DimensionCache:
+    """
+    Общий кэш id справочников: ключ — нормализованный (lower) код/имя,
+    для принтеров — (building_id, room_number, printer_index).
+    LRU-вытеснение по размеру + TTL на запись, счётчики попаданий/промахов.
+    """
+
+    def __init__(self, max_size=100_000, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        self._data = {kind: OrderedDict() for kind in (*DIMENSIONS, "printer")}
+
+    def get_many(self, kind, keys):
+        """Возвращает ({key: id} найденных, [ключи-промахи])"""
+        found, missing = {}, []
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._data[kind]
+            for key in keys:
+                entry = bucket.get(key)
+                if entry and entry[1] > now:
+                    bucket.move_to_end(key)
+                    found[key] = entry[0]
+                else:
+                    if entry:
+                        del bucket[key]
+                    missing.append(key)
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def get(self, kind, key):
+        found, _ = self.get_many(kind, [key])
+        return found.get(key)
+
+    def put_many(self, kind, mapping):
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            bucket = self._data[kind]
+            for key, value in mapping.items():
+                bucket[key] = (value, expires)
+                bucket.move_to_end(key)
+            while len(bucket) > self.max_size:
+                bucket.popitem(last=False)
+
+    def put(self, kind, key, value):
+        self.put_many(kind, {key: value})
+
+    def invalidate(self, kind=None):
+        with self._lock:
+            for name in ([kind] if kind else self._data):
+                self._data[name].clear()
+
+    def warm(self):
+        """Однократная загрузка справочников из БД (нужен app context)"""
+        for kind, (model, column) in DIMENSIONS.items():
+            rows = db.session.execute(select(func.lower(column), model.id).limit(self.max_size))
+            self.put_many(kind, dict(rows.all()))
+
+        rows = db.session.execute(
+            select(Printer.building_id, func.lower(Printer.room_number), Printer.printer_index, Printer.id)
+            .limit(self.max_size)
+        )
+        self.put_many("printer", {(b, room, idx): pid for b, room, idx, pid in rows})
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": {kind: len(bucket) for kind, bucket in self._data.items()},
+            }
+
+
+dimension_cache = DimensionCache(
+    max_size=Config.DIMENSION_CACHE_SIZE,
+    ttl=Config.DIMENSION_CACHE_TTL,
+)
@@ -0,0 +1,179 @@
+import ctypes
+import ctypes.util
+import fnmatch
+import os
+import select
+import struct
+import sys
+import time
+
+# 🐧 флаги inotify (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class PollingWatcher:
+    """
+    Запасной вариант: периодический просмотр каталога.
+    Файл считается дописанным, если его mtime старше debounce секунд.
+    """
+
+    def __init__(self, directory, patterns, debounce=0.2, interval=10):
+        self.directory = directory
+        self.patterns = patterns
+        self.debounce = debounce
+        self.interval = interval
+        self._first_seen = {}
+
+    def matches(self, name):
+        return any(fnmatch.fnmatch(name, p) for p in self.patterns)
+
+    def scan(self):
+        """Полный просмотр каталога: [(path, detected_at)] для дописанных файлов"""
+        now = time.time()
+        ready, present = [], set()
+        for entry in os.scandir(self.directory):
+            if not entry.is_file() or not self.matches(entry.name):
+                continue
+            present.add(entry.path)
+            first_seen = self._first_seen.setdefault(entry.path, now)
+            try:
+                if now - entry.stat().st_mtime >= self.debounce:
+                    ready.append((entry.path, first_seen))
+            except FileNotFoundError:
+                pass
+        # забываем файлы, которые уже забрали (свои или чужие воркеры)
+        for path in set(self._first_seen) - present:
+            del self._first_seen[path]
+        return ready
+
+    def pending(self):
+        """Сколько файлов замечено, но ещё не отдано (ждут debounce)"""
+        return 0
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        return self.scan()
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(PollingWatcher):
+    """
+    Наблюдение через inotify (Linux): реакция на IN_CLOSE_WRITE / IN_MOVED_TO
+    за миллисекунды вместо интервала опроса.
+
+    Частично записанные файлы отсеиваются debounce: файл отдаётся только после
+    close/move и если за debounce секунд его размер и mtime не изменились.
+    При переполнении очереди inotify выполняется полный scan().
+    """
+
+    def __init__(self, directory, patterns, debounce=0.2, interval=10):
+        super().__init__(directory, patterns, debounce, interval)
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        if libc.inotify_add_watch(self._fd, os.fsencode(directory), mask) < 0:
+            err = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(err, f"inotify_add_watch failed for {directory}")
+        # path -> {"detected": t, "due": t, "closed": bool, "stat": (size, mtime)}
+        self._pending = {}
+        self._rescan = False
+
+    def pending(self):
+        return len(self._pending)
+
+    def _arm(self, path, closed, now):
+        item = self._pending.setdefault(path, {"detected": now, "closed": False, "stat": None})
+        item["closed"] = item["closed"] or closed
+        item["due"] = now + self.debounce
+        item["stat"] = None
+        if closed:
+            try:
+                st = os.stat(path)
+                item["stat"] = (st.st_size, st.st_mtime)
+            except FileNotFoundError:
+                pass
+
+    def _read_events(self):
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        now = time.time()
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                self._rescan = True
+                continue
+            if not name or not self.matches(name):
+                continue
+            self._arm(os.path.join(self.directory, name), bool(mask & (IN_CLOSE_WRITE | IN_MOVED_TO)), now)
+
+    def _collect_ready(self):
+        now = time.time()
+        ready = []
+        for path, item in list(self._pending.items()):
+            if not item["closed"] or item["due"] > now:
+                continue
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                del self._pending[path]
+                continue
+            current = (st.st_size, st.st_mtime)
+            if item["stat"] != current:
+                # файл ещё меняется — ждём ещё один интервал
+                item["stat"] = current
+                item["due"] = now + self.debounce
+                continue
+            ready.append((path, item["detected"]))
+            del self._pending[path]
+        return ready
+
+    def wait(self, timeout):
+        deadline = time.time() + timeout
+        while True:
+            ready = self._collect_ready()
+            if self._rescan:
+                self._rescan = False
+                known = {path for path, _ in ready}
+                ready += [r for r in self.scan() if r[0] not in known]
+            if ready:
+                return ready
+
+            now = time.time()
+            if now >= deadline:
+                return []
+            dues = [item["due"] for item in self._pending.values() if item["closed"]]
+            select_timeout = max(0.0, min([deadline, *dues]) - now)
+            readable, _, _ = select.select([self._fd], [], [], select_timeout)
+            if readable:
+                self._read_events()
+
+    def close(self):
+        os.close(self._fd)
+
+
+def make_watcher(directory, patterns, debounce=0.2, interval=10, logger=None):
+    """inotify на Linux, иначе (или при ошибке инициализации) — опрос каталога"""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(directory, patterns, debounce, interval)
+        except (OSError, AttributeError) as e:
+            if logger:
+                logger.warning(f"⚠️ inotify недоступен ({e}), переключаемся на опрос")
+    return PollingWatcher(directory, patterns, debounce, interval)
@@ -0,0 +1,142 @@
+"""
+Нормализация сырых событий печати: словарь из выгрузки -> компактная запись NormalizedEvent.
+
+Стадия не обращается к БД и не зависит от приложения: normalize_batch можно
+вызывать и в отдельном процессе (сравнение с пулом процессов — bench.normalizer).
+
+    TimeCreated  /Date(1700000000000)/ (ConvertTo-Json Windows PowerShell),
+                 /Date(1700000000000+0300)/ или ISO 8601 (PowerShell 7, другие выгрузки)
+    Param5       принтер model-bld-dept-room-idx
+    Param6       порт в том же формате
+    Param4       компьютер bld-dept-room-num (или произвольное имя)
+
+Имена принтеров, портов и компьютеров повторяются от события к событию, поэтому
+их разбор кэшируется (lru_cache) по исходной строке.
+"""
+import json
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+NAME_CACHE_SIZE = 65536  # различных имён на справочник
+
+DATE_MS_RE = re.compile(r"/?Date\((-?\d+)(?:[+-]\d{4})?\)/?")
+ISO_FRACTION_RE = re.compile(r"(\.\d{6})\d+")
+PRINTER_RE = re.compile(r"([^-]*)-([^-]*)-([^-]*)-([^-]*)-(\d+)")
+PORT_RE = re.compile(r"([^-]*)-([^-]*)-([^-]*)-([^-]*)-([^-]*)")
+COMPUTER_RE = re.compile(r"([^-]*)-([^-]*)-([^-]*)-([^-]*)")
+
+
+class NormalizedEvent(NamedTuple):
+    username: str
+    document_name: str
+    document_id: int
+    byte_size: int
+    pages: int
+    timestamp: datetime
+    job_id: str
+    printer_name: str
+    printer: Optional[tuple]  # (model, bld, dept, room, index) или None — неверный формат
+    computer_name: str
+    computer: Optional[tuple]  # (bld, dept, room, num) или None — имя не по шаблону
+    port_name: str
+    port: Optional[tuple]  # (model, bld, dept, room, index) или None
+
+
+def parse_timestamp(value):
+    """
+    Время события в локальном времени без tzinfo (как datetime.fromtimestamp):
+    /Date(ms)/ — миллисекунды epoch (смещение в скобках ConvertTo-Json не влияет на момент),
+    ISO 8601 — с зоной переводится в локальное время, без зоны берётся как есть
+    """
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value / 1000)
+    if value[:6] == "/Date(":
+        try:
+            return datetime.fromtimestamp(int(value[6:-2]) / 1000)
+        except ValueError:
+            pass  # со смещением /Date(ms+0300)/ или мусор — ниже, регуляркой
+    match = DATE_MS_RE.fullmatch(value)
+    if match:
+        return datetime.fromtimestamp(int(match.group(1)) / 1000)
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        # .NET пишет 7 знаков долей секунды, fromisoformat до Python 3.11 — не больше 6
+        parsed = datetime.fromisoformat(ISO_FRACTION_RE.sub(r"\1", value))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def parse_printer_name(name):
+    """'HP-B1-IT-101-2' -> ('hp', 'b1', 'it', '101', 2); None — не пять частей или номер не число"""
+    match = PRINTER_RE.fullmatch(name.strip().lower())
+    if not match:
+        return None
+    model_code, bld_code, dept_code, room_number, printer_index = match.groups()
+    return model_code, bld_code, dept_code, room_number, int(printer_index)
+
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def parse_port_name(name):
+    """Порт (уже в нижнем регистре) -> (model, bld, dept, room, index); нечисловой номер — 0"""
+    match = PORT_RE.fullmatch(name)
+    if not match:
+        return None
+    model_code, bld_code, dept_code, room_number, index = match.groups()
+    return model_code, bld_code, dept_code, room_number, int(index) if index.isdigit() else 0
+
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def parse_computer_name(name):
+    """Компьютер (уже в нижнем регистре) -> (bld, dept, room, num); нечисловой номер — 0"""
+    match = COMPUTER_RE.fullmatch(name)
+    if not match:
+        return None
+    bld_code, dept_code, room_number, num = match.groups()
+    return bld_code, dept_code, room_number, int(num) if num.isdigit() else 0
+
+
+def normalize_event(e):
+    """Сырое событие -> NormalizedEvent; исключение — если событие не разобрать"""
+    get = e.get
+    printer_name = get("Param5") or ""
+    computer_name = (get("Param4") or "").strip().lower()
+    port_name = (get("Param6") or "").strip().lower()
+    return NormalizedEvent(
+        username=(get("Param3") or "").strip().lower(),
+        document_name=get("Param2") or "",
+        document_id=int(get("Param1") or 0),
+        byte_size=int(get("Param7") or 0),
+        pages=int(get("Param8") or 0),
+        timestamp=parse_timestamp(get("TimeCreated")),
+        job_id=get("JobID") or "UNKNOWN",
+        printer_name=printer_name,
+        printer=parse_printer_name(printer_name),
+        computer_name=computer_name,
+        computer=parse_computer_name(computer_name) if computer_name else None,
+        port_name=port_name,
+        port=parse_port_name(port_name),
+    )
+
+
+def normalize_batch(events):
+    """
+    Пакет сырых событий -> (записи, тексты ошибок).
+    Событие — словарь или строка NDJSON: строки разбираются здесь же, так что в процесс-обработчик
+    можно передать текст, а не уже разобранные словари
+    """
+    records, errors = [], []
+    append = records.append
+    for e in events:
+        try:
+            append(normalize_event(json.loads(e) if isinstance(e, str) else e))
+        except Exception as ex:
+            errors.append(str(ex))
+    return records, errors
+
@@ -0,0 +1,213 @@
+import codecs
+import gzip
+import hashlib
+import io
+import json
+from xml.etree.ElementTree import XMLPullParser
+
+try:
+    import zstandard
+except ImportError:  # необязательная зависимость: без неё файлы .zst не принимаются
+    zstandard = None
+
+READ_SIZE = 64 * 1024  # символов за одно чтение
+SNIFF_SIZE = 4096  # байт начала файла для определения формата
+_WHITESPACE = " \t\r\n"
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+COMPRESSED_SUFFIXES = (".gz", ".zst")
+DECOMPRESS_BUFFER = 1024 * 1024  # байт распакованных данных за одно чтение
+
+XML_EVENT_ID = "307"  # DocumentPrinted, журнал Microsoft-Windows-PrintService/Operational
+XML_PARAMS = tuple(f"Param{i}" for i in range(1, 9))
+
+
+def text_stream(binary_fp, encoding="utf-8-sig"):
+    """Инкрементальный декодер поверх бинарного потока (загрузка Flask, open(..., "rb"))"""
+    return codecs.getreader(encoding)(binary_fp)
+
+
+def strip_compression_suffix(filename):
+    """'x-prn-event.json.gz' -> 'x-prn-event.json' — для проверки расширения загрузки"""
+    for suffix in COMPRESSED_SUFFIXES:
+        if filename.endswith(suffix):
+            return filename[:-len(suffix)]
+    return filename
+
+
+def decompressed(binary_fp):
+    """
+    Бинарный поток с распаковкой на лету по сигнатуре (gzip, zstd) или исходный,
+    если сжатия нет. Распаковывается по мере чтения — файл целиком не раздувается
+    ни в памяти, ни на диске. Результат поддерживает peek (см. sniff_events_format)
+    """
+    if not hasattr(binary_fp, "peek"):
+        binary_fp = io.BufferedReader(binary_fp)
+    head = binary_fp.peek(len(ZSTD_MAGIC))
+    if head.startswith(GZIP_MAGIC):
+        return gzip.GzipFile(fileobj=binary_fp, mode="rb")
+    if head.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise ValueError("Файл сжат zstd, но пакет zstandard не установлен (pip install zstandard)")
+        reader = zstandard.ZstdDecompressor().stream_reader(binary_fp, read_size=DECOMPRESS_BUFFER)
+        return io.BufferedReader(reader, DECOMPRESS_BUFFER)
+    return binary_fp
+
+
+def sniff_events_format(binary_fp):
+    """
+    Формат и кодировка выгрузки событий по началу потока: ("xml" | "json", кодировка).
+    Поток читается через peek, позиция не меняется — годится и распакованный поток.
+    UTF-16 с BOM — Out-File и перенаправление вывода в Windows PowerShell 5
+    """
+    head = binary_fp.peek(SNIFF_SIZE)[:SNIFF_SIZE]
+    encoding = "utf-16" if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)) else "utf-8-sig"
+    text = head.decode(encoding, errors="ignore").lstrip("\ufeff" + _WHITESPACE)
+    return ("xml" if text.startswith("<") else "json"), encoding
+
+
+def iter_json_events(fp, read_size=READ_SIZE):
+    """
+    Потоково отдаёт события из текстового потока, не читая файл целиком.
+
+    Поддерживаются JSON-массив (вывод ConvertTo-Json), одиночный объект
+    и NDJSON (по объекту на строку). В памяти держится только текущий буфер.
+    """
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+    in_array = None
+
+    while True:
+        # пропускаем пробелы и разделители между элементами
+        while pos < len(buf) and (buf[pos] in _WHITESPACE or (in_array and buf[pos] == ",")):
+            pos += 1
+
+        if pos >= len(buf):
+            if eof:
+                if in_array:
+                    raise ValueError("Неожиданный конец JSON-массива")
+                return
+            buf, pos = fp.read(read_size), 0
+            if not buf:
+                eof = True
+            elif in_array is None:
+                buf = buf.lstrip("\ufeff")
+            continue
+
+        if in_array is None:
+            in_array = buf[pos] == "["
+            if in_array:
+                pos += 1
+            continue
+
+        if in_array and buf[pos] == "]":
+            return
+
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = fp.read(read_size)
+            if not chunk:
+                eof = True
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+
+        pos = end
+        yield obj
+
+
+def iter_chunks(items, size):
+    """Режет итератор на списки не длиннее size"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _local(tag):
+    """'{namespace}Event' -> 'Event'"""
+    return tag.rpartition("}")[2]
+
+
+def xml_job_id(system_time, user, document, printer):
+    """JobID как в export_print_events.ps1: SHA-256 от «время UTC до секунд|пользователь|документ|принтер»"""
+    key = f"{system_time[:19]}|{user or ''}|{document or ''}|{printer or ''}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest().upper()
+
+
+def xml_event_to_dict(elem):
+    """
+    <Event> -> событие в формате выгрузки PowerShell: TimeCreated (System/TimeCreated/@SystemTime,
+    ISO 8601 UTC), Param1–Param8 из UserData/DocumentPrinted и JobID. None — не событие печати
+    """
+    system_time, event_id, params = None, None, None
+    for child in elem:
+        name = _local(child.tag)
+        if name == "System":
+            for item in child:
+                item_name = _local(item.tag)
+                if item_name == "EventID":
+                    event_id = (item.text or "").strip()
+                elif item_name == "TimeCreated":
+                    system_time = item.get("SystemTime")
+        elif name == "UserData":
+            for data in child:
+                if _local(data.tag) == "DocumentPrinted":
+                    params = {_local(p.tag): p.text for p in data}
+    if event_id != XML_EVENT_ID or params is None:
+        return None
+    e = {"TimeCreated": system_time}
+    for name in XML_PARAMS:
+        e[name] = params.get(name)
+    e["JobID"] = xml_job_id(system_time, e["Param3"], e["Param2"], e["Param5"]) if system_time else None
+    return e
+
+
+def iter_xml_events(fp, read_size=READ_SIZE):
+    """
+    Потоково отдаёт события печати из XML-выгрузки журнала (wevtutil qe /f:xml):
+    подряд идущие <Event> без общего корня или внутри <Events> (wevtutil /e:Events).
+
+    Разбор инкрементальный (XMLPullParser): разобранные <Event> сразу удаляются
+    из дерева, в памяти держится только текущий буфер и одно событие.
+    События с другим EventID пропускаются.
+    """
+    parser = XMLPullParser(events=("start", "end"))
+    parser.feed("<Stream>")  # у выгрузки wevtutil нет общего корня
+    stack, first = [], True
+
+    while True:
+        chunk = fp.read(read_size)
+        if first:
+            first = False
+            chunk = chunk.lstrip("\ufeff" + _WHITESPACE)
+            if chunk.startswith("<?xml"):  # объявление допустимо только в начале документа
+                chunk = chunk[chunk.index("?>") + 2:]
+        if chunk:
+            parser.feed(chunk)
+        else:
+            parser.feed("</Stream>")
+
+        for kind, elem in parser.read_events():
+            if kind == "start":
+                stack.append(elem)
+                continue
+            stack.pop()
+            if _local(elem.tag) != "Event":
+                continue
+            e = xml_event_to_dict(elem)
+            if stack:
+                stack[-1].clear()  # разобранное событие больше не нужно дереву
+            if e is not None:
+                yield e
+
+        if not chunk:
+            parser.close()
+            return
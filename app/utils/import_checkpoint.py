@@ -0,0 +1,46 @@
+import json
+import os
+
+
+class ImportCheckpoint:
+    """
+    Сохранённый прогресс импорта файла: сколько событий уже закоммичено.
+
+    Хранится в <directory>/<name>.json вместе с размером исходника — если файл
+    подменили, чекпоинт игнорируется и импорт начинается заново. mtime не
+    учитывается: демон обновляет его у захваченного файла как heartbeat.
+    """
+
+    def __init__(self, source_path, directory, name=None):
+        self.source_path = source_path
+        self.name = name or os.path.basename(source_path)
+        self.path = os.path.join(directory, f"{self.name}.json")
+        os.makedirs(directory, exist_ok=True)
+        self.position = self._load()
+
+    def _signature(self):
+        return {"size": os.path.getsize(self.source_path)}
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if data.get("source") != self._signature():
+            return 0
+        return int(data.get("position", 0))
+
+    def save(self, position):
+        self.position = position
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"source": self._signature(), "position": position}, f)
+        os.replace(tmp, self.path)  # атомарно: чекпоинт не бывает недописанным
+
+    def clear(self):
+        self.position = 0
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,221 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from app.config import Config
+from app.utils.db_profile import write_transactions
+from app.utils.event_stream import decompressed, sniff_events_format, text_stream
+from app.utils.import_print_events import import_print_events_from_stream
+from app.utils.import_users import import_users_from_csv, sync_users_from_csv
+from app.utils.metrics import metrics, profiler, sql_scope
+
+logger = logging.getLogger("import_events")
+
+SPOOL_BUFFER = 1024 * 1024  # байт за одну запись при сохранении загрузки
+PROGRESS_SAVE_INTERVAL = 1.0  # seconds — как часто состояние задачи сбрасывается на диск
+ERRORS_KEPT = 20  # сколько текстов ошибок хранится в статусе задачи
+
+# общий для процесса слот писателя: задачи веб-импорта и потоки демона пишут по очереди,
+# а каждый пакет коммитится сразу (см. _import_chunks) — без длинных пишущих транзакций
+write_slot = threading.BoundedSemaphore(Config.IMPORT_WRITERS)
+
+
+def import_file(path, kind, progress=None, checkpoint=None, write_slot=None, sync=False, update_existing=False):
+    """
+    Импорт файла с диска — общий код демона и фоновых задач веб-приложения.
+    kind: "events" (JSON/NDJSON/XML wevtutil — по содержимому) или "users"
+    (ad_users.csv; sync — дельта-синхронизация с AD).
+    Файлы, сжатые gzip или zstd, распаковываются на лету (сжатие определяется по сигнатуре)
+    """
+    scope = sql_scope.set(f"import_{kind}")
+    status = "failed"
+    try:
+        # импорт пишет: на SQLite транзакции берут блокировку записи сразу (BEGIN IMMEDIATE)
+        with metrics.timer("advisor_import_file_seconds", kind=kind), profiler.profile(), write_transactions():
+            result = _import_file(path, kind, progress, checkpoint, write_slot, sync, update_existing)
+        status = "done"
+        return result
+    finally:
+        metrics.inc("advisor_import_files_total", kind=kind, status=status)
+        sql_scope.reset(scope)
+
+
+def _import_file(path, kind, progress, checkpoint, write_slot, sync, update_existing):
+    with open(path, "rb") as raw, decompressed(raw) as f:
+        if kind == "users":
+            with write_slot or nullcontext():
+                if sync:
+                    return sync_users_from_csv(f)
+                return import_users_from_csv(f, update_existing=update_existing)
+        fmt, encoding = sniff_events_format(f)
+        return import_print_events_from_stream(
+            text_stream(f, encoding),
+            fmt=fmt,
+            progress=progress,
+            checkpoint=checkpoint,
+            write_slot=write_slot,
+        )
+
+
+class ImportJob:
+    """Состояние фоновой задачи импорта: статус, прогресс, итог"""
+
+    def __init__(self, kind, filename, path, options):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.filename = filename
+        self.path = path
+        self.options = options
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.processed = 0
+        self.created = 0
+        self.errors = 0
+        self.result = None
+        self.error = None
+        self._saved_at = 0.0
+
+    def progress(self, processed, created, errors):
+        self.processed, self.created, self.errors = processed, created, errors
+
+    def to_dict(self):
+        elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0.0
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "filename": self.filename,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "processed": self.processed,
+            "created": self.created,
+            "errors": self.errors,
+            "rate": round(self.processed / elapsed, 1) if elapsed else 0.0,
+            "elapsed": round(elapsed, 3),
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class ImportJobQueue:
+    """
+    Локальная очередь импорта для веб-приложения: загрузка сохраняется в спул
+    на диске, запрос сразу получает id задачи, а импорт выполняется фоновым
+    пулом потоков тем же кодом, что и в демоне (import_file).
+
+    Состояние задачи дублируется в <spool>/<id>.json, поэтому статус можно
+    спросить у любого процесса веб-сервера, а не только у принявшего загрузку.
+    """
+
+    def __init__(self, spool_dir, workers=1, keep=100):
+        self.spool_dir = spool_dir
+        self.workers = workers
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._executor = None
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="import-job")
+            return self._executor
+
+    def _state_path(self, job_id):
+        return os.path.join(self.spool_dir, f"{job_id}.json")
+
+    def _save(self, job, force=True):
+        now = time.time()
+        if not force and now - job._saved_at < PROGRESS_SAVE_INTERVAL:
+            return
+        job._saved_at = now
+        tmp = self._state_path(job.id) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(job.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp, self._state_path(job.id))
+
+    def submit(self, app, kind, stream, filename, **options):
+        """Сохраняет поток загрузки в спул и ставит задачу в очередь"""
+        os.makedirs(self.spool_dir, exist_ok=True)
+        job = ImportJob(kind, filename, None, options)
+        job.path = os.path.join(self.spool_dir, f"{job.id}.upload")
+        with open(job.path, "wb") as out:
+            shutil.copyfileobj(stream, out, SPOOL_BUFFER)
+        self._save(job)
+
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.keep:
+                old_id, old = self._jobs.popitem(last=False)
+                if old.status in ("done", "failed"):
+                    try:
+                        os.remove(self._state_path(old_id))
+                    except OSError:
+                        pass
+        self._pool().submit(self._run, app, job)
+        logger.info(f"📥 Задача импорта {job.id} ({kind}, {filename}) поставлена в очередь")
+        return job
+
+    def _run(self, app, job):
+        job.status, job.started_at = "running", time.time()
+        self._save(job)
+
+        def progress(processed, created, errors):
+            job.progress(processed, created, errors)
+            self._save(job, force=False)
+
+        with app.app_context():
+            try:
+                result = import_file(job.path, job.kind, progress=progress, write_slot=write_slot, **job.options)
+                errors = result.get("errors", [])
+                job.result = {
+                    **{k: v for k, v in result.items() if k != "errors"},
+                    "errors": errors[:ERRORS_KEPT],
+                }
+                job.created = result.get("created", 0)
+                job.errors = len(errors)
+                job.status = "done"
+            except Exception as e:
+                logger.error(f"💥 Задача импорта {job.id} ({job.filename}) упала: {e}")
+                job.error, job.status = str(e), "failed"
+            finally:
+                job.finished_at = time.time()
+                try:
+                    os.remove(job.path)
+                except OSError:
+                    pass
+                self._save(job)
+        logger.info(f"✅ Задача импорта {job.id}: {job.status}, {job.to_dict()['rate']} строк/с")
+
+    def get(self, job_id):
+        """Статус задачи (dict) или None"""
+        job = self._jobs.get(job_id)
+        if job:
+            return job.to_dict()
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(self._state_path(job_id), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def recent(self, limit=20):
+        with self._lock:
+            jobs = list(self._jobs.values())[-limit:]
+        return [job.to_dict() for job in reversed(jobs)]
+
+
+import_jobs = ImportJobQueue(
+    spool_dir=Config.IMPORT_SPOOL_DIR,
+    workers=Config.IMPORT_JOB_WORKERS,
+)
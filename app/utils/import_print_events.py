@@ -1,7 +1,21 @@
 import logging
-from datetime import datetime
-from sqlalchemy import func
+import time
+from collections import Counter
+from contextlib import nullcontext
+from itertools import islice
+from sqlalchemy import func, select, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import DataError, IntegrityError
+from app.config import Config
 from app.extensions import db
+from app.utils.event_stream import iter_json_events, iter_xml_events, iter_chunks
+from app.utils.event_normalizer import normalize_batch, normalize_event
+from app.utils.dimension_cache import DIMENSIONS, dimension_cache
+from app.utils.bloom import job_filter
+from app.utils.archive import event_archive, month_key
+from app.utils.partitions import job_id_conflict_columns
+from app.utils.metrics import metrics
+from app.utils.rollups import update_rollups
 from app.models import (
     User, Printer, PrinterModel, Building, Department,
     PrintEvent, Computer, Port
@@ -19,32 +33,33 @@ def ci_filter(model, column, value):
     return model.query.filter(func.lower(column) == value.lower()).first()
 
 
-def import_print_events_from_json(events):
-    created, errors = 0, []
+def import_print_events_from_json(events, bulk=True, commit_every=None):
+    """Импорт событий печати. По умолчанию — пакетный режим (см. import_print_events_bulk)"""
+    if bulk:
+        return import_print_events_bulk(events, commit_every=commit_every)
+
+    created, skipped, errors = 0, 0, []
+    new_events = []
 
     for e in events:
         try:
             with db.session.begin_nested():
-                username = (e.get("Param3") or "").strip().lower()
-                document_name = e.get("Param2") or ""
-                document_id = int(e.get("Param1") or 0)
-                byte_size = int(e.get("Param7") or 0)
-                pages = int(e.get("Param8") or 0)
-                timestamp_ms = int(e.get("TimeCreated").replace("/Date(", "").replace(")/", ""))
-                timestamp = datetime.fromtimestamp(timestamp_ms / 1000)
-                job_id = e.get("JobID") or "UNKNOWN"
+                p = normalize_event(e)
+                username, job_id, timestamp = p.username, p.job_id, p.timestamp
 
                 if PrintEvent.query.filter_by(job_id=job_id).first():
+                    skipped += 1
+                    continue
+
+                if event_archive.is_archived(timestamp):
+                    errors.append(f"❌ Месяц {month_key(timestamp)} уже в архиве, событие не импортировано: {job_id}")
                     continue
 
-                printer_name = (e.get("Param5") or "")
-                printer_parts = printer_name.strip().lower().split("-")
-                if len(printer_parts) != 5:
-                    errors.append(f"❌ Неверный формат принтера: {printer_name}")
+                if p.printer is None:
+                    errors.append(f"❌ Неверный формат принтера: {p.printer_name}")
                     continue
 
-                model_code, bld_code, dept_code, room_number, printer_index = printer_parts
-                printer_index = int(printer_index)
+                model_code, bld_code, dept_code, room_number, printer_index = p.printer
 
                 building = ci_filter(Building, Building.code, bld_code) or Building(code=bld_code, name=bld_code.upper())
                 db.session.add(building)
@@ -80,14 +95,12 @@ def import_print_events_from_json(events):
 
                 # Computer
                 computer = None
-                computer_name = (e.get("Param4") or "").strip().lower()
+                computer_name = p.computer_name
                 if computer_name:
                     computer = ci_filter(Computer, Computer.hostname, computer_name)
                     if not computer:
-                        parts = computer_name.split("-")
-                        if len(parts) == 4:
-                            bld, dept, room, num = parts
-                            num = int(num) if num.isdigit() else 0
+                        if p.computer:
+                            bld, dept, room, num = p.computer
                             cb = ci_filter(Building, Building.code, bld) or Building(code=bld, name=bld.upper())
                             cd = ci_filter(Department, Department.code, dept) or Department(code=dept, name=dept.upper())
                             db.session.add_all([cb, cd])
@@ -107,11 +120,9 @@ def import_print_events_from_json(events):
 
                 # Port
                 port = None
-                port_name = (e.get("Param6") or "").strip().lower()
-                port_parts = port_name.split("-")
-                if len(port_parts) == 5:
-                    port_model, port_bld, port_dept, port_room, port_index = port_parts
-                    port_index = int(port_index) if port_index.isdigit() else 0
+                port_name = p.port_name
+                if p.port:
+                    port_model, port_bld, port_dept, port_room, port_index = p.port
 
                     pb = ci_filter(Building, Building.code, port_bld) or Building(code=port_bld, name=port_bld.upper())
                     pd = ci_filter(Department, Department.code, port_dept) or Department(code=port_dept, name=port_dept.upper())
@@ -127,24 +138,448 @@ def import_print_events_from_json(events):
                     db.session.add(port)
 
                 event = PrintEvent(
-                    document_id=document_id,
-                    document_name=document_name,
+                    document_id=p.document_id,
+                    document_name=p.document_name,
                     user=user,
                     printer=printer,
                     job_id=job_id,
                     timestamp=timestamp,
-                    byte_size=byte_size,
-                    pages=pages,
+                    byte_size=p.byte_size,
+                    pages=p.pages,
                     computer=computer,
                     port=port
                 )
                 db.session.add(event)
+                new_events.append(event)
                 created += 1
 
         except Exception as ex:
             db.session.rollback()
+            new_events.clear()
             logger.error(f"🔥 Ошибка события: {str(ex)}")
             errors.append(str(ex))
 
+    db.session.flush()
+    update_rollups([
+        {"printer_id": ev.printer_id, "user_id": ev.user_id, "document_name": ev.document_name,
+         "timestamp": ev.timestamp, "pages": ev.pages}
+        for ev in new_events
+    ])
     db.session.commit()
-    return {"created": created, "errors": errors}
+    job_filter.add_many(ev.job_id for ev in new_events)
+    return {"created": created, "skipped": skipped, "errors": errors}
+
+
+IN_CHUNK_SIZE = 500  # ограничение длины IN (...) — SQLite не любит тысячи параметров
+
+
+def _chunked(items, size=IN_CHUNK_SIZE):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _resolve_codes(kind, keys, factory=None):
+    """
+    Возвращает {lower(column): id} для набора ключей: сначала из кэша справочников,
+    промахи — одним IN-запросом на чанк. Если передан factory — недостающие записи
+    создаются и сразу получают id (flush)
+    """
+    model, column = DIMENSIONS[kind]
+    found, missing = dimension_cache.get_many(kind, keys)
+
+    fetched = {}
+    for chunk in _chunked(missing):
+        rows = db.session.execute(
+            select(func.lower(column), model.id).where(func.lower(column).in_(chunk))
+        )
+        fetched.update(rows.all())
+
+    if factory:
+        missing = [k for k in missing if k not in fetched]
+        if missing:
+            objs = [factory(k) for k in missing]
+            db.session.add_all(objs)
+            db.session.flush()
+            fetched.update((k, obj.id) for k, obj in zip(missing, objs))
+
+    dimension_cache.put_many(kind, fetched)
+    found.update(fetched)
+    return found
+
+
+def _resolve_printers(keys, buildings, departments, models):
+    """
+    keys: {(bld_code, room_number, printer_index): (model_code, dept_code)}
+    Возвращает {(bld_code, room_number, printer_index): printer_id}, создавая недостающие
+    """
+    cache_keys = {(buildings[bld], room, index) for bld, room, index in keys}
+    by_building, missing = dimension_cache.get_many("printer", cache_keys)
+
+    fetched = {}
+    for chunk in _chunked({building_id for building_id, _, _ in missing}):
+        rows = db.session.execute(
+            select(Printer.id, Printer.building_id, func.lower(Printer.room_number), Printer.printer_index)
+            .where(Printer.building_id.in_(chunk))
+        )
+        for printer_id, building_id, room, index in rows:
+            fetched[(building_id, room, index)] = printer_id
+    by_building.update(fetched)
+
+    found, new_printers = {}, []
+    for key, (model_code, dept_code) in keys.items():
+        bld_code, room_number, printer_index = key
+        printer_id = by_building.get((buildings[bld_code], room_number, printer_index))
+        if printer_id:
+            found[key] = printer_id
+            continue
+        new_printers.append((key, Printer(
+            model_id=models[model_code],
+            building_id=buildings[bld_code],
+            department_id=departments[dept_code],
+            room_number=room_number,
+            printer_index=printer_index,
+            is_active=True
+        )))
+
+    if new_printers:
+        db.session.add_all(p for _, p in new_printers)
+        db.session.flush()
+        found.update((key, p.id) for key, p in new_printers)
+        fetched.update(((p.building_id, p.room_number, p.printer_index), p.id) for _, p in new_printers)
+
+    dimension_cache.put_many("printer", fetched)
+    return found
+
+
+def _parse_batch(events):
+    """Разбор пакета без обращений к БД: (нормализованные события, ошибки)"""
+    with metrics.stage("parse"):
+        parsed, errors = normalize_batch(events)
+    for error in errors:
+        logger.error(f"🔥 Ошибка события: {error}")
+    return parsed, errors
+
+
+def _upsert_insert():
+    """insert() диалекта с ON CONFLICT, если СУБД его поддерживает"""
+    dialect = db.session.get_bind().dialect.name
+    return {"sqlite": sqlite.insert, "postgresql": postgresql.insert}.get(dialect)
+
+
+def _insert_events(rows):
+    """
+    Вставка событий одним executemany; возвращает реально вставленные строки.
+    Дубли job_id (параллельный импорт из демона и HTTP) молча отсекает уникальный индекс
+    """
+    dialect_insert = _upsert_insert()
+    if dialect_insert is None:
+        db.session.execute(insert(PrintEvent), rows)
+        return rows
+    stmt = (
+        dialect_insert(PrintEvent)
+        .on_conflict_do_nothing(index_elements=job_id_conflict_columns())
+        .returning(PrintEvent.job_id)
+    )
+    inserted = set(db.session.scalars(stmt, rows))
+    return [r for r in rows if r["job_id"] in inserted]
+
+
+def _write_records(parsed, errors):
+    """Запись разобранного пакета в одном savepoint, без commit. Возвращает (новых, пропущенных дублей)"""
+    lap = metrics.stopwatch()
+    with db.session.begin_nested():
+        # 2️⃣ Дедупликация по job_id: фильтр Блума отсекает заведомо новые события,
+        # остальные проверяются одним запросом на чанк
+        job_filter.ensure_warm()
+        if _upsert_insert() is None:
+            candidates = {p.job_id for p in parsed}  # без ON CONFLICT проверяем всё
+        else:
+            candidates = {p.job_id for p in parsed if job_filter.might_contain(p.job_id)}
+        seen_jobs = set()
+        for chunk in _chunked(candidates):
+            seen_jobs.update(db.session.scalars(
+                select(PrintEvent.job_id).where(PrintEvent.job_id.in_(chunk))
+            ))
+        lap("dedup")
+
+        # закрытые месяцы уже в архиве — их события не возвращаем в горячую таблицу, но и не считаем дублями
+        archived_months = set(event_archive.months())
+
+        records, skipped, in_archive = [], 0, Counter()
+        for p in parsed:
+            if p.job_id in seen_jobs:
+                skipped += 1
+                continue
+            if archived_months and month_key(p.timestamp) in archived_months:
+                in_archive[month_key(p.timestamp)] += 1
+                continue
+            if p.printer is None:
+                errors.append(f"❌ Неверный формат принтера: {p.printer_name}")
+                continue
+            records.append(p)
+        for key, count in sorted(in_archive.items()):
+            errors.append(f"❌ Месяц {key} уже в архиве, событий не импортировано: {count}")
+
+        # 3️⃣ Пользователи и уже известные компьютеры/порты (только чтение)
+        users = _resolve_codes("user", {p.username for p in records})
+        with_user = []
+        for p in records:
+            if p.username not in users:
+                errors.append(f"❌ Пользователь не найден: {p.username}")
+                continue
+            if p.job_id in seen_jobs:
+                skipped += 1  # дубль внутри пакета
+                continue
+            seen_jobs.add(p.job_id)
+            with_user.append(p)
+
+        computers = _resolve_codes("computer", {p.computer_name for p in with_user if p.computer_name})
+        ports = _resolve_codes("port", {p.port_name for p in with_user if p.port})
+        # имя -> разобранные части (None — компьютер не по шаблону bld-dept-room-num)
+        new_computers = {p.computer_name: p.computer for p in with_user
+                         if p.computer_name and p.computer_name not in computers}
+        new_ports = {p.port_name: p.port for p in with_user if p.port and p.port_name not in ports}
+
+        # 4️⃣ Здания, отделы, модели — всё, что понадобится принтерам, компьютерам и портам
+        bld_codes = {p.printer[1] for p in records}
+        dept_codes = {p.printer[2] for p in records}
+        for parts in new_computers.values():
+            if parts:
+                bld_codes.add(parts[0])
+                dept_codes.add(parts[1])
+        for parts in new_ports.values():
+            bld_codes.add(parts[1])
+            dept_codes.add(parts[2])
+
+        buildings = _resolve_codes("building", bld_codes,
+                                   lambda c: Building(code=c, name=c.upper()))
+        departments = _resolve_codes("department", dept_codes,
+                                     lambda c: Department(code=c, name=c.upper()))
+        models = _resolve_codes("model", {p.printer[0] for p in records},
+                                lambda c: PrinterModel(code=c, manufacturer=(c.split() or [c])[0], model=c))
+
+        printer_keys = {}
+        for p in records:
+            model_code, bld_code, dept_code, room_number, printer_index = p.printer
+            printer_keys.setdefault((bld_code, room_number, printer_index), (model_code, dept_code))
+        printers = _resolve_printers(printer_keys, buildings, departments, models)
+
+        # 5️⃣ Новые компьютеры и порты
+        if new_computers or new_ports:
+            objs = []
+            for name, parts in new_computers.items():
+                if parts:
+                    bld, dept, room, num = parts
+                    objs.append((computers, name, Computer(
+                        hostname=name,
+                        building_id=buildings[bld],
+                        department_id=departments[dept],
+                        room_number=room,
+                        number_in_room=num
+                    )))
+                else:
+                    objs.append((computers, name, Computer(hostname=name, full_name=name)))
+            for name, (_, port_bld, port_dept, port_room, port_index) in new_ports.items():
+                objs.append((ports, name, Port(
+                    name=name,
+                    building_id=buildings[port_bld],
+                    department_id=departments[port_dept],
+                    room_number=port_room,
+                    printer_index=port_index
+                )))
+            db.session.add_all(obj for _, _, obj in objs)
+            db.session.flush()
+            for target, name, obj in objs:
+                target[name] = obj.id
+            dimension_cache.put_many("computer", {name: computers[name] for name in new_computers})
+            dimension_cache.put_many("port", {name: ports[name] for name in new_ports})
+
+        lap("dimensions")
+
+        # 6️⃣ Вставка событий одним executemany, агрегаты — только по вставленным
+        rows = []
+        for p in with_user:
+            _, bld_code, _, room_number, printer_index = p.printer
+            rows.append({
+                "document_id": p.document_id,
+                "document_name": p.document_name,
+                "user_id": users[p.username],
+                "printer_id": printers[(bld_code, room_number, printer_index)],
+                "job_id": p.job_id,
+                "timestamp": p.timestamp,
+                "byte_size": p.byte_size,
+                "pages": p.pages,
+                "computer_id": computers.get(p.computer_name),
+                "port_id": ports.get(p.port_name),
+            })
+        inserted = _insert_events(rows) if rows else []
+        lap("insert")
+        update_rollups(inserted)
+        lap("rollups")
+        skipped += len(rows) - len(inserted)
+
+    job_filter.add_many(r["job_id"] for r in inserted)
+    return len(inserted), skipped
+
+
+def _write_batch(parsed, errors):
+    """
+    Запись пакета с одним повтором при IntegrityError: параллельный писатель
+    мог успеть создать те же справочники — кэш сбрасывается и пакет перечитывается.
+    Если пакет не записался и со второй попытки (или СУБД отвергла значение — DataError),
+    виновата отдельная строка: пакет пишется по одному событию, каждое в своём savepoint,
+    и отвергнутые события попадают в ошибки, как в построчном режиме.
+    Сбой записи (блокировка, обрыв соединения) пробрасывается наружу — пакет
+    не считается обработанным, и импорт продолжится с последнего чекпоинта
+    """
+    for attempt in (1, 2):
+        batch_errors = list(errors)
+        try:
+            created, skipped = _write_records(parsed, batch_errors)
+        except IntegrityError as ex:
+            dimension_cache.invalidate()
+            if attempt == 1:
+                logger.warning(f"⚠️ Конфликт при записи пакета, повтор: {str(ex)}")
+                continue
+            logger.warning(f"⚠️ Повторный конфликт, пакет пишется по одному событию: {str(ex)}")
+            batch_errors = list(errors)
+            created, skipped = _write_rows(parsed, batch_errors)
+        except DataError as ex:
+            dimension_cache.invalidate()
+            logger.warning(f"⚠️ Значение отвергнуто СУБД, пакет пишется по одному событию: {str(ex)}")
+            created, skipped = _write_rows(parsed, batch_errors)
+        except Exception as ex:
+            dimension_cache.invalidate()  # в кэш могли попасть id откатанных записей
+            logger.error(f"🔥 Ошибка пакетного импорта: {str(ex)}")
+            raise
+        metrics.inc("advisor_import_events_total", created, result="created")
+        metrics.inc("advisor_import_events_total", skipped, result="skipped")
+        metrics.inc("advisor_import_events_total", len(batch_errors), result="error")
+        return {"created": created, "skipped": skipped, "errors": batch_errors}
+
+
+def _write_rows(parsed, errors):
+    """Запасной путь _write_batch: каждое событие в своём savepoint, ошибки данных — в errors"""
+    created, skipped = 0, 0
+    for p in parsed:
+        try:
+            row_created, row_skipped = _write_records([p], errors)
+        except (IntegrityError, DataError) as ex:
+            dimension_cache.invalidate()
+            logger.error(f"🔥 Событие {p.job_id} не записано: {ex.orig}")
+            errors.append(f"❌ Событие {p.job_id} не записано: {ex.orig}")
+            continue
+        created += row_created
+        skipped += row_skipped
+    return created, skipped
+
+
+def _import_batch(events):
+    """Пакетная обработка без commit: разбор, затем запись в одном savepoint"""
+    return _write_batch(*_parse_batch(events))
+
+
+def _import_chunks(events, chunk_size, commit_every, progress=None, checkpoint=None, write_slot=None):
+    """
+    Общий цикл пакетного импорта: пакеты по chunk_size, commit каждые commit_every
+    событий с expunge_all, чтобы identity map сессии не рос вместе с файлом.
+    checkpoint (ImportCheckpoint) получает позицию после каждого commit.
+    write_slot (семафор) ограничивает число одновременных писателей: разбор пакета
+    идёт без него, запись и commit — под ним, поэтому commit делается на каждом пакете.
+    """
+    if write_slot is not None:
+        commit_every = 1  # транзакция не должна переживать освобождение слота
+    else:
+        write_slot = nullcontext()
+
+    created, skipped, errors = 0, 0, []
+    processed = checkpoint.position if checkpoint else 0
+    uncommitted = 0
+
+    def commit():
+        with metrics.stage("commit"):
+            try:
+                db.session.commit()
+            except Exception:
+                dimension_cache.invalidate()  # справочники пакетов не записались, их id в кэше неверны
+                raise
+        db.session.expunge_all()
+        if checkpoint:
+            checkpoint.save(processed)
+
+    try:
+        for n, chunk in enumerate(iter_chunks(events, chunk_size), start=1):
+            parsed, parse_errors = _parse_batch(chunk)
+            waiting = time.perf_counter()
+            with write_slot:
+                metrics.observe("advisor_import_stage_seconds", time.perf_counter() - waiting, stage="write_slot_wait")
+                result = _write_batch(parsed, parse_errors)
+                processed += len(chunk)
+                uncommitted += len(chunk)
+                if commit_every and uncommitted >= commit_every:
+                    commit()
+                    uncommitted = 0
+            created += result["created"]
+            skipped += result["skipped"]
+            errors.extend(result["errors"])
+
+            logger.info(f"📦 Пакет {n}: обработано {processed}, создано {created}, "
+                        f"дублей {skipped}, ошибок {len(errors)}")
+            if progress:
+                progress(processed, created, len(errors))
+    except Exception:
+        db.session.rollback()
+        # откат забирает и справочники, созданные незакоммиченными пакетами: их id уже в кэше
+        dimension_cache.invalidate()
+        raise
+
+    commit()
+    return {"created": created, "skipped": skipped, "errors": errors}
+
+
+def import_print_events_bulk(events, commit_every=None):
+    """
+    Пакетный импорт событий печати.
+
+    Сначала разбирается весь пакет, затем уникальные ключи справочников
+    (здания, отделы, модели, принтеры, пользователи, компьютеры, порты)
+    разрешаются несколькими запросами по множествам, а события вставляются
+    одним executemany. Результат совпадает с построчным режимом: {"created", "skipped", "errors"}.
+    При commit_every список фиксируется частями по commit_every событий.
+    """
+    if not commit_every:
+        try:
+            result = _import_batch(events)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            dimension_cache.invalidate()
+            raise
+        return result
+    return _import_chunks(events, commit_every, commit_every)
+
+
+def import_print_events_from_stream(fp, chunk_size=None, commit_every=None, progress=None, checkpoint=None,
+                                    write_slot=None, fmt="json"):
+    """
+    Потоковый импорт из текстового потока: JSON-массив или NDJSON (fmt="json"),
+    XML журнала событий из wevtutil (fmt="xml").
+
+    События читаются инкрементально и обрабатываются пакетами по chunk_size,
+    так что в памяти одновременно находится только один пакет.
+    Commit выполняется каждые commit_every событий (0 — один раз в конце).
+    progress(processed, created, errors) вызывается после каждого пакета.
+    Если передан checkpoint, уже закоммиченные события пропускаются,
+    а позиция сохраняется после каждого commit. write_slot — см. _import_chunks.
+    """
+    chunk_size = chunk_size or Config.IMPORT_CHUNK_SIZE
+    if commit_every is None:
+        commit_every = Config.IMPORT_COMMIT_EVERY
+
+    events = iter_xml_events(fp) if fmt == "xml" else iter_json_events(fp)
+    if checkpoint and checkpoint.position:
+        logger.info(f"⏯️ Продолжаем импорт {checkpoint.name} с события {checkpoint.position}")
+        events = islice(events, checkpoint.position, None)
+
+    return _import_chunks(events, chunk_size, commit_every, progress, checkpoint, write_slot)
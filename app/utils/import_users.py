@@ -1,8 +1,13 @@
 import csv
+import hashlib
 import logging
-from sqlalchemy import func
+from flask import current_app
+from sqlalchemy import func, select, insert, update
 from app.models import User, Department
 from app.extensions import db
+from app.utils.dimension_cache import dimension_cache
+from app.utils.report_cache import report_cache
+from app.utils.event_stream import text_stream, iter_chunks
 
 logger = logging.getLogger("import_users_logger")
 logger.setLevel(logging.INFO)
@@ -10,38 +15,212 @@ handler = logging.FileHandler("import_users.log", mode='a', encoding='utf-8')
 handler.setFormatter(logging.Formatter('[%(asctime)s] [%(levelname)s] %(message)s'))
 logger.addHandler(handler)
 
-def import_users_from_csv(file_stream):
-    decoded = file_stream.read().decode("utf-8-sig").splitlines()
-    reader = csv.DictReader(decoded)
-    created, errors = 0, []
+_TRUE = {"true", "1", "yes", "да"}
+IN_CHUNK_SIZE = 500  # id в одном IN (...)
 
-    for row in reader:
-        try:
-            username = row.get("SamAccountName", "").strip()
-            fio = row.get("DisplayName", "").strip()
-            dept_code = row.get("OU", "").strip().lower()
 
+def _parse_row(row):
+    """Строка Export-ADUsers.ps1 -> (username, fio, dept_code, is_active); колонка Enabled необязательна"""
+    username = (row.get("SamAccountName") or "").strip()
+    fio = (row.get("DisplayName") or "").strip()
+    dept_code = (row.get("OU") or "").strip().lower()
+    enabled = row.get("Enabled")
+    is_active = True if enabled is None else enabled.strip().lower() in _TRUE
+    return username, fio or username, dept_code, is_active
+
+
+def _fingerprint(key, fio, dept_code, is_active):
+    """Хэш значимых полей строки AD: совпал — пользователя не трогаем"""
+    return hashlib.sha1(f"{key}\x1f{fio}\x1f{dept_code}\x1f{int(is_active)}".encode("utf-8")).hexdigest()
+
+
+def _iter_parsed(file_stream, chunk_size, errors, present=None):
+    """
+    Пачки разобранных строк CSV: [(key, username, fio, dept_code, is_active, fingerprint)].
+    Строки без OU пропускаются, повтор логина в файле — берётся первая строка.
+    В present (если передан) попадают все логины выгрузки, включая строки без OU:
+    пользователь есть в AD, даже если его строку не обновляем.
+    """
+    seen = set()
+    reader = csv.DictReader(text_stream(file_stream))
+    for rows in iter_chunks(reader, chunk_size):
+        parsed = []
+        for row in rows:
+            try:
+                username, fio, dept_code, is_active = _parse_row(row)
+            except Exception as e:
+                logger.error(f"🔥 Ошибка строки {row}: {e}")
+                errors.append(str(e))
+                continue
+            key = username.lower()
+            if present is not None and key:
+                present.add(key)
             if not dept_code:
                 continue  # Пропускаем без OU
+            if not username:
+                errors.append(f"Пустой SamAccountName: {row}")
+                continue
+            if key in seen:
+                continue
+            seen.add(key)
+            parsed.append((key, username, fio, dept_code, is_active, _fingerprint(key, fio, dept_code, is_active)))
+        yield parsed
+
+
+def _load_departments():
+    return dict(db.session.execute(select(func.lower(Department.code), Department.id)).all())
+
+
+def _resolve_departments(codes, departments):
+    """Создаёт недостающие отделы одним INSERT и дописывает их id в departments"""
+    missing = sorted(c for c in codes if c not in departments)
+    if not missing:
+        return 0
+    db.session.execute(insert(Department), [{"code": c, "name": c.upper()} for c in missing])
+    departments.update(db.session.execute(
+        select(func.lower(Department.code), Department.id).where(func.lower(Department.code).in_(missing))
+    ).all())
+    return len(missing)
+
+
+def import_users_from_csv(file_stream, update_existing=False, chunk_size=None):
+    """
+    Потоковый импорт ad_users.csv (бинарный поток: загрузка Flask или open(..., "rb")).
+
+    Существующие логины и коды отделов читаются один раз в словари, дальше файл
+    идёт пачками по chunk_size строк: новые отделы и пользователи — пакетными INSERT,
+    при update_existing изменившиеся fio / department_id / is_active — пакетным UPDATE.
+    """
+    chunk_size = chunk_size or current_app.config["IMPORT_CHUNK_SIZE"]
+    created, updated, errors = 0, 0, []
+
+    departments = _load_departments()
+    users = {
+        username: (user_id, fio, department_id, is_active)
+        for username, user_id, fio, department_id, is_active in db.session.execute(
+            select(func.lower(User.username), User.id, User.fio, User.department_id, User.is_active)
+        )
+    }
+    new_departments = 0
+
+    try:
+        for parsed in _iter_parsed(file_stream, chunk_size, errors):
+            new_departments += _resolve_departments({p[3] for p in parsed}, departments)
+
+            to_insert, to_update = [], []
+            for key, username, fio, dept_code, is_active, fingerprint in parsed:
+                department_id = departments[dept_code]
+                existing = users.get(key)
+                values = {
+                    "fio": fio,
+                    "department_id": department_id,
+                    "is_active": is_active,
+                    "ad_fingerprint": fingerprint,
+                }
+                if existing is None:
+                    to_insert.append({"username": username, **values})
+                elif update_existing and existing[1:] != (fio, department_id, is_active):
+                    to_update.append({"id": existing[0], **values})
+
+            if to_insert:
+                db.session.execute(insert(User), to_insert)
+                created += len(to_insert)
+            if to_update:
+                db.session.execute(update(User), to_update)  # bulk UPDATE по первичному ключу
+                updated += len(to_update)
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if created or new_departments:
+        # новые строки — сбрасываем кэш пользователей и отделов, он заполнится заново
+        dimension_cache.invalidate("user")
+        dimension_cache.invalidate("department")
+    if updated:
+        report_cache.invalidate()  # ФИО и отделы пользователей есть во всех отчётах
+    logger.info(f"👥 Пользователи: создано {created}, обновлено {updated}, "
+                f"новых отделов {new_departments}, ошибок {len(errors)}")
+    return {"created": created, "updated": updated, "errors": errors}
+
+
+def sync_users_from_csv(file_stream, chunk_size=None):
+    """
+    Дельта-синхронизация с полной выгрузкой AD (ad_users.csv).
+
+    Для каждого пользователя хранится ad_fingerprint — хэш его строки из прошлой
+    синхронизации. Совпал — строка не трогается; новые логины вставляются,
+    изменившиеся (ФИО, OU, Enabled) обновляются, а активные пользователи,
+    которых нет в выгрузке, помечаются is_active=False.
+    """
+    chunk_size = chunk_size or current_app.config["IMPORT_CHUNK_SIZE"]
+    created, updated, unchanged, deactivated, errors = 0, 0, 0, 0, []
+
+    departments = _load_departments()
+    users = {
+        username: (user_id, fingerprint, is_active)
+        for username, user_id, fingerprint, is_active in db.session.execute(
+            select(func.lower(User.username), User.id, User.ad_fingerprint, User.is_active)
+        )
+    }
+    seen = set()
+    new_departments = 0
+
+    try:
+        for parsed in _iter_parsed(file_stream, chunk_size, errors, present=seen):
+            new_departments += _resolve_departments({p[3] for p in parsed}, departments)
+
+            to_insert, to_update = [], []
+            for key, username, fio, dept_code, is_active, fingerprint in parsed:
+                existing = users.get(key)
+                values = {
+                    "fio": fio,
+                    "department_id": departments[dept_code],
+                    "is_active": is_active,
+                    "ad_fingerprint": fingerprint,
+                }
+                if existing is None:
+                    to_insert.append({"username": username, **values})
+                elif existing[1] != fingerprint:
+                    to_update.append({"id": existing[0], **values})
+                else:
+                    unchanged += 1
+
+            if to_insert:
+                db.session.execute(insert(User), to_insert)
+                created += len(to_insert)
+            if to_update:
+                db.session.execute(update(User), to_update)
+                updated += len(to_update)
+
+        removed = [user_id for key, (user_id, _, is_active) in users.items() if is_active and key not in seen]
+        if removed and not seen:
+            # пустая или битая выгрузка не должна отключить всех пользователей
+            raise ValueError("В ad_users.csv нет ни одной строки — синхронизация отменена")
+        for chunk in iter_chunks(removed, IN_CHUNK_SIZE):
+            # отпечаток сбрасываем: вернувшийся в AD пользователь будет обновлён
+            db.session.execute(
+                update(User).where(User.id.in_(chunk)).values(is_active=False, ad_fingerprint=None)
+            )
+        deactivated = len(removed)
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
 
-            department = Department.query.filter(func.lower(Department.code) == dept_code).first()
-            if not department:
-                department = Department(code=dept_code, name=dept_code.upper())
-                db.session.add(department)
-
-            user = User.query.filter(func.lower(User.username) == username.lower()).first()
-            if not user:
-                user = User(
-                    username=username,
-                    fio=fio or username,
-                    department=department
-                )
-                db.session.add(user)
-                created += 1
-
-        except Exception as e:
-            logger.error(f"🔥 Ошибка строки {row}: {e}")
-            errors.append(str(e))
-
-    db.session.commit()
-    return {"created": created, "errors": errors}
+    if created or new_departments:
+        dimension_cache.invalidate("user")
+        dimension_cache.invalidate("department")
+    if updated:
+        report_cache.invalidate()  # ФИО и отделы пользователей есть во всех отчётах
+    logger.info(f"🔄 Синхронизация AD: создано {created}, обновлено {updated}, отключено {deactivated}, "
+                f"без изменений {unchanged}, новых отделов {new_departments}, ошибок {len(errors)}")
+    return {
+        "created": created,
+        "updated": updated,
+        "deactivated": deactivated,
+        "unchanged": unchanged,
+        "errors": errors,
+    }
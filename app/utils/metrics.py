@@ -0,0 +1,398 @@
+"""
+Метрики процесса в формате Prometheus (text exposition 0.0.4) и профилирование
+по запросу — без внешних зависимостей.
+
+- счётчики и гистограммы: стадии импорта (разбор, дедупликация, справочники,
+  вставка, агрегаты, commit, ожидание слота писателя), файлы импорта, HTTP-маршруты,
+  время и число SQL-запросов на маршрут (события движка);
+- показатели кэшей и очереди импорта снимаются в момент выдачи /metrics;
+- демон пишет снимок своих метрик в <METRICS_DIR>/<процесс>.json, веб-приложение
+  добавляет его к своему /metrics (метка process), а в журнал демона уходит JSON-сводка;
+- profiler: cProfile для доли запросов / задач импорта, включается на ходу
+  (POST /metrics/profile или SIGUSR1 у демона), итог — GET /metrics/profile.
+"""
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from app.config import Config
+
+logger = logging.getLogger("metrics")
+
+TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+
+HELP = {
+    "advisor_import_stage_seconds": ("histogram", "Время стадии пакетного импорта событий"),
+    "advisor_import_events_total": ("counter", "События импорта по результату"),
+    "advisor_import_file_seconds": ("histogram", "Время импорта одного файла"),
+    "advisor_import_files_total": ("counter", "Файлы импорта по виду и итогу"),
+    "advisor_daemon_file_latency_seconds": ("histogram", "Задержка демона: от обнаружения файла до конца импорта"),
+    "advisor_http_request_seconds": ("histogram", "Время обработки HTTP-запроса"),
+    "advisor_http_requests_total": ("counter", "HTTP-запросы по маршруту и коду ответа"),
+    "advisor_sql_queries_per_request": ("histogram", "SQL-запросов на один HTTP-запрос"),
+    "advisor_sql_seconds_total": ("counter", "Суммарное время SQL-запросов"),
+    "advisor_sql_queries_total": ("counter", "Число SQL-запросов"),
+    "advisor_report_cache_hits_total": ("counter", "Попадания в кэш отчётов"),
+    "advisor_report_cache_misses_total": ("counter", "Промахи кэша отчётов"),
+    "advisor_report_cache_evictions_total": ("counter", "Вытеснения из кэша отчётов по размеру"),
+    "advisor_report_cache_invalidations_total": ("counter", "Записи кэша отчётов, сброшенные импортом"),
+    "advisor_report_cache_entries": ("gauge", "Записей в кэше отчётов"),
+    "advisor_dimension_cache_hits_total": ("counter", "Попадания в кэш справочников"),
+    "advisor_dimension_cache_misses_total": ("counter", "Промахи кэша справочников"),
+    "advisor_dimension_cache_entries": ("gauge", "Записей в кэше справочников"),
+    "advisor_job_filter_count": ("gauge", "job_id в фильтре Блума"),
+    "advisor_job_filter_bits": ("gauge", "Размер фильтра Блума, бит"),
+    "advisor_job_filter_hashes": ("gauge", "Хэш-функций фильтра Блума"),
+    "advisor_import_jobs": ("gauge", "Фоновые задачи импорта веб-приложения по статусу"),
+    "advisor_profiling_enabled": ("gauge", "Включено ли профилирование"),
+}
+
+# кто выполняет SQL вне HTTP-запроса: задача импорта, архивация и т.п.
+sql_scope = ContextVar("sql_scope", default="background")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Реестр счётчиков и гистограмм одного процесса"""
+
+    def __init__(self, process="web"):
+        self.process = process  # метка process: веб-приложение или демон
+        self._lock = threading.Lock()
+        self._counters = {}  # (имя, метки) -> значение
+        self._histograms = {}  # (имя, метки) -> _Histogram
+        self._collectors = []  # функции -> [(имя, тип, метки, значение)] на момент выдачи
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=TIME_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def stage(self, stage):
+        """Стадия импорта событий: with metrics.stage("commit"): ..."""
+        return self.timer("advisor_import_stage_seconds", stage=stage)
+
+    def stopwatch(self, name="advisor_import_stage_seconds", label="stage"):
+        """Последовательные стадии без вложенных with: lap("dedup") — время с предыдущей отметки"""
+        last = [time.perf_counter()]
+
+        def lap(value):
+            now = time.perf_counter()
+            self.observe(name, now - last[0], **{label: value})
+            last[0] = now
+
+        return lap
+
+    def collector(self, func):
+        self._collectors.append(func)
+        return func
+
+    def snapshot(self):
+        """Состояние реестра в JSON-совместимом виде (для файла демона)"""
+        with self._lock:
+            return {
+                "process": self.process,
+                "written_at": time.time(),
+                "counters": [[name, dict(labels), value] for (name, labels), value in self._counters.items()],
+                "histograms": [
+                    [name, dict(labels), list(h.buckets), list(h.counts), h.sum, h.count]
+                    for (name, labels), h in self._histograms.items()
+                ],
+            }
+
+    def render(self, others=()):
+        """
+        Текст для Prometheus: метрики этого процесса и снимков других (others),
+        у каждой строки метка process; показатели коллекторов — только свои
+        """
+        families = {}  # имя -> (тип, строки): одно семейство — один блок HELP/TYPE
+
+        def family(name, kind):
+            return families.setdefault(name, (kind, []))[1]
+
+        for snap in (self.snapshot(), *others):
+            process = {"process": snap["process"]}
+            for name, labels, value in sorted(snap["counters"], key=lambda c: (c[0], sorted(c[1].items()))):
+                family(name, "counter").append(f"{name}{_labels({**labels, **process})} {_number(value)}")
+            for name, labels, buckets, counts, total, count in sorted(
+                    snap["histograms"], key=lambda h: (h[0], sorted(h[1].items()))):
+                lines, labels, cumulative = family(name, "histogram"), {**labels, **process}, 0
+                for bound, n in zip((*buckets, "+Inf"), counts):
+                    cumulative += n
+                    lines.append(f"{name}_bucket{_labels({**labels, 'le': bound})} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+        for collect in self._collectors:
+            try:
+                samples = collect()
+            except Exception as e:
+                logger.warning(f"⚠️ Коллектор метрик {collect.__name__} упал: {e}")
+                continue
+            for name, kind, labels, value in samples:
+                family(name, kind).append(f"{name}{_labels({**labels, 'process': self.process})} {_number(value)}")
+
+        out = []
+        for name, (kind, lines) in families.items():
+            out.append(f"# HELP {name} {HELP.get(name, (kind, name))[1]}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(lines)
+        return "\n".join(out) + "\n"
+
+    def summary(self):
+        """Сводка для журнала: по гистограммам — число, сумма и среднее, по счётчикам — значения"""
+        with self._lock:
+            result = {}
+            for (name, labels), h in sorted(self._histograms.items()):
+                key = name + _labels(dict(labels))
+                result[key] = {"count": h.count, "sum": round(h.sum, 3),
+                               "avg": round(h.sum / h.count, 4) if h.count else 0.0}
+            for (name, labels), value in sorted(self._counters.items()):
+                result[name + _labels(dict(labels))] = round(value, 3)
+        return result
+
+    def write_snapshot(self, directory=None):
+        """Снимок в <METRICS_DIR>/<process>.json (атомарно) — его покажет /metrics веб-приложения"""
+        directory = directory or Config.METRICS_DIR
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.process}.json")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, path)
+
+
+class Profiler:
+    """cProfile по запросу: профилируется доля sample блоков, статистика копится до сброса"""
+
+    def __init__(self, enabled=False, sample=1.0):
+        self.enabled = enabled
+        self.sample = sample
+        self.profiled = 0
+        self._stats = None
+        self._lock = threading.Lock()
+
+    def configure(self, enabled=None, sample=None, reset=False):
+        with self._lock:
+            if enabled is not None:
+                self.enabled = enabled
+            if sample is not None:
+                self.sample = min(1.0, max(0.0, sample))
+            if reset:
+                self._stats, self.profiled = None, 0
+        logger.info(f"🔬 Профилирование: {self.state()}")
+
+    def state(self):
+        return {"enabled": self.enabled, "sample": self.sample, "profiled": self.profiled}
+
+    def start(self):
+        """cProfile.Profile для текущего потока или None (выключено / не попал в выборку)"""
+        if not self.enabled or random.random() >= self.sample:
+            return None
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def stop(self, profile):
+        if profile is None:
+            return
+        profile.disable()
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+            self.profiled += 1
+
+    @contextmanager
+    def profile(self):
+        profile = self.start()
+        try:
+            yield
+        finally:
+            self.stop(profile)
+
+    def report(self, limit=40, sort="cumulative"):
+        with self._lock:
+            if self._stats is None:
+                return "Профиль пуст: включите профилирование и дайте нагрузку\n"
+            out = io.StringIO()
+            self._stats.stream = out
+            self._stats.sort_stats(sort).print_stats(limit)
+            return out.getvalue()
+
+
+metrics = Metrics()
+profiler = Profiler(enabled=Config.PROFILE_ENABLED, sample=Config.PROFILE_SAMPLE)
+
+
+def read_snapshots(directory=None, max_age=None):
+    """Снимки метрик других процессов (демона) из <METRICS_DIR>/*.json; старые (max_age, с) пропускаются"""
+    directory = directory or Config.METRICS_DIR
+    max_age = Config.METRICS_SNAPSHOT_MAX_AGE if max_age is None else max_age
+    snapshots = []
+    try:
+        names = sorted(n for n in os.listdir(directory) if n.endswith(".json"))
+    except FileNotFoundError:
+        return snapshots
+    for name in names:
+        try:
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                snap = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if snap.get("process") == metrics.process:
+            continue
+        if max_age and time.time() - snap.get("written_at", 0) > max_age:
+            continue
+        snapshots.append(snap)
+    return snapshots
+
+
+def log_summary(target_logger, extra=None):
+    """JSON-сводка метрик одной строкой журнала"""
+    target_logger.info("📈 metrics " + json.dumps({**(extra or {}), **metrics.summary()}, ensure_ascii=False))
+
+
+# 🗄️ SQL: время и число запросов на маршрут или фоновую задачу
+TRANSACTION_STATEMENTS = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE")
+
+
+def is_transaction_statement(statement):
+    """BEGIN/SAVEPOINT и т.п. — управление транзакцией, а не запрос к данным"""
+    return statement.lstrip()[:9].upper().startswith(TRANSACTION_STATEMENTS)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_started")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    if is_transaction_statement(statement):
+        return
+    from flask import g, has_request_context, request
+    if has_request_context():
+        scope = request.endpoint or "unknown"
+        g.sql_queries = g.get("sql_queries", 0) + 1
+        g.sql_seconds = g.get("sql_seconds", 0.0) + elapsed
+    else:
+        scope = sql_scope.get()
+    metrics.inc("advisor_sql_queries_total", scope=scope)
+    metrics.inc("advisor_sql_seconds_total", elapsed, scope=scope)
+
+
+def instrument_engine(engine):
+    from sqlalchemy import event
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def init_app(app):
+    """HTTP-метрики и профилирование запросов, SQL-метрики движка приложения"""
+    from flask import g, request
+    from app.extensions import db
+
+    @app.before_request
+    def _metrics_start():
+        g.request_started = time.perf_counter()
+        g.sql_queries, g.sql_seconds = 0, 0.0
+        g.request_profile = profiler.start()
+
+    @app.after_request
+    def _metrics_finish(response):
+        profiler.stop(g.pop("request_profile", None))
+        route = request.endpoint or "unknown"
+        elapsed = time.perf_counter() - g.get("request_started", time.perf_counter())
+        metrics.observe("advisor_http_request_seconds", elapsed, route=route)
+        metrics.inc("advisor_http_requests_total", route=route, status=response.status_code)
+        metrics.observe("advisor_sql_queries_per_request", g.get("sql_queries", 0), buckets=COUNT_BUCKETS,
+                        route=route)
+        return response
+
+    with app.app_context():
+        instrument_engine(db.engine)
+
+
+@metrics.collector
+def _cache_gauges():
+    """Кэши и очередь импорта — текущее состояние на момент выдачи"""
+    from app.utils.bloom import job_filter
+    from app.utils.dimension_cache import dimension_cache
+    from app.utils.import_jobs import import_jobs
+    from app.utils.report_cache import report_cache
+
+    samples = []
+    report = report_cache.stats()
+    for key in ("hits", "misses", "evictions", "invalidations"):
+        samples.append((f"advisor_report_cache_{key}_total", "counter", {}, report[key]))
+    samples.append(("advisor_report_cache_entries", "gauge", {}, report["size"]))
+    dimensions = dimension_cache.stats()
+    samples.append(("advisor_dimension_cache_hits_total", "counter", {}, dimensions["hits"]))
+    samples.append(("advisor_dimension_cache_misses_total", "counter", {}, dimensions["misses"]))
+    for kind, size in dimensions["size"].items():
+        samples.append(("advisor_dimension_cache_entries", "gauge", {"kind": kind}, size))
+    for key, value in job_filter.stats().items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            samples.append((f"advisor_job_filter_{key}", "gauge", {}, value))
+    jobs = import_jobs.recent(limit=import_jobs.keep)
+    for status in ("queued", "running"):
+        samples.append(("advisor_import_jobs", "gauge", {"status": status},
+                        sum(1 for job in jobs if job["status"] == status)))
+    samples.append(("advisor_profiling_enabled", "gauge", {}, int(profiler.enabled)))
+    return samples
@@ -0,0 +1,218 @@
+"""
+Помесячные секции print_events на PostgreSQL (PG_PARTITION_EVENTS=1).
+
+Таблица print_events секционируется RANGE (timestamp): по секции на месяц
+(print_events_YYYY_MM) и секция по умолчанию print_events_default для событий
+вне созданных месяцев. Фильтры по датам в отчётах отсекают лишние секции, а
+индексы каждой секции остаются небольшими. Секции создаются заранее на
+PARTITION_MONTHS_AHEAD месяцев вперёд (при старте и демоном раз в сутки);
+месяцы, попавшие в секцию по умолчанию, демон переносит в собственные секции.
+Архивация закрытого месяца удаляет его секцию целиком (DROP), а не DELETE строк.
+
+На SQLite и при выключенной настройке таблица остаётся обычной, функции модуля
+ничего не делают.
+
+    python -m app.utils.partitions            # создать недостающие секции
+    python -m app.utils.partitions --migrate  # перевести существующую таблицу в секционированную
+"""
+import logging
+import sys
+import weakref
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from app.extensions import db
+from app.models import PrintEvent
+from app.models.print_event import use_partitioned_layout
+from app.utils.archive import month_key, month_range
+
+logger = logging.getLogger("partitions")
+
+TABLE = "print_events"
+DEFAULT_PARTITION = f"{TABLE}_default"
+LOCK_ID = 7_305_001  # pg_advisory_xact_lock: секции создаёт один процесс за раз
+
+# движок -> секционирована ли print_events; по движку, а не по URL: приложение с другим
+# конфигом (и схемой) на той же базе проверяет её заново
+_partitioned = weakref.WeakKeyDictionary()
+
+
+def partitioning_requested(config):
+    """PG_PARTITION_EVENTS включён в конфиге приложения и база — PostgreSQL"""
+    return bool(config.get("PG_PARTITION_EVENTS")) and (
+        make_url(config["SQLALCHEMY_DATABASE_URI"]).get_backend_name() == "postgresql"
+    )
+
+
+def partition_name(key):
+    """'2024-03' -> print_events_2024_03"""
+    return f"{TABLE}_{key.replace('-', '_')}"
+
+
+def events_partitioned():
+    """print_events в этой БД — секционированная таблица PostgreSQL (проверяется один раз на движок)"""
+    engine = db.engine
+    if engine not in _partitioned:
+        if engine.dialect.name != "postgresql":
+            _partitioned[engine] = False
+        else:
+            with engine.connect() as conn:
+                _partitioned[engine] = bool(conn.scalar(text(
+                    "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+                    "WHERE c.relname = :t AND pg_table_is_visible(c.oid)"
+                ), {"t": TABLE}))
+    return _partitioned[engine]
+
+
+def job_id_conflict_columns():
+    """Колонки ON CONFLICT для уникального индекса job_id в текущей схеме"""
+    return ["job_id", "timestamp"] if events_partitioned() else ["job_id"]
+
+
+def existing_partitions(conn):
+    return set(conn.scalars(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :t AND pg_table_is_visible(p.oid)"
+    ), {"t": TABLE}))
+
+
+def _add_months(key, months):
+    start, _ = month_range(key)
+    index = start.year * 12 + start.month - 1 + months
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def _create_partition(conn, key):
+    """
+    Секция месяца. Если его события уже лежат в секции по умолчанию, они переносятся:
+    PostgreSQL не создаст секцию, пока в default есть строки её диапазона.
+    """
+    name = partition_name(key)
+    start, end = month_range(key)
+    bounds = {"start": start, "end": end}
+    moved = conn.scalar(text(
+        f"SELECT count(*) FROM {DEFAULT_PARTITION} WHERE timestamp >= :start AND timestamp < :end"
+    ), bounds)
+    if moved:
+        conn.execute(text(f"CREATE TEMP TABLE _moved_events (LIKE {TABLE})"))
+        conn.execute(text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE timestamp >= :start AND timestamp < :end "
+            f"RETURNING *) INSERT INTO _moved_events SELECT * FROM moved"
+        ), bounds)
+    conn.execute(text(
+        f"CREATE TABLE {name} PARTITION OF {TABLE} "
+        f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+    ))
+    if moved:
+        conn.execute(text(f"INSERT INTO {TABLE} SELECT * FROM _moved_events"))
+        conn.execute(text("DROP TABLE _moved_events"))
+    logger.info(f"🗂️ Создана секция {name}" + (f", перенесено из {DEFAULT_PARTITION}: {moved}" if moved else ""))
+
+
+def ensure_partitions(months_ahead=None, now=None):
+    """
+    Секция по умолчанию, секции от текущего месяца на months_ahead вперёд и секции
+    для месяцев, чьи события попали в default. Возвращает список созданных месяцев.
+    """
+    if not events_partitioned():
+        if partitioning_requested(current_app.config):
+            logger.warning("⚠️ PG_PARTITION_EVENTS включён, но print_events не секционирована: "
+                           "python -m app.utils.partitions --migrate")
+        return []
+    months_ahead = current_app.config["PARTITION_MONTHS_AHEAD"] if months_ahead is None else months_ahead
+    current = month_key(now or datetime.now())
+    wanted = {_add_months(current, n) for n in range(months_ahead + 1)}
+
+    created = []
+    with db.engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": LOCK_ID})
+        existing = existing_partitions(conn)
+        if DEFAULT_PARTITION not in existing:
+            conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT"))
+        else:
+            wanted.update(
+                f"{int(year):04d}-{int(month):02d}" for year, month in conn.execute(text(
+                    f"SELECT DISTINCT extract(year FROM timestamp), extract(month FROM timestamp) "
+                    f"FROM {DEFAULT_PARTITION}"
+                ))
+            )
+        for key in sorted(wanted):
+            if partition_name(key) not in existing:
+                _create_partition(conn, key)
+                created.append(key)
+    return created
+
+
+def drop_month_partition(key):
+    """
+    Удаляет секцию месяца в текущей транзакции сессии (вместо DELETE строк).
+    Возвращает число удалённых событий; 0 — если секции нет.
+    """
+    if not events_partitioned():
+        return 0
+    name = partition_name(key)
+    if name not in existing_partitions(db.session.connection()):
+        return 0
+    rows = db.session.execute(text(f"SELECT count(*) FROM {name}")).scalar()
+    db.session.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {name}"))
+    db.session.execute(text(f"DROP TABLE {name}"))
+    logger.info(f"🗂️ Секция {name} удалена: {rows} событий")
+    return rows
+
+
+def migrate_to_partitioned():
+    """
+    Перевод существующей обычной print_events в секционированную одной транзакцией:
+    старая таблица переименовывается, новая создаётся по модели, секции — по
+    диапазону данных, строки копируются, счётчик id продолжается с максимума.
+    """
+    if not partitioning_requested(current_app.config):
+        raise RuntimeError("Секционирование выключено: нужен PostgreSQL и PG_PARTITION_EVENTS=1")
+    if events_partitioned():
+        return 0
+    use_partitioned_layout(True)
+    plain = f"{TABLE}_plain"
+    with db.engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": LOCK_ID})
+        # имена индексов, ограничений и последовательности освобождаются для новой таблицы
+        conn.execute(text(f"ALTER TABLE {TABLE} RENAME TO {plain}"))
+        indexes = conn.scalars(text("SELECT indexname FROM pg_indexes WHERE tablename = :t"), {"t": plain}).all()
+        for index in indexes:
+            conn.execute(text(f'ALTER INDEX "{index}" RENAME TO "{index}_plain"'))
+        sequence = conn.scalar(text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": plain})
+        if sequence:
+            conn.execute(text(f"ALTER SEQUENCE {sequence} RENAME TO {plain}_id_seq"))
+
+        PrintEvent.__table__.create(bind=conn)
+        conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT"))
+        first, last = conn.execute(text(f"SELECT min(timestamp), max(timestamp) FROM {plain}")).one()
+        now = datetime.now()
+        key, stop = month_key(first or now), _add_months(month_key(max(last or now, now)),
+                                                         current_app.config["PARTITION_MONTHS_AHEAD"])
+        while key <= stop:
+            _create_partition(conn, key)
+            key = _add_months(key, 1)
+
+        columns = ", ".join(c.name for c in PrintEvent.__table__.columns)
+        rows = conn.execute(text(f"INSERT INTO {TABLE} ({columns}) SELECT {columns} FROM {plain}")).rowcount
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), (SELECT coalesce(max(id), 1) FROM {TABLE}))"
+        ))
+        conn.execute(text(f"DROP TABLE {plain}"))
+    _partitioned.clear()
+    logger.warning(f"🗂️ print_events переведена на помесячные секции: {rows} событий")
+    return rows
+
+
+if __name__ == "__main__":
+    from app import create_app
+    from app.config import DaemonConfig
+
+    app = create_app(DaemonConfig)
+    with app.app_context():
+        if "--migrate" in sys.argv[1:]:
+            print("🗂️ Переводим print_events на секции...")
+            print("✅ Перенесено событий:", migrate_to_partitioned())
+        print("🗂️ Созданы секции:", ensure_partitions())
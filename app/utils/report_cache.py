@@ -0,0 +1,272 @@
+"""
+Кэш результатов отчётов (/print-tree, /print-events, выгрузки).
+
+Ключ — вид отчёта и нормализованные параметры запроса; у каждой записи есть
+период [start, end], который она покрывает (None — без границы). Импорт событий
+при commit сообщает затронутый диапазон дат, и сбрасываются только записи,
+пересекающиеся с ним.
+
+Сбросы пишутся в общий журнал <REPORT_CACHE_DIR>/invalidations.log, поэтому
+импорт в демоне сбрасывает кэш и в процессах веб-сервера. При REPORT_CACHE_DISK
+значения дополнительно сохраняются на диск и переживают перезапуск.
+"""
+import hashlib
+import logging
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.config import Config
+
+logger = logging.getLogger("report_cache")
+
+LOG_NAME = "invalidations.log"
+LOG_MAX_BYTES = 1024 * 1024  # журнал обрезается — читатели при этом сбрасывают кэш целиком
+
+
+def _day(value):
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def _overlaps(start, end, first, last):
+    """[start, end] ∩ [first, last] ≠ ∅; None — открытая граница"""
+    return (end is None or first is None or end >= first) and (start is None or last is None or start <= last)
+
+
+def _fmt(value):
+    return value.isoformat() if value else "-"
+
+
+def _parse(value):
+    return None if value == "-" else date.fromisoformat(value)
+
+
+class ReportCache:
+    """LRU по числу записей + необязательное хранилище на диске + журнал сбросов"""
+
+    def __init__(self, max_entries=256, directory=None, disk=False):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.disk = disk and bool(directory)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.RLock()
+        self._data = OrderedDict()  # key -> (start, end, value)
+        self._log_offset = None
+        self._generation = 0  # растёт с каждым сбросом — защита от записи устаревшего результата
+
+    @staticmethod
+    def make_key(kind, **params):
+        """Ключ из вида отчёта и параметров: пустые значения отбрасываются, порядок не важен"""
+        items = sorted((k, str(v)) for k, v in params.items() if v not in (None, ""))
+        return kind + "?" + "&".join(f"{k}={v}" for k, v in items)
+
+    # 💾 диск
+    def _disk_name(self, key, start, end):
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return f"{digest}_{_fmt(start)}_{_fmt(end)}.pkl"
+
+    def _disk_lookup(self, key):
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        try:
+            names = [n for n in os.listdir(self.directory) if n.startswith(digest + "_")]
+        except FileNotFoundError:
+            return None
+        for name in names:
+            try:
+                with open(os.path.join(self.directory, name), "rb") as f:
+                    stored_key, start, end, value = pickle.load(f)
+            except (OSError, pickle.PickleError, EOFError, ValueError):
+                continue
+            if stored_key == key:
+                return start, end, value
+        return None
+
+    def _disk_store(self, key, start, end, value):
+        path = os.path.join(self.directory, self._disk_name(key, start, end))
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump((key, start, end, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except (OSError, pickle.PickleError, TypeError) as e:
+            logger.warning(f"⚠️ Не удалось сохранить отчёт в дисковый кэш: {e}")
+
+    def _disk_invalidate(self, first, last):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if not name.endswith(".pkl"):
+                continue
+            try:
+                _, start, end = name[:-4].split("_")
+                if _overlaps(_parse(start), _parse(end), first, last):
+                    os.remove(os.path.join(self.directory, name))
+            except (ValueError, OSError):
+                continue
+
+    # 📜 журнал сбросов между процессами
+    def _log_path(self):
+        return os.path.join(self.directory, LOG_NAME)
+
+    def _sync(self):
+        """Применяет сбросы, записанные другими процессами с прошлого обращения"""
+        if not self.directory:
+            return
+        try:
+            size = os.path.getsize(self._log_path())
+        except OSError:
+            size = 0
+        if self._log_offset is None:
+            self._log_offset = size  # старые записи журнала к нашему (пустому) кэшу не относятся
+            return
+        if size == self._log_offset:
+            return
+        if size < self._log_offset:
+            # журнал обрезан — не знаем, что пропустили
+            self._drop(None, None)
+            self._log_offset = size
+            return
+        with open(self._log_path(), "r", encoding="utf-8") as f:
+            f.seek(self._log_offset)
+            lines = f.read().splitlines()
+            self._log_offset = f.tell()
+        for line in lines:
+            try:
+                first, last = line.split()
+                self._drop(_parse(first), _parse(last))
+            except ValueError:
+                continue
+
+    def _drop(self, first, last):
+        self._generation += 1
+        stale = [k for k, (start, end, _) in self._data.items() if _overlaps(start, end, first, last)]
+        for key in stale:
+            del self._data[key]
+        self.invalidations += len(stale)
+
+    # 🔑 API
+    def get(self, key):
+        """(найдено, значение)"""
+        with self._lock:
+            self._sync()
+            entry = self._data.get(key)
+            if entry is None and self.disk:
+                entry = self._disk_lookup(key)
+                if entry is not None:
+                    self._put_memory(key, *entry)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, entry[2]
+
+    def _put_memory(self, key, start, end, value):
+        self._data[key] = (start, end, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def generation(self):
+        """Отметка перед расчётом отчёта: put(..., since=отметка) не сохранит результат, если был сброс"""
+        with self._lock:
+            self._sync()
+            return self._generation
+
+    def put(self, key, value, start=None, end=None, since=None):
+        start, end = _day(start), _day(end)
+        with self._lock:
+            self._sync()
+            if since is not None and since != self._generation:
+                return False  # пока считали, данные поменялись — результат не кэшируем
+            self._put_memory(key, start, end, value)
+        if self.disk:
+            os.makedirs(self.directory, exist_ok=True)
+            self._disk_store(key, start, end, value)
+        return True
+
+    def get_or_compute(self, key, compute, start=None, end=None):
+        found, value = self.get(key)
+        if not found:
+            since = self.generation()
+            value = compute()
+            self.put(key, value, start, end, since=since)
+        return value
+
+    def clear(self):
+        """Очистка кэша только в этом процессе (без журнала и диска)"""
+        with self._lock:
+            self._data.clear()
+
+    def invalidate(self, first=None, last=None):
+        """Сброс записей, пересекающихся с [first, last]; без аргументов — всего кэша"""
+        first, last = _day(first), _day(last)
+        with self._lock:
+            self._sync()
+            self._drop(first, last)
+            if not self.directory:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self._log_path(), "a", encoding="utf-8") as f:
+                f.write(f"{_fmt(first)} {_fmt(last)}\n")
+                truncate = f.tell() > LOG_MAX_BYTES
+            if truncate:
+                open(self._log_path(), "w").close()
+            self._log_offset = os.path.getsize(self._log_path())
+        if self.disk:
+            self._disk_invalidate(first, last)
+
+    def stats(self):
+        with self._lock:
+            self._sync()
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+                "size": len(self._data),
+                "max_entries": self.max_entries,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "disk": self.disk,
+            }
+
+
+report_cache = ReportCache(
+    max_entries=Config.REPORT_CACHE_SIZE,
+    directory=Config.REPORT_CACHE_DIR,
+    disk=Config.REPORT_CACHE_DISK,
+)
+
+
+def mark_dirty(session, first, last):
+    """Запоминает в сессии диапазон изменённых дней; сброс — после commit"""
+    dirty = session.info.get("report_dirty")
+    first, last = _day(first), _day(last)
+    if dirty:
+        first = None if first is None or dirty[0] is None else min(first, dirty[0])
+        last = None if last is None or dirty[1] is None else max(last, dirty[1])
+    session.info["report_dirty"] = (first, last)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    dirty = session.info.pop("report_dirty", None)
+    if dirty:
+        report_cache.invalidate(*dirty)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop("report_dirty", None)
@@ -0,0 +1,167 @@
+import logging
+from sqlalchemy import func, select, delete, case, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from app.extensions import db
+from app.models import PrintEvent, Printer, PrintDailyRollup
+from app.utils.archive import event_archive
+from app.utils.report_cache import mark_dirty
+
+logger = logging.getLogger("import_events")
+
+_KEY = ("day", "department_id", "printer_id", "user_id", "document_name")
+
+
+def aggregate_events(rows, printer_departments):
+    """
+    Сворачивает вставленные события в дневные дельты.
+    rows — словари с printer_id, user_id, document_name, timestamp, pages;
+    printer_departments — {printer_id: department_id}
+    """
+    deltas = {}
+    for r in rows:
+        key = (
+            r["timestamp"].date(),
+            printer_departments[r["printer_id"]],
+            r["printer_id"],
+            r["user_id"],
+            r["document_name"],
+        )
+        delta = deltas.get(key)
+        if delta:
+            delta["pages"] += r["pages"]
+            delta["events"] += 1
+            delta["last_time"] = max(delta["last_time"], r["timestamp"])
+        else:
+            deltas[key] = {"pages": r["pages"], "events": 1, "last_time": r["timestamp"]}
+    return [dict(zip(_KEY, key), **delta) for key, delta in deltas.items()]
+
+
+def apply_rollup_deltas(deltas):
+    """Прибавляет дельты к агрегатам: INSERT ... ON CONFLICT DO UPDATE (SQLite / PostgreSQL)"""
+    if not deltas:
+        return
+
+    table = PrintDailyRollup.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        dialect_insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(_KEY),
+            set_={
+                "pages": table.c.pages + stmt.excluded.pages,
+                "events": table.c.events + stmt.excluded.events,
+                "last_time": case(
+                    (stmt.excluded.last_time > table.c.last_time, stmt.excluded.last_time),
+                    else_=table.c.last_time,
+                ),
+            },
+        )
+        db.session.execute(stmt, deltas)
+        return
+
+    # прочие СУБД — без upsert: читаем существующие и обновляем по одной
+    for d in deltas:
+        row = PrintDailyRollup.query.filter_by(**{k: d[k] for k in _KEY}).first()
+        if row:
+            row.pages += d["pages"]
+            row.events += d["events"]
+            row.last_time = max(row.last_time, d["last_time"])
+        else:
+            db.session.add(PrintDailyRollup(**d))
+    db.session.flush()
+
+
+def update_rollups(rows):
+    """Инкрементальное обновление агрегатов по только что вставленным событиям (без commit)"""
+    if not rows:
+        return
+    printer_ids = {r["printer_id"] for r in rows}
+    printer_departments = dict(db.session.execute(
+        select(Printer.id, Printer.department_id).where(Printer.id.in_(printer_ids))
+    ).all())
+    apply_rollup_deltas(aggregate_events(rows, printer_departments))
+    # кэш отчётов за эти дни сбросится после commit
+    mark_dirty(db.session(), min(r["timestamp"] for r in rows), max(r["timestamp"] for r in rows))
+
+
+def rebuild_daily_rollups(start_date=None, end_date=None):
+    """
+    Полный пересчёт агрегатов из сырых событий за период (даты включительно)
+    или целиком, если период не задан. Выполняет commit.
+    Архивные месяцы не пересчитываются: их событий в таблице уже нет, агрегаты — окончательные.
+    """
+    horizon = event_archive.horizon()
+    if horizon and (start_date is None or start_date < horizon.date()):
+        logger.info(f"🗄️ Агрегаты до {horizon.date()} — из архива, пересчёт начинается с этой даты")
+        start_date = horizon.date()
+        if end_date and end_date < start_date:
+            return 0
+
+    day = func.date(PrintEvent.timestamp)
+
+    cleanup = delete(PrintDailyRollup)
+    source = (
+        select(
+            day.label("day"),
+            Printer.department_id,
+            PrintEvent.printer_id,
+            PrintEvent.user_id,
+            PrintEvent.document_name,
+            func.sum(PrintEvent.pages),
+            func.count(PrintEvent.id),
+            func.max(PrintEvent.timestamp),
+        )
+        .join(Printer, Printer.id == PrintEvent.printer_id)
+        .group_by(day, Printer.department_id, PrintEvent.printer_id, PrintEvent.user_id, PrintEvent.document_name)
+    )
+    if start_date:
+        cleanup = cleanup.where(PrintDailyRollup.day >= start_date)
+        source = source.where(day >= start_date.isoformat())
+    if end_date:
+        cleanup = cleanup.where(PrintDailyRollup.day <= end_date)
+        source = source.where(day <= end_date.isoformat())
+
+    db.session.execute(cleanup)
+    mark_dirty(db.session(), start_date, end_date)
+    db.session.execute(
+        insert(PrintDailyRollup).from_select(
+            [*_KEY, "pages", "events", "last_time"], source
+        )
+    )
+    db.session.commit()
+    count = db.session.scalar(select(func.count(PrintDailyRollup.id)))
+    logger.info(f"🧮 Агрегаты пересчитаны ({start_date or '…'} — {end_date or '…'}): {count} строк")
+    return count
+
+
+def ensure_rollups():
+    """Первый запуск после обновления: события есть, агрегатов нет — строим их"""
+    has_rollups = db.session.scalar(select(PrintDailyRollup.id).limit(1))
+    has_events = db.session.scalar(select(PrintEvent.id).limit(1))
+    if has_events and not has_rollups:
+        try:
+            rebuild_daily_rollups()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"💥 Не удалось построить агрегаты: {e}")
+
+
+if __name__ == "__main__":
+    import argparse
+    from datetime import datetime
+    from app import create_app
+    from app.config import DaemonConfig
+
+    parser = argparse.ArgumentParser(description="Пересчёт дневных агрегатов печати")
+    parser.add_argument("--start", help="YYYY-MM-DD")
+    parser.add_argument("--end", help="YYYY-MM-DD")
+    args = parser.parse_args()
+
+    def parse(value):
+        return datetime.strptime(value, "%Y-%m-%d").date() if value else None
+
+    app = create_app(DaemonConfig)  # пакетная работа — профиль демона
+    with app.app_context():
+        print("🧮 Пересчитываем агрегаты...")
+        print("✅ Строк:", rebuild_daily_rollups(parse(args.start), parse(args.end)))
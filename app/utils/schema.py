@@ -0,0 +1,85 @@
+import logging
+from sqlalchemy import inspect, text
+from app.extensions import db
+
+logger = logging.getLogger("schema")
+
+
+def ensure_columns():
+    """
+    create_all() не добавляет колонки в существующие таблицы — досоздаём
+    новые nullable-колонки моделей через ALTER TABLE ... ADD COLUMN
+    """
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    for table in db.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        existing = {col["name"] for col in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable:
+                logger.error(f"💥 Колонка {table.name}.{column.name} обязательна — нужна миграция")
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(db.engine.dialect)}"
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(text(ddl))
+                logger.warning(f"🛠️ Добавлена колонка {table.name}.{column.name}")
+            except Exception as e:
+                logger.error(f"💥 Не удалось добавить колонку {table.name}.{column.name}: {e}")
+
+
+def _existing_indexes(inspector, table_name):
+    """Имена индексов таблицы, включая функциональные (SQLite их не отражает)"""
+    if db.engine.dialect.name == "sqlite":
+        with db.engine.connect() as conn:
+            return set(conn.scalars(
+                text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :t"),
+                {"t": table_name},
+            ))
+    return {ix["name"] for ix in inspector.get_indexes(table_name)}
+
+
+def ensure_indexes():
+    """
+    create_all() не трогает существующие таблицы — досоздаём индексы,
+    добавленные в модели позже (для уже развёрнутых баз)
+    """
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing = _existing_indexes(inspector, table.name)
+        for index in table.indexes:
+            if index.name not in existing:
+                try:
+                    index.create(bind=db.engine)
+                    logger.warning(f"🛠️ Создан индекс {index.name}")
+                except Exception as e:
+                    logger.error(f"💥 Не удалось создать индекс {index.name}: {e}")
+
+
+def ensure_unique_job_ids():
+    """
+    Переход на уникальный job_id для уже развёрнутых баз: удаляем дубли событий
+    (оставляем первое по id), пересчитываем агрегаты и меняем старый
+    неуникальный индекс на uix_print_events_job_id. Вызывается до ensure_indexes().
+    """
+    from app.utils.rollups import rebuild_daily_rollups
+
+    if "uix_print_events_job_id" in _existing_indexes(inspect(db.engine), "print_events"):
+        return
+    try:
+        removed = db.session.execute(text(
+            "DELETE FROM print_events WHERE id NOT IN "
+            "(SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM print_events GROUP BY job_id) AS keep)"
+        )).rowcount
+        db.session.execute(text("DROP INDEX IF EXISTS ix_print_events_job_id"))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"💥 Не удалось убрать дубли job_id: {e}")
+        return
+    if removed:
+        logger.warning(f"🛠️ Удалено дублей событий по job_id: {removed}")
+        rebuild_daily_rollups()
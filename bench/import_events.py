@@ -0,0 +1,85 @@
+"""
+Бенчмарк импорта событий печати: построчный режим против пакетного.
+
+    python -m bench.import_events --sizes 10000 100000 1000000 --legacy-max 100000
+
+Каждый прогон идёт в свежую SQLite-базу во временном каталоге.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+
+def make_events(n, users=500, printers=200, seed=42):
+    rnd = random.Random(seed)
+    base_ms = 1_700_000_000_000
+    printer_names = [
+        f"hp{i % 7}-b{i % 5}-d{i % 20}-{100 + i % 50}-{i % 3 + 1}" for i in range(printers)
+    ]
+    events = []
+    for i in range(n):
+        events.append({
+            "TimeCreated": f"/Date({base_ms + i * 1000})/",
+            "Param1": None,
+            "Param2": f"document_{rnd.randrange(5000)}.docx",
+            "Param3": f"user{rnd.randrange(users)}",
+            "Param4": f"b{i % 5}-d{i % 20}-{100 + i % 50}-{i % 9}",
+            "Param5": rnd.choice(printer_names),
+            "Param6": rnd.choice(printer_names),
+            "Param7": rnd.randrange(10_000, 5_000_000),
+            "Param8": rnd.randrange(1, 30),
+            "JobID": f"{i:064x}",
+        })
+    return events
+
+
+def run(n, bulk, users=500):
+    tmp = tempfile.mkdtemp(prefix="advisor-bench-")
+    os.environ["DATABASE_URI"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+
+    from app import create_app
+    from app.config import Config
+    from app.extensions import db
+    from app.models import User, Department
+    from app.utils.dimension_cache import dimension_cache
+    from app.utils.import_print_events import import_print_events_from_json
+
+    Config.SQLALCHEMY_DATABASE_URI = os.environ["DATABASE_URI"]
+    app = create_app()
+    dimension_cache.invalidate()  # каждый прогон — новая база
+    with app.app_context():
+        dept = Department(code="bench", name="BENCH")
+        db.session.add(dept)
+        db.session.flush()
+        db.session.add_all(User(username=f"user{i}", fio=f"User {i}", department_id=dept.id) for i in range(users))
+        db.session.commit()
+
+        events = make_events(n, users=users)
+        started = time.perf_counter()
+        result = import_print_events_from_json(events, bulk=bulk)
+        elapsed = time.perf_counter() - started
+        db.session.remove()
+        db.engine.dispose()
+    return result["created"], len(result["errors"]), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--legacy-max", type=int, default=10_000,
+                        help="построчный режим запускается только до этого размера")
+    args = parser.parse_args()
+
+    print(f"{'events':>10} {'mode':>8} {'created':>10} {'errors':>7} {'sec':>9} {'events/sec':>12}")
+    for n in args.sizes:
+        modes = [True, False] if n <= args.legacy_max else [True]
+        for bulk in modes:
+            created, errors, elapsed = run(n, bulk)
+            print(f"{n:>10} {'bulk' if bulk else 'legacy':>8} {created:>10} {errors:>7} "
+                  f"{elapsed:>9.2f} {n / elapsed:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Бенчмарк импорта ad_users.csv: первичная загрузка и повторный прогон с обновлением.
+
+    python -m bench.import_users --sizes 10000 60000 200000
+
+Каждый прогон идёт в свежую SQLite-базу во временном каталоге.
+"""
+import argparse
+import csv
+import io
+import os
+import random
+import tempfile
+import time
+
+
+def make_csv(n, departments=300, seed=42, fio_suffix=""):
+    """CSV в формате Export-ADUsers.ps1 (UTF-8 с BOM), как бинарный поток"""
+    rnd = random.Random(seed)
+    text = io.StringIO()
+    writer = csv.writer(text, quoting=csv.QUOTE_ALL)
+    writer.writerow(["SamAccountName", "DisplayName", "OU"])
+    for i in range(n):
+        writer.writerow([f"user{i}", f"Пользователь {i}{fio_suffix}", f"dept{rnd.randrange(departments)}"])
+    return io.BytesIO(text.getvalue().encode("utf-8-sig"))
+
+
+def run(n):
+    tmp = tempfile.mkdtemp(prefix="advisor-bench-")
+    os.environ["DATABASE_URI"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+
+    from app import create_app
+    from app.config import Config
+    from app.extensions import db
+    from app.utils.dimension_cache import dimension_cache
+    from app.utils.import_users import import_users_from_csv
+
+    Config.SQLALCHEMY_DATABASE_URI = os.environ["DATABASE_URI"]
+    app = create_app()
+    dimension_cache.invalidate()  # каждый прогон — новая база
+    timings = []
+    with app.app_context():
+        for label, stream, update_existing in (
+            ("initial", make_csv(n), False),
+            ("update", make_csv(n, seed=7, fio_suffix=" (изм.)"), True),
+        ):
+            started = time.perf_counter()
+            result = import_users_from_csv(stream, update_existing=update_existing)
+            timings.append((label, result, time.perf_counter() - started))
+        db.session.remove()
+        db.engine.dispose()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 60_000, 200_000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'mode':>8} {'created':>10} {'updated':>10} {'errors':>7} {'sec':>9} {'rows/sec':>12}")
+    for n in args.sizes:
+        for label, result, elapsed in run(n):
+            print(f"{n:>10} {label:>8} {result['created']:>10} {result['updated']:>10} "
+                  f"{len(result['errors']):>7} {elapsed:>9.2f} {n / elapsed:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Микробенчмарки нормализации событий печати (без БД).
+
+    python -m bench.normalizer --events 200000
+    python -m bench.normalizer --events 1000000 --workers 0 2 4
+
+Сравнивается прежний разбор (replace для /Date(ms)/, split("-") на каждое событие)
+с app.utils.event_normalizer: отдельно время, имена принтеров/портов/компьютеров
+и событие целиком — для /Date(ms)/ и ISO 8601. Затем — пропускная способность
+normalize_chunks в текущем процессе и в пуле из N процессов — для словарей
+и для строк NDJSON (JSON разбирается в процессе-обработчике).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+from app.utils.event_normalizer import (
+    normalize_batch, normalize_event, parse_computer_name, parse_port_name, parse_printer_name, parse_timestamp
+)
+from app.utils.event_stream import iter_chunks
+from bench.synthetic import Organization, iter_events
+
+
+def legacy_parse(e):
+    """Разбор до выделения нормализатора: _parse_event + разбор имён в _write_records"""
+    timestamp_ms = int(e.get("TimeCreated").replace("/Date(", "").replace(")/", ""))
+    p = {
+        "username": (e.get("Param3") or "").strip().lower(),
+        "document_name": e.get("Param2") or "",
+        "document_id": int(e.get("Param1") or 0),
+        "byte_size": int(e.get("Param7") or 0),
+        "pages": int(e.get("Param8") or 0),
+        "timestamp": datetime.fromtimestamp(timestamp_ms / 1000),
+        "job_id": e.get("JobID") or "UNKNOWN",
+        "printer_name": e.get("Param5") or "",
+        "computer_name": (e.get("Param4") or "").strip().lower(),
+        "port_name": (e.get("Param6") or "").strip().lower(),
+    }
+    parts = p["printer_name"].strip().lower().split("-")
+    if len(parts) == 5:
+        p["printer"] = (*parts[:4], int(parts[4]))
+    computer = p["computer_name"].split("-")
+    if len(computer) == 4:
+        p["computer"] = (*computer[:3], int(computer[3]) if computer[3].isdigit() else 0)
+    port = p["port_name"].split("-")
+    if len(port) == 5:
+        p["port"] = (*port[:4], int(port[4]) if port[4].isdigit() else 0)
+    return p
+
+
+def legacy_names(printer, computer, port):
+    parts = printer.strip().lower().split("-")
+    parsed = (*parts[:4], int(parts[4])) if len(parts) == 5 else None
+    parts = computer.split("-")
+    if len(parts) == 4:
+        parsed = (*parts[:3], int(parts[3]) if parts[3].isdigit() else 0)
+    parts = port.split("-")
+    if len(parts) == 5:
+        parsed = (*parts[:4], int(parts[4]) if parts[4].isdigit() else 0)
+    return parsed
+
+
+def normalizer_names(printer, computer, port):
+    return parse_printer_name(printer), parse_computer_name(computer), parse_port_name(port)
+
+
+def to_iso(e):
+    """То же событие с TimeCreated в ISO 8601 (ConvertTo-Json PowerShell 7)"""
+    ms = int(e["TimeCreated"][6:-2])
+    moment = datetime.fromtimestamp(ms / 1000, timezone.utc)
+    return dict(e, TimeCreated=moment.strftime("%Y-%m-%dT%H:%M:%S.%f0+00:00"))
+
+
+def normalize_chunks(chunks, pool=None, workers=0, prefetch=2):
+    """
+    Нормализация потока пакетов: (пакет, записи, ошибки) в исходном порядке.
+    Без пула — в текущем процессе; с пулом вперёд отправляется не больше
+    workers * prefetch пакетов, чтобы поток не читался в память целиком
+    """
+    if pool is None:
+        for chunk in chunks:
+            yield (chunk, *normalize_batch(chunk))
+        return
+
+    pending = deque()
+    for chunk in chunks:
+        pending.append((chunk, pool.submit(normalize_batch, chunk)))
+        if len(pending) >= workers * prefetch:
+            chunk, future = pending.popleft()
+            yield (chunk, *future.result())
+    for chunk, future in pending:
+        yield (chunk, *future.result())
+
+
+def measure(func, items, repeat):
+    """Лучшее из repeat: событий в секунду"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for item in items:
+            func(*item) if isinstance(item, tuple) else func(item)
+        best = min(best, time.perf_counter() - started)
+    return round(len(items) / best)
+
+
+def cold(func):
+    """Вызов с пустыми кэшами имён (первое появление каждого имени)"""
+    def call(*args):
+        for cached in (parse_printer_name, parse_computer_name, parse_port_name):
+            cached.cache_clear()
+        return func(*args)
+    return call
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарки нормализации событий")
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument("--users", type=int, default=2_000)
+    parser.add_argument("--printers", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--chunk-size", type=int, default=5_000)
+    parser.add_argument("--workers", type=int, nargs="*", default=[0, 2, 4])
+    args = parser.parse_args()
+
+    org = Organization(args.users, args.printers)
+    events = list(iter_events(org, args.events))
+    iso_events = [to_iso(e) for e in events]
+    names = [(e["Param5"], e["Param4"].lower(), e["Param6"].lower()) for e in events]
+    print(f"🧪 {len(events)} событий, {len({e['Param5'] for e in events})} принтеров, "
+          f"{len({e['Param4'] for e in events})} компьютеров, CPU: {os.cpu_count()}")
+
+    rows = [
+        ("timestamp /Date(ms)/", measure(lambda v: datetime.fromtimestamp(
+            int(v.replace("/Date(", "").replace(")/", "")) / 1000), [e["TimeCreated"] for e in events], args.repeat),
+         measure(parse_timestamp, [e["TimeCreated"] for e in events], args.repeat)),
+        ("timestamp ISO 8601", None, measure(parse_timestamp, [e["TimeCreated"] for e in iso_events], args.repeat)),
+        ("names (cached)", measure(legacy_names, names, args.repeat), measure(normalizer_names, names, args.repeat)),
+        ("names (cold)", None, measure(cold(normalizer_names), names[:10_000], 1)),
+        ("event /Date(ms)/", measure(legacy_parse, events, args.repeat), measure(normalize_event, events, args.repeat)),
+        ("event ISO 8601", None, measure(normalize_event, iso_events, args.repeat)),
+    ]
+    print(f"{'case':<24} {'legacy ev/s':>14} {'normalizer ev/s':>16} {'speedup':>8}")
+    for case, legacy, current in rows:
+        speedup = f"{current / legacy:.2f}x" if legacy else ""
+        print(f"{case:<24} {legacy or '':>14} {current:>16} {speedup:>8}")
+
+    batch = normalize_batch(events[:1000])[0][0]
+    print(f"📦 Запись: {type(batch).__name__}, {len(batch)} полей")
+
+    # словари — события после разбора JSON в текущем процессе; NDJSON — строки, JSON разбирает обработчик
+    lines = [json.dumps(e, ensure_ascii=False) for e in events]
+    for workers in args.workers:
+        # spawn — как было бы в многопоточном демоне, где fork небезопасен
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) if workers else None
+        try:
+            if pool:  # запуск процессов (spawn + импорт модулей) в замер не входит
+                list(normalize_chunks([events[:1]] * workers * 2, pool, workers))
+            for source, items in (("dicts", events), ("ndjson", lines)):
+                started = time.perf_counter()
+                chunks = iter_chunks(iter(items), args.chunk_size)
+                count = sum(len(parsed) for _, parsed, _ in normalize_chunks(chunks, pool, workers))
+                seconds = time.perf_counter() - started
+                print(f"⚙️ normalize_chunks {source} workers={workers}: {round(count / seconds)} событий/с "
+                      f"({seconds:.2f} с)")
+        finally:
+            if pool:
+                pool.shutdown(wait=True, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    main()
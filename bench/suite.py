@@ -0,0 +1,245 @@
+"""
+Сквозной бенчмарк: импорт синтетических выгрузок и отчёты на SQLite.
+
+    python -m bench.suite --scale small
+    python -m bench.suite --users 5000 --printers 300 --events 500000 --output results.json
+    python -m bench.suite --scale small --compare bench-old.json
+    python -m bench.suite --scale small --format xml   # события как из wevtutil
+
+Шаги: генерация ad_users.csv и событий (bench.synthetic) → импорт пользователей
+и событий тем же кодом, что в демоне (import_file) → задержки /print-tree,
+/api/print-tree, /print-events (первая и глубокие страницы, фильтр по датам)
+→ выгрузки xlsx/csv. Отчёты меряются с пустым кэшем отчётов (каждый запрос —
+расчёт), отдельно — попадание в кэш. Для каждого шага пишется пик RSS процесса;
+с --trace-memory — ещё и пик аллокаций Python (tracemalloc, замедляет замеры).
+
+Результат — JSON (--output, по умолчанию bench-<время>.json): параметры,
+окружение (коммит, Python, SQLite) и метрики; --compare печатает разницу с
+прошлым прогоном.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from bench.synthetic import START, generate
+
+SCALES = {
+    "small": {"users": 500, "printers": 50, "events": 50_000},
+    "medium": {"users": 5_000, "printers": 300, "events": 500_000},
+    "large": {"users": 20_000, "printers": 1_000, "events": 2_000_000},
+}
+
+
+def percentiles(samples):
+    """p50/p90/p99/max в миллисекундах (ближайший ранг)"""
+    ordered = sorted(samples)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered) + 0.5) - 1))]
+
+    return {
+        "n": len(ordered),
+        "p50_ms": round(rank(50) * 1000, 2),
+        "p90_ms": round(rank(90) * 1000, 2),
+        "p99_ms": round(rank(99) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+def peak_rss_mb():
+    """Пик RSS процесса с начала работы (ru_maxrss: Linux — КБ, macOS — байты)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class Phase:
+    """Замер шага: время, пик RSS, при trace_memory — пик аллокаций Python"""
+
+    def __init__(self, results, name, trace_memory=False):
+        self.results, self.name, self.trace_memory = results, name, trace_memory
+        self.metrics = {}
+
+    def __enter__(self):
+        if self.trace_memory:
+            tracemalloc.start()
+        self.started = time.perf_counter()
+        return self.metrics
+
+    def __exit__(self, *exc):
+        self.metrics["seconds"] = round(time.perf_counter() - self.started, 3)
+        if self.trace_memory:
+            self.metrics["python_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 1e6, 1)
+            tracemalloc.stop()
+        self.metrics["peak_rss_mb"] = peak_rss_mb()
+        self.results[self.name] = self.metrics
+        print(f"⏱️ {self.name}: {self.metrics}")
+
+
+def _environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def _time_requests(client, urls, repeat, before=None):
+    samples = []
+    for _ in range(repeat):
+        for url in urls:
+            if before:
+                before()
+            started = time.perf_counter()
+            response = client.get(url)
+            data = response.data  # тело целиком — потоковые ответы тоже дочитываются
+            samples.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise RuntimeError(f"{url}: HTTP {response.status_code}")
+    return percentiles(samples), len(data)
+
+
+def run(params, repeat=10, deep_pages=5, trace_memory=False):
+    tmp = tempfile.mkdtemp(prefix="advisor-bench-")
+    # каталоги приложения — во временном каталоге, чтобы прогон не трогал рабочие данные
+    os.environ["DATABASE_URI"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    for name in ("REPORT_CACHE_DIR", "ARCHIVE_DIR", "IMPORT_SPOOL_DIR"):
+        os.environ[name] = os.path.join(tmp, name.lower())
+
+    results = {}
+    with Phase(results, "generate", trace_memory) as m:
+        users_path, events_path = generate(os.path.join(tmp, "data"), params["users"], params["printers"],
+                                           params["events"], days=params["days"], seed=params["seed"],
+                                           fmt=params["format"])
+        m["events_file_mb"] = round(os.path.getsize(events_path) / 1e6, 1)
+
+    from app import create_app
+    from app.config import Config
+    from app.extensions import db
+    from app.utils.dimension_cache import dimension_cache
+    from app.utils.import_jobs import import_file
+    from app.utils.report_cache import report_cache
+
+    Config.SQLALCHEMY_DATABASE_URI = os.environ["DATABASE_URI"]
+    app = create_app()
+    dimension_cache.invalidate()  # новая база
+    with app.app_context():
+        with Phase(results, "import_users", trace_memory) as m:
+            result = import_file(users_path, "users")
+            m.update(created=result["created"], errors=len(result["errors"]))
+        results["import_users"]["rows_per_sec"] = round(params["users"] / results["import_users"]["seconds"])
+
+        with Phase(results, "import_events", trace_memory) as m:
+            result = import_file(events_path, "events")
+            m.update(created=result["created"], skipped=result.get("skipped", 0), errors=len(result["errors"]))
+        results["import_events"]["events_per_sec"] = round(params["events"] / results["import_events"]["seconds"])
+
+        client = app.test_client()
+        cold = report_cache.clear
+        # второй месяц синтетического периода: неделя и месяц целиком
+        day = (START + timedelta(days=31)).date()
+        week, month_end = day + timedelta(days=6), (day + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+        with Phase(results, "reports", trace_memory) as m:
+            m["print_tree"], m["print_tree_html_bytes"] = _time_requests(client, ["/print-tree"], repeat, cold)
+            m["print_tree_month"], _ = _time_requests(
+                client, [f"/print-tree?start_date={day}&end_date={month_end}"], repeat, cold)
+            m["api_print_tree"], _ = _time_requests(client, ["/api/print-tree"], repeat, cold)
+            m["print_tree_cached"], _ = _time_requests(client, ["/print-tree"], repeat)
+
+            # глубокие страницы: курсоры собираются заранее, затем меряются все страницы
+            urls, cursor = ["/print-events"], None
+            for _ in range(deep_pages):
+                page = client.get("/api/print-events" + (f"?cursor={cursor}" if cursor else "")).get_json()
+                cursor = page["next_cursor"]
+                if not cursor:
+                    break
+                urls.append(f"/print-events?cursor={cursor}")
+            m["print_events_first"], _ = _time_requests(client, urls[:1], repeat, cold)
+            m["print_events_deep"], _ = _time_requests(client, urls[1:] or urls, repeat, cold)
+            m["print_events_range"], _ = _time_requests(
+                client, [f"/print-events?start_date={day}&end_date={week}"], repeat, cold)
+
+        with Phase(results, "export", trace_memory) as m:
+            for fmt in ("xlsx", "csv"):
+                cold()
+                started = time.perf_counter()
+                data = client.get(f"/print-tree/export?format={fmt}").data
+                m[f"{fmt}_seconds"] = round(time.perf_counter() - started, 3)
+                m[f"{fmt}_mb"] = round(len(data) / 1e6, 2)
+
+        db.session.remove()
+        db.engine.dispose()
+    return results
+
+
+def compare(current, previous):
+    """Разница с прошлым прогоном по числовым метрикам (секунды, задержки, скорость, память)"""
+    def flatten(tree, prefix=""):
+        for key, value in tree.items():
+            if isinstance(value, dict):
+                yield from flatten(value, f"{prefix}{key}.")
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield f"{prefix}{key}", value
+
+    old = dict(flatten(previous["results"]))
+    print(f"{'metric':<48} {'before':>12} {'after':>12} {'change':>9}")
+    for key, value in flatten(current["results"]):
+        if key in old and old[key]:
+            change = (value - old[key]) / old[key] * 100
+            print(f"{key:<48} {old[key]:>12} {value:>12} {change:>+8.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк импорта и отчётов на синтетических данных")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--users", type=int)
+    parser.add_argument("--printers", type=int)
+    parser.add_argument("--events", type=int)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--format", choices=["json", "ndjson", "xml"], default="json", help="формат выгрузки событий")
+    parser.add_argument("--repeat", type=int, default=10, help="повторов каждого запроса отчёта")
+    parser.add_argument("--deep-pages", type=int, default=5, help="сколько страниц /print-events пролистать")
+    parser.add_argument("--trace-memory", action="store_true", help="пик аллокаций Python (tracemalloc)")
+    parser.add_argument("--output", help="файл JSON с результатами")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    params = dict(SCALES[args.scale], days=args.days, seed=args.seed, format=args.format)
+    for name in ("users", "printers", "events"):
+        if getattr(args, name):
+            params[name] = getattr(args, name)
+
+    report = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "params": params,
+        "environment": _environment(),
+        "results": run(params, repeat=args.repeat, deep_pages=args.deep_pages, trace_memory=args.trace_memory),
+    }
+    output = args.output or f"bench-{datetime.now():%Y%m%d-%H%M%S}.json"
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"📊 Результаты: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Синтетические данные в формате выгрузок power_shell/: ad_users.csv
+(Export-ADUsers.ps1) и события печати (export_print_events.ps1).
+
+    python -m bench.synthetic --users 5000 --printers 300 --events 500000 --out /tmp/advisor-data
+    python -m bench.synthetic --format xml --out /tmp/advisor-data   # как wevtutil qe /f:xml
+
+События: TimeCreated как /Date(ms)/ (ConvertTo-Json), Param1–Param8, принтер
+model-bld-dept-room-idx, компьютер bld-dept-room-num, JobID — SHA-256 от
+"время UTC|пользователь|документ|принтер", как в скрипте экспорта.
+Печать идёт в рабочие часы по будням, пользователь печатает в основном на
+принтерах своего отдела, страницы и популярность документов — с длинным хвостом.
+Файлы пишутся потоково: в памяти только отсортированные моменты печати.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import random
+from datetime import datetime, timedelta, timezone
+from xml.sax.saxutils import escape
+
+MODELS = ["hp", "kyocera", "xerox", "canon", "brother", "ricoh", "pantum"]
+SURNAMES = ["Иванов", "Петров", "Сидоров", "Смирнов", "Кузнецов", "Попов", "Васильев", "Соколов",
+            "Михайлов", "Новиков", "Фёдоров", "Морозов", "Волков", "Алексеев", "Лебедев", "Семёнов"]
+NAMES = ["Александр", "Сергей", "Дмитрий", "Андрей", "Алексей", "Елена", "Ольга", "Наталья",
+         "Татьяна", "Ирина", "Анна", "Мария", "Павел", "Игорь", "Юлия", "Светлана"]
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)  # начало периода печати по умолчанию
+DOC_KINDS = [("Договор", "docx"), ("Счёт", "pdf"), ("Отчёт", "xlsx"), ("Служебная записка", "docx"),
+             ("Акт", "pdf"), ("Презентация", "pptx"), ("Письмо", "docx"), ("Microsoft Word - Документ", "docx")]
+
+
+class Organization:
+    """Отделы, здания, пользователи и принтеры одной синтетической организации"""
+
+    def __init__(self, users, printers, departments=None, buildings=None, seed=42):
+        rnd = random.Random(seed)
+        departments = departments or max(1, users // 60)
+        buildings = buildings or max(1, departments // 10)
+        self.departments = [f"d{i:03d}" for i in range(departments)]
+        self.buildings = [f"b{i}" for i in range(buildings)]
+        self.dept_building = {d: self.buildings[i % buildings] for i, d in enumerate(self.departments)}
+
+        self.printers = {d: [] for d in self.departments}
+        for i in range(printers):
+            dept = self.departments[i % departments]
+            room = 100 + rnd.randrange(400)
+            self.printers[dept].append(f"{rnd.choice(MODELS)}-{self.dept_building[dept]}-{dept}-{room}-{i // departments + 1}")
+        self.all_printers = [p for names in self.printers.values() for p in names]
+
+        self.users = []  # (логин, ФИО, отдел, компьютер)
+        for i in range(users):
+            dept = self.departments[rnd.randrange(departments)]
+            fio = f"{rnd.choice(SURNAMES)} {rnd.choice(NAMES)}"
+            computer = f"{self.dept_building[dept]}-{dept}-{100 + rnd.randrange(400)}-{rnd.randrange(1, 10)}"
+            self.users.append((f"u{i:06d}", fio, dept, computer))
+
+    def write_ad_users(self, path):
+        """ad_users.csv: UTF-8 с BOM, все поля в кавычках (Export-Csv)"""
+        with open(path, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+            writer.writerow(["SamAccountName", "DisplayName", "OU"])
+            for login, fio, dept, _ in self.users:
+                writer.writerow([login, fio, dept])
+        return path
+
+
+def _work_seconds(rnd, start, days):
+    """Момент печати (секунды epoch): будни, 8:00–19:00 с пиком около полудня"""
+    while True:
+        day = start + timedelta(days=rnd.randrange(days))
+        if day.weekday() < 5:
+            break
+    hour = min(18.99, max(8.0, rnd.gauss(13, 2.5)))
+    return int(day.timestamp()) + int(hour * 3600) + rnd.randrange(60)
+
+
+def iter_events(org, n, days=90, start=None, seed=42):
+    """События печати в формате выгрузки PowerShell, по возрастанию времени"""
+    rnd = random.Random(seed)
+    start = start or START
+    times = sorted(_work_seconds(rnd, start, days) for _ in range(n))
+    docs = 20 * len(org.users) + 100
+    for seconds in times:
+        time = datetime.fromtimestamp(seconds, timezone.utc)
+        # треть печати — немногие «активные» пользователи, остальное — равномерно
+        if rnd.random() < 0.3:
+            user = int(rnd.paretovariate(1.2)) % len(org.users)
+        else:
+            user = rnd.randrange(len(org.users))
+        login, _, dept, computer = org.users[user]
+        own = org.printers[dept]
+        printer = rnd.choice(own) if own and rnd.random() < 0.9 else rnd.choice(org.all_printers)
+        kind, ext = DOC_KINDS[rnd.randrange(len(DOC_KINDS))]
+        document = f"{kind} №{int(rnd.paretovariate(0.8)) % docs}.{ext}"
+        pages = min(500, int(rnd.paretovariate(1.5)))
+        job_hash = hashlib.sha256(
+            f"{time.strftime('%Y-%m-%dT%H:%M:%S')}|{login}|{document}|{printer}".encode("utf-8")
+        ).hexdigest().upper()
+        yield {
+            "TimeCreated": f"/Date({seconds * 1000})/",
+            "Param1": None,
+            "Param2": document,
+            "Param3": login,
+            "Param4": computer,
+            "Param5": printer,
+            "Param6": printer,
+            "Param7": pages * rnd.randrange(20_000, 200_000),
+            "Param8": pages,
+            "JobID": job_hash,
+        }
+
+
+def write_events(path, events, ndjson=False):
+    """JSON-массив (как ConvertTo-Json) или NDJSON; возвращает число событий"""
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        if not ndjson:
+            f.write("[\n")
+        for e in events:
+            if ndjson:
+                f.write(json.dumps(e, ensure_ascii=False) + "\n")
+            else:
+                f.write((",\n" if count else "") + json.dumps(e, ensure_ascii=False))
+            count += 1
+        if not ndjson:
+            f.write("\n]\n")
+    return count
+
+
+XML_EVENT = (
+    '<Event xmlns="http://schemas.microsoft.com/win/2004/08/events/event"><System>'
+    '<Provider Name="Microsoft-Windows-PrintService" Guid="{{747EF6FD-E535-4D16-B510-42C90F6873A1}}"/>'
+    '<EventID>307</EventID><Version>0</Version><Level>4</Level><Task>26</Task><Opcode>11</Opcode>'
+    '<Keywords>0x4000000000000840</Keywords><TimeCreated SystemTime="{time}"/>'
+    '<EventRecordID>{record}</EventRecordID><Correlation/><Execution ProcessID="2436" ThreadID="5688"/>'
+    '<Channel>Microsoft-Windows-PrintService/Operational</Channel><Computer>print-srv</Computer>'
+    '<Security UserID="S-1-5-21-1004336348-1177238915-682003330-1001"/></System>'
+    '<UserData><DocumentPrinted xmlns="http://manifests.microsoft.com/win/2005/08/windows/printing/spooler/core/events">'
+    '{params}</DocumentPrinted></UserData></Event>'
+)
+
+
+def write_events_xml(path, events):
+    """XML журнала, как wevtutil qe /f:xml: <Event> подряд, без общего корня; возвращает число событий"""
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for e in events:
+            count += 1
+            moment = datetime.fromtimestamp(int(e["TimeCreated"][6:-2]) / 1000, timezone.utc)
+            params = "".join(
+                f"<Param{i}>{escape(str(count if i == 1 else e[f'Param{i}']))}</Param{i}>" for i in range(1, 9)
+            )
+            f.write(XML_EVENT.format(time=moment.strftime("%Y-%m-%dT%H:%M:%S.%f0Z"), record=count, params=params))
+    return count
+
+
+def generate(directory, users, printers, events, days=90, seed=42, fmt="json"):
+    """
+    ad_users.csv и файл событий в каталоге; возвращает (путь CSV, путь событий).
+    fmt: json (ConvertTo-Json), ndjson или xml (wevtutil)
+    """
+    os.makedirs(directory, exist_ok=True)
+    org = Organization(users, printers, seed=seed)
+    users_path = org.write_ad_users(os.path.join(directory, "ad_users.csv"))
+    events_path = os.path.join(directory, f"bench-prn-event.{fmt}")
+    items = iter_events(org, events, days=days, seed=seed)
+    if fmt == "xml":
+        write_events_xml(events_path, items)
+    else:
+        write_events(events_path, items, ndjson=fmt == "ndjson")
+    return users_path, events_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Синтетические ad_users.csv и события печати")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--printers", type=int, default=50)
+    parser.add_argument("--events", type=int, default=50_000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--format", choices=["json", "ndjson", "xml"], default="json")
+    parser.add_argument("--out", required=True, help="каталог для файлов")
+    args = parser.parse_args()
+    for path in generate(args.out, args.users, args.printers, args.events, args.days, args.seed, args.format):
+        print(f"📄 {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,38 @@ import os
 import time
 import glob
 import logging
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-from app.utils.import_users import import_users_from_csv
-from app.utils.import_print_events import import_print_events_from_json
+from app import create_app
+from app.config import DaemonConfig
+from app.utils.dimension_cache import dimension_cache
+from app.utils.bloom import job_filter
+from app.utils.import_jobs import import_file, write_slot
+from app.utils.archive import archive_closed_months
+from app.utils.partitions import ensure_partitions
+from app.utils.import_checkpoint import ImportCheckpoint
+from app.utils.dir_watcher import make_watcher
+from app.utils.metrics import log_summary, metrics, profiler, sql_scope
 
 IMPORT_DIR = './import_dir'
+CHECKPOINT_DIR = os.path.join(IMPORT_DIR, '.checkpoints')
 SLEEP_TIME = 10  # seconds
+RESCAN_INTERVAL = 60  # seconds — полный просмотр каталога поверх inotify
+BACKLOG_POLL = 1.0  # seconds — как часто проверять свободные воркеры, пока файлы ждут своей очереди
+DEBOUNCE = float(os.getenv("IMPORT_DEBOUNCE", "0.2"))  # seconds без изменений — файл дописан
+USERS_FILE = 'ad_users.csv'
+USERS_FILES = (USERS_FILE, USERS_FILE + '.gz', USERS_FILE + '.zst')  # сжатые распаковываются на лету
+WATCH_PATTERNS = ['*-prn-event*.json', '*-prn-event*.ndjson', '*-prn-event*.xml',
+                  '*-prn-event*.gz', '*-prn-event*.zst', *USERS_FILES]
+
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "4"))  # файлов разбирается параллельно
+IMPORT_WRITERS = DaemonConfig.IMPORT_WRITERS  # одновременных писателей в БД (для SQLite — 1)
+CLAIM_SUFFIX = '.processing'
+CLAIM_TIMEOUT = int(os.getenv("IMPORT_CLAIM_TIMEOUT", "3600"))  # seconds без heartbeat — захват брошен
+# seconds между архивациями; 0 — выключено, пока архивация не включена явно (ARCHIVE_ENABLED)
+ARCHIVE_INTERVAL = DaemonConfig.ARCHIVE_INTERVAL if DaemonConfig.ARCHIVE_ENABLED else 0
 
 logger = logging.getLogger("import_daemon")
 logger.setLevel(logging.INFO)
@@ -16,42 +42,278 @@ handler.setFormatter(logging.Formatter('[%(asctime)s] [%(levelname)s] %(message)
 logger.addHandler(handler)
 
 
-def process_ad_users():
-    users_file = os.path.join(IMPORT_DIR, 'ad_users.csv')
-    if os.path.isfile(users_file):
-        logger.info("👥 Найден ad_users.csv")
+def claim_file(path):
+    """
+    Захват файла переименованием в *.processing: rename атомарен, поэтому
+    из нескольких демонов на одном IMPORT_DIR файл достанется ровно одному
+    """
+    claimed = path + CLAIM_SUFFIX
+    try:
+        os.rename(path, claimed)
+    except OSError:
+        return None
+    os.utime(claimed)  # время захвата — точка отсчёта для CLAIM_TIMEOUT
+    return claimed
+
+
+def release_file(claimed):
+    """Возвращает файл в очередь (после ошибки импорта)"""
+    try:
+        os.rename(claimed, claimed[:-len(CLAIM_SUFFIX)])
+    except OSError as e:
+        logger.error(f"💥 Не удалось вернуть файл {claimed}: {e}")
+
+
+def reclaim_stale_files():
+    """Возвращает в очередь захваты, по которым давно не было heartbeat (упавший демон)"""
+    deadline = time.time() - CLAIM_TIMEOUT
+    for claimed in glob.glob(os.path.join(IMPORT_DIR, '*' + CLAIM_SUFFIX)):
+        try:
+            if os.path.getmtime(claimed) < deadline:
+                os.rename(claimed, claimed[:-len(CLAIM_SUFFIX)])
+                logger.warning(f"♻️ Брошенный захват возвращён в очередь: {os.path.basename(claimed)}")
+        except OSError:
+            pass  # файл уже забрал другой экземпляр
+
+
+class DaemonStats:
+    """Глубина очереди и задержка обработки файлов (от обнаружения до конца импорта)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.files = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def cancelled(self):
+        """Задача не состоялась: файл успел забрать другой экземпляр"""
+        with self._lock:
+            self.in_flight -= 1
+
+    def idle(self, workers):
+        with self._lock:
+            return workers - self.in_flight
+
+    def finished(self, detected_at):
+        latency = time.time() - detected_at
+        with self._lock:
+            self.in_flight -= 1
+            self.files += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+        return latency
+
+    def snapshot(self, watcher=None, backlog=0):
+        with self._lock:
+            return {
+                "queue_depth": self.in_flight + backlog + (watcher.pending() if watcher else 0),
+                "files": self.files,
+                "latency_avg": round(self.latency_total / self.files, 3) if self.files else 0.0,
+                "latency_max": round(self.latency_max, 3),
+            }
+
+
+stats = DaemonStats()
+retry_after = {}  # путь файла -> time.time(), раньше которого не повторяем после ошибки
+
+
+def _finish(path, detected_at, ok):
+    name = os.path.basename(path)
+    latency = stats.finished(detected_at)
+    metrics.observe("advisor_daemon_file_latency_seconds", latency,
+                    kind="users" if name in USERS_FILES else "events", status="done" if ok else "failed")
+    if ok:
+        retry_after.pop(path, None)
+    else:
+        # возвращённый файл watcher больше не сообщит — основной цикл сам вернёт его в очередь
+        retry_after[path] = time.time() + SLEEP_TIME
+    logger.info(f"⏱️ {name}: {latency:.3f} с от обнаружения, {stats.snapshot()}")
+
+
+def import_users_file(app, claimed, detected_at):
+    path = claimed[:-len(CLAIM_SUFFIX)]
+    name = os.path.basename(path)
+    logger.info(f"👥 Найден {name}")
+    ok = False
+    with app.app_context():
         try:
-            with open(users_file, "rb") as f:
-                result = import_users_from_csv(f)
-            logger.info(f"✅ Пользователи загружены: {result}")
-            os.remove(users_file)
-            logger.info("🗑️ ad_users.csv удалён")
+            result = import_file(claimed, "users", write_slot=write_slot, sync=True)
+            logger.info(f"✅ Пользователи синхронизированы: {result}")
+            os.remove(claimed)
+            logger.info(f"🗑️ {name} удалён")
+            ok = True
         except Exception as e:
             logger.error(f"💥 Ошибка при импорте пользователей: {e}")
+            release_file(claimed)
+    _finish(path, detected_at, ok)
 
 
-def process_print_events():
-    json_files = sorted(
-        glob.glob(os.path.join(IMPORT_DIR, '*-prn-event*.json')),
-        key=os.path.getctime
-    )
-    for json_file in json_files:
-        logger.info(f"🖨️ Найден файл событий: {os.path.basename(json_file)}")
+def import_events_file(app, claimed, detected_at):
+    """Импорт одного захваченного файла в отдельном потоке со своей сессией"""
+    path = claimed[:-len(CLAIM_SUFFIX)]
+    name = os.path.basename(path)
+    logger.info(f"🖨️ Найден файл событий: {name}")
+    ok = False
+
+    with app.app_context():
+        try:
+            checkpoint = ImportCheckpoint(claimed, CHECKPOINT_DIR, name=name)
+            result = import_file(
+                claimed,
+                "events",
+                checkpoint=checkpoint,
+                write_slot=write_slot,
+                progress=lambda *_: os.utime(claimed),  # heartbeat захвата
+            )
+            logger.info(f"✅ События {name} загружены: {result}")
+            logger.info(f"📇 Кэш справочников: {dimension_cache.stats()}")
+            os.remove(claimed)
+            checkpoint.clear()
+            logger.info(f"🗑️ Файл {name} удалён")
+            ok = True
+        except Exception as e:
+            logger.error(f"💥 Ошибка при импорте событий {name}: {e}")
+            release_file(claimed)
+    _finish(path, detected_at, ok)
+
+
+def archive_months(app):
+    """
+    Суточное обслуживание таблицы событий под слотом писателя, как и импорт:
+    секции на месяцы вперёд (PostgreSQL) и выгрузка закрытых месяцев в архив
+    """
+    scope = sql_scope.set("maintenance")
+    with app.app_context():
         try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                import json
-                events = json.load(f)
-            result = import_print_events_from_json(events)
-            logger.info(f"✅ События загружены: {result}")
-            os.remove(json_file)
-            logger.info(f"🗑️ Файл {os.path.basename(json_file)} удалён")
+            with write_slot:
+                created = ensure_partitions()
+                if created:
+                    logger.info(f"🗂️ Созданы секции print_events: {created}")
+                done = archive_closed_months()
+            if done:
+                logger.info(f"🗄️ В архив выгружены месяцы: {done}")
         except Exception as e:
-            logger.error(f"💥 Ошибка при импорте событий {json_file}: {e}")
+            logger.error(f"💥 Ошибка архивации: {e}")
+    sql_scope.reset(scope)
+
+
+profile_toggle = threading.Event()
+
+
+def toggle_profiling():
+    """SIGUSR1: включает cProfile для каждой задачи импорта; повторный сигнал выключает и пишет профиль в журнал"""
+    if profiler.enabled:
+        profiler.configure(enabled=False)
+        logger.info(f"🔬 Профиль импорта ({profiler.profiled} задач):\n{profiler.report()}")
+    else:
+        profiler.configure(enabled=True, sample=1.0, reset=True)
+        logger.info("🔬 Профилирование импорта включено")
+
+
+def run_claimed(job, app, path, detected_at):
+    """
+    Захват файла уже в потоке-воркере, прямо перед импортом: файл, ждущий в очереди
+    пула, остаётся незахваченным — его может взять другой демон, а reclaim_stale_files
+    не вернёт захват без heartbeat, пока задача стоит в очереди
+    """
+    claimed = claim_file(path)
+    if not claimed:
+        stats.cancelled()
+        return
+    job(app, claimed, detected_at)
+
+
+def due_retries(now):
+    """Файлы после ошибки, у которых истекла пауза: {путь: время повторного обнаружения}"""
+    due = {path: now for path, at in list(retry_after.items()) if at <= now}
+    for path in due:
+        retry_after.pop(path, None)
+    return due
+
+
+def dispatch(app, executor, backlog):
+    """
+    Ставит в пул не больше файлов, чем свободных воркеров; остальные ждут в backlog
+    ({путь: время обнаружения}), и их могут забрать другие демоны на том же IMPORT_DIR.
+    ad_users.csv — первым и синхронно, как и раньше
+    """
+    idle = stats.idle(IMPORT_WORKERS)
+    now = time.time()
+    for path, detected_at in sorted(backlog.items(),
+                                    key=lambda r: (os.path.basename(r[0]) not in USERS_FILES, r[1])):
+        if idle <= 0:
+            break
+        if retry_after.get(path, 0) > now:
+            continue
+        del backlog[path]
+        stats.started()
+        idle -= 1
+        if os.path.basename(path) in USERS_FILES:
+            # события могут ссылаться на новых пользователей — ждём их импорта
+            executor.submit(run_claimed, import_users_file, app, path, detected_at).result()
+        else:
+            executor.submit(run_claimed, import_events_file, app, path, detected_at)
+
+
+def wait_timeout(backlog, now):
+    """Сколько ждать событий каталога: меньше, если файлы ждут воркера или паузы после ошибки"""
+    timeout = BACKLOG_POLL if backlog else SLEEP_TIME
+    pauses = list(retry_after.values())  # словарь меняют и потоки-воркеры
+    if pauses:
+        timeout = min(timeout, max(0.0, min(pauses) - now))
+    return timeout
 
 
 if __name__ == "__main__":
-    logger.info("🟣 Daemon запущен, наблюдаем за каталогом импорта...")
-    while True:
-        process_ad_users()
-        process_print_events()
-        time.sleep(SLEEP_TIME)
+    metrics.process = "importer_daemon"
+    app = create_app(DaemonConfig)
+    if hasattr(signal, "SIGUSR1"):
+        # сигнал только ставит флаг — журнал и профиль трогает основной цикл
+        signal.signal(signal.SIGUSR1, lambda *_: profile_toggle.set())
+    with app.app_context():
+        dimension_cache.warm()
+        logger.info(f"📇 Кэш справочников прогрет: {dimension_cache.stats()['size']}")
+        job_filter.warm()
+        logger.info(f"🌸 Фильтр job_id прогрет: {job_filter.stats()}")
+
+    os.makedirs(IMPORT_DIR, exist_ok=True)
+    watcher = make_watcher(IMPORT_DIR, WATCH_PATTERNS, debounce=DEBOUNCE, interval=SLEEP_TIME, logger=logger)
+    logger.info(f"🟣 Daemon запущен ({type(watcher).__name__}, {IMPORT_WORKERS} воркеров, "
+                f"{IMPORT_WRITERS} писателей), наблюдаем за каталогом импорта...")
+
+    with ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix="importer") as executor:
+        ready, last_scan, last_archive = watcher.scan(), time.time(), 0.0
+        backlog = {}  # путь -> время обнаружения: готовые файлы, ещё не отданные воркерам
+        while True:
+            if ARCHIVE_INTERVAL and time.time() - last_archive >= ARCHIVE_INTERVAL:
+                executor.submit(archive_months, app)
+                last_archive = time.time()
+            for path, detected_at in ready:
+                backlog.setdefault(path, detected_at)
+            for path, detected_at in due_retries(time.time()).items():
+                backlog.setdefault(path, detected_at)
+            dispatch(app, executor, backlog)
+            ready = watcher.wait(wait_timeout(backlog, time.time()))
+            if profile_toggle.is_set():
+                profile_toggle.clear()
+                toggle_profiling()
+            try:
+                metrics.write_snapshot()  # для /metrics веб-приложения
+            except OSError as e:
+                logger.warning(f"⚠️ Не удалось сохранить снимок метрик: {e}")
+            if time.time() - last_scan >= RESCAN_INTERVAL:
+                # страховка от потерянных событий и возврат брошенных захватов
+                reclaim_stale_files()
+                known = {path for path, _ in ready}
+                ready += [r for r in watcher.scan() if r[0] not in known]
+                # файлы, которые тем временем забрал другой демон, из backlog убираем
+                for path in [p for p in backlog if not os.path.exists(p)]:
+                    del backlog[path]
+                last_scan = time.time()
+                logger.info(f"📊 Очередь импорта: {stats.snapshot(watcher, len(backlog))}")
+                log_summary(logger, {"queue": stats.snapshot(watcher, len(backlog))})
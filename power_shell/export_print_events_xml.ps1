@@ -0,0 +1,91 @@
+<#
+.SYNOPSIS
+    Экспорт событий печати (Event ID 307) в XML журнала через wevtutil — без ToXml() и ConvertTo-Json.
+
+.DESCRIPTION
+    Облегчённый вариант export_print_events.ps1 для нагруженных серверов печати.
+    События не разбираются в PowerShell: wevtutil сам отбирает их XPath-фильтром
+    по времени и пишет XML (<Event> подряд, без общего корня). Поля Param1–Param8
+    и JobID (тот же SHA-256, что в export_print_events.ps1) вычисляет импортёр,
+    поэтому выгрузки обоих скриптов дедуплицируются между собой.
+    Параметры -Start/-End и last_run.txt — как в export_print_events.ps1.
+
+.PARAMETER Start
+    (необязательный) Время начала в формате ISO 8601, например "2025-03-25T06:00:00"
+
+.PARAMETER End
+    (необязательный) Время окончания в формате ISO 8601, например "2025-03-25T18:00:00"
+
+.NOTES
+    - Файл *-prn-event.xml подхватывает демон импорта и принимает /upload
+    - Кодировка вывода — UTF-8 без BOM
+#>
+
+param (
+    [string]$Start,
+    [string]$End
+)
+
+# === Настройки ===
+$OutputDir = "C:\Temp"
+$LastRunFile = Join-Path $OutputDir "last_run.txt"
+$LogName = "Microsoft-Windows-PrintService/Operational"
+
+# === Подготовка диапазона дат (UTC) ===
+$now = (Get-Date).ToUniversalTime()
+
+if ($Start -and $End) {
+    try {
+        $startTime = [DateTime]::Parse($Start).ToUniversalTime()
+        $endTime   = [DateTime]::Parse($End).ToUniversalTime()
+    } catch {
+        Write-Host "❌ Ошибка парсинга дат из параметров"
+        exit 1
+    }
+}
+elseif (Test-Path $LastRunFile) {
+    try {
+        $startTime = [DateTime]::Parse((Get-Content $LastRunFile -Raw)).ToUniversalTime()
+        $endTime = $now
+    } catch {
+        Write-Host "❌ Ошибка чтения файла last_run.txt"
+        exit 1
+    }
+}
+else {
+    Write-Host "⚠️ Параметры не переданы и файл last_run.txt не найден. Выполняется полная выгрузка."
+    $startTime = [DateTime]"2000-01-01T00:00:00Z"
+    $endTime = $now
+}
+
+$filenamePrefix = $startTime.ToString("yyyy-MM-dd-HH-mm")
+$outputFile = Join-Path $OutputDir "$filenamePrefix-prn-event.xml"
+
+Write-Host "📤 Диапазон: $startTime UTC ➡ $endTime UTC"
+Write-Host "📁 Файл выгрузки: $outputFile"
+
+# === Выгрузка: фильтр по EventID и времени выполняет сам журнал ===
+$from = $startTime.ToString("yyyy-MM-ddTHH:mm:ss.fffZ")
+$to   = $endTime.ToString("yyyy-MM-ddTHH:mm:ss.fffZ")
+$query = "*[System[(EventID=307) and TimeCreated[@SystemTime>='$from' and @SystemTime<='$to']]]"
+
+$xml = wevtutil qe $LogName /q:$query /f:xml
+if ($LASTEXITCODE -ne 0) {
+    Write-Host "❌ wevtutil завершился с кодом $LASTEXITCODE"
+    exit 1
+}
+
+# wevtutil печатает по событию на строку
+$count = @($xml | Where-Object { $_ }).Count
+if ($count -gt 0) {
+    [System.IO.File]::WriteAllLines($outputFile, [string[]]$xml, (New-Object System.Text.UTF8Encoding $false))
+    Write-Host "✅ Успешно выгружено: $count событий"
+
+    # Обновляем last_run.txt с буфером -1 минута
+    $newStartTime = $endTime.AddMinutes(-1)
+    $newStartTime.ToString("yyyy-MM-ddTHH:mm:ssZ") | Set-Content -Path $LastRunFile -Encoding UTF8
+    Write-Host "📌 Обновлён файл last_run.txt: $newStartTime (UTC -1м)"
+}
+else {
+    Write-Host "ℹ️ Нет новых событий в заданном диапазоне."
+}
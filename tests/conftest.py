@@ -0,0 +1,118 @@
+"""
+Общие фикстуры: приложение на временной SQLite-базе с небольшим набором данных.
+
+Приложения session-scope и контекст не держат: тест сам входит в app.app_context(),
+иначе приложение SQLite и PostgreSQL перекрывали бы друг друга.
+
+Каталоги архива, кэша отчётов, спула и метрик переводятся во временный каталог до
+импорта app — модульные экземпляры (event_archive, report_cache) читают Config при импорте.
+"""
+import io
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+_TMP = tempfile.mkdtemp(prefix="advisor-tests-")
+for _name in ("ARCHIVE_DIR", "REPORT_CACHE_DIR", "IMPORT_SPOOL_DIR", "METRICS_DIR"):
+    os.environ[_name] = os.path.join(_TMP, _name.lower())
+
+import pytest  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.config import Config  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.utils.bloom import job_filter  # noqa: E402
+from app.utils.dimension_cache import dimension_cache  # noqa: E402
+from app.utils.import_print_events import import_print_events_from_json  # noqa: E402
+from app.utils.import_users import import_users_from_csv  # noqa: E402
+from app.utils.report_cache import report_cache  # noqa: E402
+
+DEPARTMENTS = ("it", "hr", "fin")
+USERS = 30
+PRINTERS = 6
+EVENTS = 300
+SCALE = 4  # во сколько раз больше строк в large_app
+
+
+def _departments(scale):
+    """Отделы растут вместе с данными: иначе ленивая загрузка отдела дала бы одинаковое число запросов"""
+    return DEPARTMENTS + tuple(f"dep{k}" for k in range(len(DEPARTMENTS) * (scale - 1)))
+
+
+def _users_csv(scale=1):
+    departments = _departments(scale)
+    lines = ["SamAccountName,DisplayName,OU,Enabled"]
+    for n in range(USERS * scale):
+        lines.append(f"user{n},Пользователь {n},{departments[n % len(departments)]},True")
+    return io.BytesIO("\n".join(lines).encode("utf-8"))
+
+
+def _events(scale=1):
+    """События в формате ConvertTo-Json: несколько дней, принтеров, компьютеров и портов"""
+    departments, printers, users = _departments(scale), PRINTERS * scale, USERS * scale
+    start = datetime(2025, 1, 10)
+    for n in range(EVENTS * scale):
+        dept = departments[n % printers % len(departments)]
+        printer = f"hp-b1-{dept}-10{n % printers}-1"
+        moment = start + timedelta(hours=n)
+        yield {
+            "TimeCreated": f"/Date({int(moment.timestamp() * 1000)})/",
+            "Param1": str(n),
+            "Param2": f"Документ {n}.docx",
+            "Param3": f"user{n % users}",
+            "Param4": f"b1-{dept}-10{n % printers}-{n % 4}",
+            "Param5": printer,
+            "Param6": printer,
+            "Param7": str(1024 * (n + 1)),
+            "Param8": str(n % 5 + 1),
+            "JobID": f"job-{n:06d}",
+        }
+
+
+def _make_app(uri, fresh=False, scale=1, **settings):
+    TestConfig = type("TestConfig", (Config,), {"TESTING": True, "SQLALCHEMY_DATABASE_URI": uri, **settings})
+
+    if fresh:
+        # общая тестовая база PostgreSQL: схема от прошлого прогона не нужна
+        with create_app(TestConfig).app_context():
+            db.drop_all()
+            db.session.remove()
+    # справочники и фильтр job_id могли остаться от другой базы
+    dimension_cache.invalidate()
+    job_filter.invalidate()
+    app = create_app(TestConfig)
+    with app.app_context():
+        import_users_from_csv(_users_csv(scale))
+        result = import_print_events_from_json(_events(scale))
+        assert result["created"] == EVENTS * scale, result["errors"][:5]
+        report_cache.clear()
+        db.session.remove()
+    return app
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    return _make_app(f"sqlite:///{tmp_path_factory.mktemp('db') / 'advisor.db'}")
+
+
+@pytest.fixture(scope="session")
+def large_app(tmp_path_factory):
+    """Те же данные в SCALE раз больше: число запросов на страницу не должно от этого меняться"""
+    return _make_app(f"sqlite:///{tmp_path_factory.mktemp('db') / 'advisor.db'}", scale=SCALE)
+
+
+@pytest.fixture(scope="session", params=["plain", "partitioned"])
+def pg_app(request):
+    """
+    То же приложение на PostgreSQL из TEST_POSTGRES_URI (без неё тесты пропускаются):
+    обычная и помесячно секционированная print_events. База одна, поэтому pytest
+    группирует тесты по схеме, а схема удаляется после своей группы
+    """
+    uri = os.getenv("TEST_POSTGRES_URI")
+    if not uri:
+        pytest.skip("TEST_POSTGRES_URI не задана")
+    app = _make_app(uri, fresh=True, PG_PARTITION_EVENTS=request.param == "partitioned")
+    yield app
+    with app.app_context():
+        db.drop_all()
+        db.session.remove()
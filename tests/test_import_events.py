@@ -0,0 +1,32 @@
+"""
+Пакетный импорт событий: строка, которую отвергла СУБД, не должна ронять весь пакет.
+"""
+from sqlalchemy import func, select, text
+
+from app.extensions import db
+from app.models import PrintEvent
+from app.utils.import_print_events import import_print_events_from_json
+
+from conftest import EVENTS, _events, _make_app
+
+
+def test_conflicting_row_is_reported_and_rest_of_batch_is_written(tmp_path):
+    app = _make_app(f"sqlite:///{tmp_path / 'advisor.db'}")
+    events = [dict(e, JobID=f"new-{n}") for n, e in enumerate(_events())][:20]
+    bad = events[7]["JobID"]
+    with app.app_context():
+        # ограничение, о котором проверки импортёра не знают: RAISE(ABORT) — IntegrityError
+        db.session.execute(text(
+            f"CREATE TRIGGER reject_event BEFORE INSERT ON print_events "
+            f"WHEN NEW.job_id = '{bad}' BEGIN SELECT RAISE(ABORT, 'event rejected'); END"
+        ))
+        db.session.commit()
+
+        result = import_print_events_from_json(events)
+
+        assert result["created"] == len(events) - 1
+        assert result["skipped"] == 0
+        assert len(result["errors"]) == 1 and bad in result["errors"][0]
+        assert db.session.scalar(select(func.count()).select_from(PrintEvent)) == EVENTS + len(events) - 1
+        assert db.session.scalar(select(func.count()).where(PrintEvent.job_id == bad)) == 0
+        db.session.remove()
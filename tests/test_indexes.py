@@ -0,0 +1,65 @@
+"""
+Планы горячих запросов импортёров и отчётов: каждый должен идти по индексу,
+полный просмотр таблицы — регрессия схемы или запроса.
+
+SQLite — EXPLAIN QUERY PLAN на временной базе. PostgreSQL (TEST_POSTGRES_URI) —
+EXPLAIN с enable_seqscan=off, иначе на маленьких таблицах планировщик честно
+выбирает seq scan.
+"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select, text, tuple_
+
+from app.extensions import db
+from app.models import (
+    Building, Department, PrinterModel, Printer, User, Computer, Port, PrintEvent, PrintDailyRollup
+)
+
+NOW = datetime(2025, 1, 1)
+
+HOT_QUERIES = {
+    "buildings: lower(code) =": select(Building.id).where(func.lower(Building.code) == "b1"),
+    "departments: lower(code) =": select(Department.id).where(func.lower(Department.code) == "it"),
+    "models: lower(code) IN": select(PrinterModel.id).where(func.lower(PrinterModel.code).in_(["hp", "xerox"])),
+    "users: lower(username) IN": select(User.id).where(func.lower(User.username).in_(["ivanov", "petrov"])),
+    "computers: lower(hostname) IN": select(Computer.id).where(func.lower(Computer.hostname).in_(["b1-it-101-1"])),
+    "ports: lower(name) IN": select(Port.id).where(func.lower(Port.name).in_(["hp-b1-it-101-1"])),
+    "printers: building_id IN": select(Printer.id).where(Printer.building_id.in_([1, 2])),
+    "print_events: job_id IN": select(PrintEvent.job_id).where(PrintEvent.job_id.in_(["a", "b"])),
+    "print_events: keyset page": select(PrintEvent.id)
+        .where(tuple_(PrintEvent.timestamp, PrintEvent.id) < tuple_(NOW, 100))
+        .order_by(PrintEvent.timestamp.desc(), PrintEvent.id.desc()).limit(501),
+    "print_events: department filter": select(PrintEvent.id)
+        .join(Printer, Printer.id == PrintEvent.printer_id)
+        .where(Printer.department_id.in_([1])),
+    "rollups: day range": select(func.sum(PrintDailyRollup.pages))
+        .where(PrintDailyRollup.day >= NOW.date(), PrintDailyRollup.department_id.in_([1])),
+}
+
+
+def explain(stmt):
+    """(план построчно, строки плана с полным просмотром таблицы)"""
+    dialect = db.engine.dialect
+    sql = str(stmt.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+    with db.engine.connect() as conn:
+        if dialect.name == "postgresql":
+            conn.execute(text("SET enable_seqscan = off"))
+            plan = [row[0] for row in conn.execute(text(f"EXPLAIN {sql}"))]
+            return plan, [p for p in plan if "Seq Scan" in p]
+        plan = [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+        return plan, [p for p in plan if p.startswith("SCAN") and "INDEX" not in p]
+
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_query_uses_index(app, name):
+    with app.app_context():
+        plan, full_scans = explain(HOT_QUERIES[name])
+    assert not full_scans, f"{name}: полный просмотр таблицы\n" + "\n".join(plan)
+
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_query_uses_index_postgresql(pg_app, name):
+    with pg_app.app_context():
+        plan, full_scans = explain(HOT_QUERIES[name])
+    assert not full_scans, f"{name}: Seq Scan\n" + "\n".join(plan)
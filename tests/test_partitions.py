@@ -0,0 +1,40 @@
+"""
+Помесячные секции print_events на PostgreSQL: DDL и вставка выполняются на настоящей базе
+(TEST_POSTGRES_URI), а не только компилируются в SQL.
+"""
+import pytest
+from sqlalchemy import func, select, text
+
+from app.extensions import db
+from app.models import PrintEvent
+from app.utils.import_print_events import import_print_events_from_json
+from app.utils.partitions import (
+    DEFAULT_PARTITION, ensure_partitions, events_partitioned, existing_partitions, partition_name
+)
+
+from conftest import EVENTS, _events
+
+
+def _count(table):
+    return db.session.scalar(text(f"SELECT count(*) FROM {table}"))
+
+
+def test_events_move_into_month_partition_and_new_rows_land_there(pg_app):
+    if not pg_app.config["PG_PARTITION_EVENTS"]:
+        pytest.skip("print_events не секционирована")
+    with pg_app.app_context():
+        assert events_partitioned()
+        # засеянные события (январь 2025) старше созданных при старте секций — они в default
+        ensure_partitions()
+        month = partition_name("2025-01")
+        assert {DEFAULT_PARTITION, month} <= existing_partitions(db.session.connection())
+        assert _count(DEFAULT_PARTITION) == 0
+        assert _count(month) == EVENTS
+
+        events = [dict(e, JobID=f"partitioned-{n}") for n, e in enumerate(_events())][:10]
+        assert import_print_events_from_json(events)["created"] == len(events)
+        # повтор отсекает уникальный индекс (job_id, timestamp) секционированной таблицы
+        assert import_print_events_from_json(events)["skipped"] == len(events)
+        assert _count(month) == EVENTS + len(events)
+        assert db.session.scalar(select(func.count()).select_from(PrintEvent)) == EVENTS + len(events)
+        db.session.remove()
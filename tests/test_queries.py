@@ -0,0 +1,67 @@
+"""
+Число SQL-запросов на страницу: списки не должны делать запрос на каждую строку
+(N+1 из-за ленивой загрузки связей в шаблоне).
+
+Каждая страница запрашивается тестовым клиентом с пустым кэшем отчётов на двух
+базах разного размера, запросы считаются событием движка. Число запросов должно
+совпадать на обеих и не превышать потолок страницы.
+"""
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from app.extensions import db
+from app.utils.metrics import is_transaction_statement
+from app.utils.report_cache import report_cache
+
+# страница -> потолок запросов; архивная часть ленты событий — ещё до трёх запросов
+PAGE_QUERY_BUDGET = {
+    "/users": 1,
+    "/print-events": 6,
+    "/print-events?dept=it": 7,
+    "/api/print-events": 5,
+}
+
+
+@contextmanager
+def count_queries():
+    """Счётчик SQL-запросов движка: with count_queries() as counter: ...; counter[0]"""
+    counter = [0]
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        if not is_transaction_statement(statement):  # BEGIN на SQLite шлёт сам SQLAlchemy
+            counter[0] += 1
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+
+def page_queries(app, page):
+    """Число запросов на страницу с пустым кэшем отчётов"""
+    client = app.test_client()
+    report_cache.clear()
+    with app.app_context(), count_queries() as counter:
+        response = client.get(page)
+    assert response.status_code == 200
+    return counter[0]
+
+
+@pytest.mark.parametrize("page", PAGE_QUERY_BUDGET)
+def test_page_query_count_does_not_grow_with_rows(app, large_app, page):
+    queries = page_queries(app, page)
+    assert page_queries(large_app, page) == queries, f"{page}: число запросов зависит от числа строк"
+    assert queries <= PAGE_QUERY_BUDGET[page], f"{page}: {queries} запросов"
+
+
+def test_events_page_lists_rows(app, large_app):
+    """Сравнение имеет смысл, только если на большой базе строк на странице больше"""
+    rows = {}
+    for name, current in (("small", app), ("large", large_app)):
+        report_cache.clear()  # кэш отчётов общий на процесс, а базы разные
+        rows[name] = len(current.test_client().get("/api/print-events").get_json()["events"])
+    small, large = rows["small"], rows["large"]
+    assert 1 < small < large